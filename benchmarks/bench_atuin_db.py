@@ -0,0 +1,111 @@
+"""Compare the SQLite and atuin CLI paths for reading shell history.
+
+Usage: python -m benchmarks.bench_atuin_db [--rows 1000000] [--repeat 5]
+
+Builds a synthetic atuin history.db, then times get_recent_commands() and
+get_most_common_commands() against it. The atuin CLI path is only measured
+when `atuin` is on $PATH (it is pointed at the same database through
+ATUIN_DB_PATH).
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+from cli_suggest import atuin_db, cli_suggest
+
+SCHEMA = """
+create table history (
+    id text primary key,
+    timestamp integer not null,
+    duration integer not null,
+    exit integer not null,
+    command text not null,
+    cwd text not null,
+    session text not null,
+    hostname text not null,
+    deleted_at integer,
+    unique(timestamp, cwd, command)
+);
+create index idx_history_timestamp on history(timestamp);
+create index idx_history_command on history(command);
+create index idx_history_command_timestamp on history(command, timestamp);
+"""
+
+WORDS = ["git", "ls", "cd", "make", "docker", "kubectl", "vim", "grep", "ssh", "python"]
+ARGS = ["status", "-la", "..", "build", "ps", "get pods", "README.md", "-r foo .", "host1", "-m http.server"]
+
+
+def build_history_db(path, rows):
+    """Write `rows` pseudo-random history entries in atuin's schema"""
+    rng = random.Random(0)
+    start = int((time.time() - 365 * 86400) * 1e9)
+    step = int(365 * 86400 * 1e9 / rows)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.execute("PRAGMA journal_mode = WAL")
+    batch = []
+    for i in range(rows):
+        # Zipf-ish distribution so there is a realistic head of common commands
+        word = WORDS[min(int(rng.paretovariate(1.2)) - 1, len(WORDS) - 1)]
+        command = f"{word} {rng.choice(ARGS)} {rng.randrange(500)}"
+        batch.append((str(i), start + i * step, rng.randrange(1000), 0, command, f"/src/p{i % 40}", "s", "h"))
+        if len(batch) == 50000:
+            conn.executemany("insert into history values (?, ?, ?, ?, ?, ?, ?, ?, NULL)", batch)
+            batch = []
+    conn.executemany("insert into history values (?, ?, ?, ?, ?, ?, ?, ?, NULL)", batch)
+    conn.commit()
+    conn.close()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.db")
+        start = time.perf_counter()
+        build_history_db(path, args.rows)
+        print(f"Built {args.rows} rows in {time.perf_counter() - start:.1f}s")
+
+        with mock.patch.dict(os.environ, {"ATUIN_DB_PATH": path}):
+            results = {
+                "sqlite recent": timed(lambda: cli_suggest.get_recent_commands(10), args.repeat),
+                "sqlite common": timed(lambda: cli_suggest.get_most_common_commands(50), args.repeat),
+                "sqlite common (per cwd)": timed(
+                    lambda: atuin_db.most_common_commands(50, cwd="/src/p7"), args.repeat
+                ),
+                "sqlite common (last 7 days)": timed(
+                    lambda: atuin_db.commands_in_window(7 * 86400), args.repeat
+                ),
+            }
+            if shutil.which("atuin"):
+                with mock.patch.object(atuin_db, "available", return_value=False):
+                    results["atuin cli recent"] = timed(lambda: cli_suggest.get_recent_commands(10), args.repeat)
+                    results["atuin cli common"] = timed(lambda: cli_suggest.get_most_common_commands(50), args.repeat)
+            else:
+                print("atuin not found on $PATH; skipping the CLI path")
+            atuin_db.close()
+
+    for name, ms in results.items():
+        print(f"{name:<30} {ms:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
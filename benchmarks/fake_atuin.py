@@ -0,0 +1,51 @@
+"""A fake `atuin` executable backed by a synthetic history.db.
+
+install() writes an `atuin` script into a directory (put it first on $PATH)
+that answers the two commands cli-suggest runs when it can't read the
+database directly, `history list --cmd-only --limit N` and
+`stats --count N`, from the database at $FAKE_ATUIN_DB, in atuin's output
+format. Use bench_atuin_db.build_history_db() to make the database.
+"""
+import os
+import stat
+import sys
+
+SCRIPT = '''#!{python}
+import os
+import sqlite3
+import sys
+
+args = sys.argv[1:]
+limit = int(args[args.index("--limit") + 1]) if "--limit" in args else int(args[args.index("--count") + 1])
+conn = sqlite3.connect(os.environ["FAKE_ATUIN_DB"])
+if args[:2] == ["history", "list"]:
+    rows = conn.execute(
+        "SELECT command FROM (SELECT command, timestamp FROM history ORDER BY timestamp DESC LIMIT ?) "
+        "ORDER BY timestamp", (limit,)
+    ).fetchall()
+    print("\\n".join(command for (command,) in rows))
+elif args[:1] == ["stats"]:
+    rows = conn.execute(
+        "SELECT command, COUNT(*) AS n FROM history GROUP BY command ORDER BY n DESC LIMIT ?", (limit,)
+    ).fetchall()
+    top = rows[0][1] if rows else 1
+    for command, count in rows:
+        bar = "\\u25ae" * max(1, 10 * count // top)
+        print(f"[{{bar:<10}}] {{count:>6}} {{command}}")
+    total, unique = conn.execute("SELECT COUNT(*), COUNT(DISTINCT command) FROM history").fetchone()
+    print(f"Total commands:   {{total}}")
+    print(f"Unique commands:  {{unique}}")
+else:
+    print(f"fake atuin: unsupported command {{args}}", file=sys.stderr)
+    sys.exit(2)
+'''
+
+
+def install(bin_dir: str) -> str:
+    """Write the fake atuin into bin_dir and return its path"""
+    os.makedirs(bin_dir, exist_ok=True)
+    path = os.path.join(bin_dir, "atuin")
+    with open(path, "w") as f:
+        f.write(SCRIPT.format(python=sys.executable))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
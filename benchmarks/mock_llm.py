@@ -0,0 +1,139 @@
+"""A local stand-in for the Anthropic and Perplexity APIs, with configurable latency.
+
+Usage: python -m benchmarks.mock_llm [--port 8765] [--ttft 0.2] [--token-delay 0.01]
+
+then point cli-suggest at it with ANTHROPIC_BASE_URL=http://127.0.0.1:8765.
+POST /v1/messages answers like the Messages API: streamed requests get
+server-sent events sent as they are "generated" (the first text delta after
+--ttft seconds, then one every --token-delay seconds), plain ones a single
+JSON message after the same total time. POST /chat/completions answers like
+Perplexity, and GET returns a small HTML page for /web.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+REPLY = "```bash\nfind . -type f -name '*.log' -mtime +7 -exec rm {} +\n```"
+PAGE = "<html><head><title>Stub page</title></head><body><main>{}</main></body></html>"
+
+
+def split_tokens(text: str):
+    """Pieces of about one token each, the way streamed deltas arrive"""
+    pieces, start = [], 0
+    for i, char in enumerate(text):
+        if char in " \n" and i > start:
+            pieces.append(text[start:i])
+            start = i
+    pieces.append(text[start:])
+    return [piece for piece in pieces if piece]
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, as the real APIs
+
+    def log_message(self, *args):
+        pass
+
+    def _read_body(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        self.server.requests += 1
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def _send_json(self, body: dict, content_type: str = "application/json") -> None:
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _event(self, name: str, event: dict) -> None:
+        self._send_chunk(f"event: {name}\ndata: {json.dumps(event)}\n\n".encode())
+
+    def _stream(self, tokens) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self._event("message_start", {"type": "message_start", "message": {
+            "id": "msg_mock", "type": "message", "role": "assistant", "model": "mock",
+            "content": [], "stop_reason": None, "stop_sequence": None,
+            "usage": {"input_tokens": self.server.input_tokens, "output_tokens": 0}}})
+        self._event("content_block_start", {"type": "content_block_start", "index": 0,
+                                            "content_block": {"type": "text", "text": ""}})
+        time.sleep(self.server.ttft)
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self.server.token_delay)
+            self._event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                "delta": {"type": "text_delta", "text": token}})
+        self._event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        self._event("message_delta", {"type": "message_delta",
+                                      "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                      "usage": {"output_tokens": len(tokens)}})
+        self._event("message_stop", {"type": "message_stop"})
+        self._send_chunk(b"")
+
+    def do_POST(self):
+        body = self._read_body()
+        tokens = split_tokens(self.server.reply)
+        if self.path.endswith("/v1/messages") and body.get("stream"):
+            self._stream(tokens)
+            return
+        time.sleep(self.server.ttft + self.server.token_delay * (len(tokens) - 1))
+        if self.path.endswith("/v1/messages"):
+            self._send_json({
+                "id": "msg_mock", "type": "message", "role": "assistant", "model": "mock",
+                "content": [{"type": "text", "text": self.server.reply}],
+                "stop_reason": "end_turn", "stop_sequence": None,
+                "usage": {"input_tokens": self.server.input_tokens, "output_tokens": len(tokens)},
+            })
+        else:
+            self._send_json({"choices": [{"message": {"content": self.server.reply}}]})
+
+    def do_GET(self):
+        self.server.requests += 1
+        data = PAGE.format("<p>Stub paragraph with enough text to count as content.</p>" * 200).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start(
+    port: int = 0, ttft: float = 0.2, token_delay: float = 0.01, reply: str = REPLY, input_tokens: int = 500
+) -> Tuple[ThreadingHTTPServer, str]:
+    """Serve in a daemon thread; return the server (shutdown() it when done) and its base URL"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockLLMHandler)
+    server.daemon_threads = True
+    server.ttft, server.token_delay, server.reply, server.input_tokens = ttft, token_delay, reply, input_tokens
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.2, help="seconds before the first text delta")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between text deltas")
+    args = parser.parse_args()
+
+    server, url = start(args.port, args.ttft, args.token_delay)
+    print(f"Serving on {url}; Ctrl-C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""End-to-end benchmarks against a mock LLM server, with a regression gate.
+
+Usage: python -m benchmarks.run [--repeat 3] [--scenario NAME ...] [--check | --update-baseline]
+
+Each scenario runs `cli-suggest` or `llm` in a fresh interpreter (see
+benchmarks.scenario) against benchmarks.mock_llm, with a synthetic atuin
+history of --rows commands (read directly, or through benchmarks.fake_atuin
+for the "-atuin-cli" scenario) and an empty HOME, so nothing is cached from
+an earlier run. Reported per scenario, as the median of --repeat runs:
+
+    wall_ms       the whole process, interpreter startup included
+    import_ms     importing cli_suggest
+    ttft_ms       request sent to first streamed text (from the metrics export)
+    e2e_ms        main() start to finish
+    rss_kb        peak resident memory
+    subprocesses  processes spawned (atuin, shells, ...)
+    api_calls     requests to the model API
+
+--check compares the medians with benchmarks/baseline.json and exits 1 if
+any is worse than the baseline by more than the tolerance for its unit, so
+it can gate CI. --update-baseline rewrites the baseline from this run.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from benchmarks import fake_atuin, mock_llm
+from benchmarks.bench_atuin_db import build_history_db
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(REPO_ROOT, "benchmarks", "baseline.json")
+
+# name -> (entry, argv, stdin lines, extra environment)
+SCENARIOS = {
+    "startup": ("import", [], 0, {}),
+    "oneshot": ("cli_suggest", ["find", "log", "files", "older", "than", "a", "week"], 0, {}),
+    "oneshot-atuin-cli": ("cli_suggest", ["find", "log", "files", "older", "than", "a", "week"], 0,
+                          {"ATUIN_DB_PATH": "{tmp}/missing.db"}),
+    "hook": ("cli_suggest", ["--hook", "--failed-command", "frobnicate --all --verbose"], 0, {}),
+    "perplexity": ("cli_suggest", ["/perp", "what", "does", "find", "-mtime", "do"], 0, {}),
+    "llm": ("llm", ["--prompt", "Summarize the errors in this log"], 2_000, {}),
+    "llm-map-reduce": ("llm", ["--prompt", "Summarize the errors in this log", "--map-reduce"], 12_000, {}),
+}
+# Allowed regression per metric: (relative, absolute)
+TOLERANCE = {
+    "ms": (1.0, 50.0),  # timings are noisy on shared CI runners; eager imports cost far more
+    "kb": (0.25, 10 * 1024),
+    "count": (0.0, 0),
+}
+METRICS = ("wall_ms", "import_ms", "ttft_ms", "e2e_ms", "rss_kb", "subprocesses", "api_calls")
+
+
+def unit(metric: str) -> str:
+    if metric.endswith("_ms"):
+        return "ms"
+    return "kb" if metric.endswith("_kb") else "count"
+
+
+def write_log(path: str, lines: int) -> None:
+    with open(path, "w") as f:
+        for i in range(lines):
+            level = "ERROR" if i % 17 == 0 else "INFO"
+            f.write(f"2024-05-01T12:{i // 60 % 60:02d}:{i % 60:02d} {level} worker-{i % 8} request {i} took {i % 500}ms\n")
+
+
+def run_once(name: str, tmp: str, base_url: str, history_db: str, bin_dir: str) -> dict:
+    entry, argv, stdin_lines, extra_env = SCENARIOS[name]
+    home = tempfile.mkdtemp(dir=tmp)
+    os.makedirs(os.path.join(home, ".config", "scratch"))
+    with open(os.path.join(home, ".config", "scratch", "config.json"), "w") as f:
+        json.dump({"CLAUDE_API_KEY": "bench-key", "PERPLEXITY_API_KEY": "bench-key"}, f)
+
+    env = dict(os.environ)
+    env.update({
+        "HOME": home,
+        "PATH": bin_dir + os.pathsep + env.get("PATH", ""),
+        "PYTHONPATH": REPO_ROOT,
+        "ANTHROPIC_BASE_URL": base_url,
+        "BENCH_PERPLEXITY_URL": f"{base_url}/chat/completions",
+        "ATUIN_DB_PATH": history_db,
+        "FAKE_ATUIN_DB": history_db,
+        "CLI_SUGGEST_METRICS_EXPORT": os.path.join(home, "metrics.jsonl"),
+    })
+    env.update({key: value.format(tmp=tmp) for key, value in extra_env.items()})
+
+    stdin_path = os.path.join(home, "stdin.txt")
+    write_log(stdin_path, stdin_lines)
+    result_path = os.path.join(home, "result.json")
+    command = [sys.executable, "-m", "benchmarks.scenario", result_path, entry] + argv
+    with open(stdin_path) as stdin:
+        start = time.perf_counter()
+        completed = subprocess.run(command, stdin=stdin, capture_output=True, text=True, env=env, cwd=home)
+        wall = (time.perf_counter() - start) * 1000
+    if completed.returncode != 0 or not os.path.exists(result_path):
+        raise RuntimeError(f"scenario {name} failed:\n{completed.stdout}\n{completed.stderr}")
+    with open(result_path) as f:
+        result = json.load(f)
+    if result.pop("exit_code"):
+        raise RuntimeError(f"scenario {name} exited with an error:\n{completed.stdout}\n{completed.stderr}")
+    result["wall_ms"] = wall
+    return result
+
+
+def median(results: List[dict]) -> Dict[str, Optional[float]]:
+    summary = {}
+    for metric in METRICS:
+        values = [result[metric] for result in results if result.get(metric) is not None]
+        summary[metric] = round(statistics.median(values), 1) if values else None
+    return summary
+
+
+def compare(current: Dict[str, dict], baseline: Dict[str, dict]) -> List[str]:
+    """Descriptions of the metrics in current that regressed past the tolerance"""
+    regressions = []
+    for name, metrics in current.items():
+        for metric, value in metrics.items():
+            base = baseline.get(name, {}).get(metric)
+            if value is None or base is None:
+                continue
+            relative, absolute = TOLERANCE[unit(metric)]
+            limit = base * (1 + relative) + absolute
+            if value > limit:
+                regressions.append(f"{name} {metric}: {value:g} > {limit:g} (baseline {base:g})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="default: all")
+    parser.add_argument("--rows", type=int, default=200_000, help="commands in the synthetic atuin history")
+    parser.add_argument("--ttft", type=float, default=0.2, help="mock server seconds to first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="mock server seconds between tokens")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--json", help="also write the medians to this file")
+    gate = parser.add_mutually_exclusive_group()
+    gate.add_argument("--check", action="store_true", help="exit 1 on a regression against the baseline")
+    gate.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    names = args.scenario or list(SCENARIOS)
+    server, base_url = mock_llm.start(ttft=args.ttft, token_delay=args.token_delay)
+    tmp = tempfile.mkdtemp(prefix="cli_suggest_bench_")
+    try:
+        history_db = os.path.join(tmp, "history.db")
+        build_history_db(history_db, args.rows)
+        bin_dir = os.path.join(tmp, "bin")
+        fake_atuin.install(bin_dir)
+
+        current = {}
+        for name in names:
+            current[name] = median([run_once(name, tmp, base_url, history_db, bin_dir) for _ in range(args.repeat)])
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"{'scenario':<20}" + "".join(f"{metric:>14}" for metric in METRICS))
+    for name, metrics in current.items():
+        cells = ("-" if metrics[m] is None else f"{metrics[m]:g}" for m in METRICS)
+        print(f"{name:<20}" + "".join(f"{cell:>14}" for cell in cells))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(current)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+    elif args.check:
+        with open(args.baseline) as f:
+            regressions = compare(current, json.load(f))
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
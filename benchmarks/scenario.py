@@ -0,0 +1,76 @@
+"""Run one benchmark scenario in this (fresh) interpreter and write its measurements.
+
+Usage: python -m benchmarks.scenario RESULT_PATH ENTRY [ARG ...]
+
+ENTRY is "cli_suggest" or "llm" (its main() runs with ARG... as argv) or
+"import" (only import cli_suggest, to measure startup). benchmarks.run sets
+up the environment first: HOME with a config file, ANTHROPIC_BASE_URL
+pointing at the mock server, the atuin database or fake binary, and
+CLI_SUGGEST_METRICS_EXPORT, which is where TTFT and the API call count come
+from. Every prompt to run something is answered "n".
+"""
+import json
+import os
+import resource
+import sys
+import time
+
+STARTED = time.perf_counter()
+
+
+def count_subprocesses() -> list:
+    spawned = []
+
+    def hook(event, args):
+        if event in ("subprocess.Popen", "os.system", "os.posix_spawn", "os.fork"):
+            spawned.append(event)
+
+    sys.addaudithook(hook)
+    return spawned
+
+
+def main():
+    result_path, entry, argv = sys.argv[1], sys.argv[2], sys.argv[3:]
+    spawned = count_subprocesses()
+
+    if entry == "llm":
+        from cli_suggest import llm as module
+    else:
+        from cli_suggest import cli_suggest as module
+    imported = time.perf_counter()
+    if os.environ.get("BENCH_PERPLEXITY_URL"):
+        module.PERPLEXITY_API_URL = os.environ["BENCH_PERPLEXITY_URL"]
+
+    import builtins
+
+    builtins.input = lambda prompt="": "n"
+    exit_code = 0
+    if entry != "import":
+        sys.argv = [entry.replace("_", "-")] + argv
+        try:
+            module.main()
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 1
+    finished = time.perf_counter()
+
+    records = []
+    export = os.environ.get("CLI_SUGGEST_METRICS_EXPORT")
+    if export and os.path.exists(export):
+        with open(export) as f:
+            records = [json.loads(line) for line in f]
+    ttfts = [record["spans_ms"]["ttft"] for record in records if "ttft" in record["spans_ms"]]
+
+    with open(result_path, "w") as f:
+        json.dump({
+            "import_ms": (imported - STARTED) * 1000,
+            "e2e_ms": (finished - imported) * 1000,
+            "ttft_ms": ttfts[-1] if ttfts else None,
+            "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "subprocesses": len(spawned),
+            "api_calls": sum(record["calls"] for record in records),
+            "exit_code": exit_code,
+        }, f)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,10 @@
+import importlib
+
 from .cli_suggest import main
-from . import llm
+
+
+def __getattr__(name):
+    # llm pulls in the anthropic SDK, so only load it when it is asked for
+    if name == "llm":
+        return importlib.import_module(f"{__name__}.llm")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,11 +1,13 @@
 import os
 import json
 import sys
-import anthropic
-from ratelimit import limits, sleep_and_retry
+import time
+
+from . import metrics
+from . import rate_limiter
 
 API_KEY = None
-RATE_LIMIT = 20  # requests per minute
+MODEL = "claude-3-sonnet-20240229"
 
 class AnthropicClient:
     def __init__(self):
@@ -29,18 +31,45 @@ class AnthropicClient:
                 "You can obtain an API key from https://www.anthropic.com", file=sys.stderr
             )
             sys.exit(1)
+        import anthropic
+
         self.client = anthropic.Anthropic(api_key=self.api_key)
 
-    @sleep_and_retry
-    @limits(calls=RATE_LIMIT, period=60)
+    def complete(self, prompt, max_tokens=1000, priority="interactive"):
+        """Return the whole reply without printing (used by the batch and map-reduce modes)"""
+        message = rate_limiter.call(
+            lambda: self.client.messages.create(
+                model=MODEL,
+                max_tokens=max_tokens,
+                temperature=0,
+                messages=[{"role": "user", "content": prompt}],
+            ),
+            priority,
+        )
+        metrics.add_usage(MODEL, getattr(message, "usage", None))
+        metrics.mark("total")
+        return message.content[0].text
+
     def stream_response(self, prompt):
+        # Shares the cli-suggest rate limit; a 429 arrives before any text is printed
+        rate_limiter.call(lambda: self._stream(prompt))
+
+    def _stream(self, prompt):
+        opened = time.monotonic()
+        first = True
         with self.client.messages.stream(
-            model="claude-3-sonnet-20240229",
+            model=MODEL,
             max_tokens=1000,
             temperature=0,
             messages=[{"role": "user", "content": prompt}],
         ) as stream:
             for text in stream.text_stream:
+                if first:
+                    metrics.add_time("ttft", time.monotonic() - opened)
+                    first = False
                 print(text, end="", flush=True)
             print()  # Print a newline at the end
+            snapshot = getattr(stream, "current_message_snapshot", None)
+            metrics.add_usage(MODEL, getattr(snapshot, "usage", None))
+        metrics.mark("total")
 
@@ -0,0 +1,290 @@
+"""Files attached with /add, and a local search index over them.
+
+/add takes a file, a directory or a glob. Attached paths stay for the rest of
+the session and are listed in the global context as "File_<path>" entries
+whose value describes the indexed version (size, chunks, content hash), so
+the response cache key changes whenever an attached file does.
+
+File contents never go into the global context. Each file is read through
+mmap and cut into line-aligned chunks that are stored in an SQLite FTS5 table
+(~/.cli_suggest/attachments.db, or CLI_SUGGEST_ATTACHMENTS_PATH), and search()
+returns the chunks that rank best for the query under BM25. Before every
+query the attached paths are checked: a file is re-read only when its mtime
+or size changed, and re-indexed only when its hash changed. Binary files,
+very large files and version-control or dependency directories are skipped.
+"""
+import glob
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .context_builder import CHUNK_CHARS, estimate_tokens, terms
+
+CHUNK_BYTES = CHUNK_CHARS
+TOP_K = 8  # chunks per prompt at most, across all attached files
+MAX_FILES = 1000  # per /add
+MAX_FILE_BYTES = 50 * 1024 * 1024
+SNIFF_BYTES = 8192  # a NUL byte in here marks a file as binary
+SKIP_DIRS = {".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", ".tox", ".mypy_cache"}
+PRUNE_AFTER = 30 * 24 * 3600  # seconds since a file was last attached
+
+# What was passed to /add this session (files, directories, globs), in order
+_session: Dict[str, None] = {}
+_connection = None
+_lock = threading.Lock()
+
+
+class Skipped(Exception):
+    """A file that can't be attached; the message says why"""
+
+
+def index_path() -> str:
+    return os.environ.get("CLI_SUGGEST_ATTACHMENTS_PATH") or os.path.expanduser(
+        "~/.cli_suggest/attachments.db"
+    )
+
+
+def _connect() -> sqlite3.Connection:
+    global _connection
+    if _connection is None:
+        path = index_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                first_row INTEGER NOT NULL,
+                chunks INTEGER NOT NULL,
+                used REAL NOT NULL
+            )"""
+        )
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(path UNINDEXED, position UNINDEXED, text)")
+        # Chunks of each file have consecutive rowids, so dropping a file is a range delete
+        for path, first_row, chunks in conn.execute(
+            "SELECT path, first_row, chunks FROM files WHERE used < ?", (time.time() - PRUNE_AFTER,)
+        ).fetchall():
+            _delete_file(conn, path, first_row, chunks)
+        _connection = conn
+    return _connection
+
+
+def close() -> None:
+    global _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+        _connection = None
+
+
+def _delete_file(conn: sqlite3.Connection, path: str, first_row: int, chunks: int) -> None:
+    conn.execute("DELETE FROM chunks WHERE rowid BETWEEN ? AND ?", (first_row, first_row + chunks - 1))
+    conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+
+def expand(spec: str) -> Iterator[str]:
+    """Absolute paths of the regular files a /add argument names"""
+    spec = os.path.expanduser(spec)
+    if glob.has_magic(spec):
+        matches = sorted(glob.iglob(spec, recursive=True))
+    else:
+        matches = [spec]
+    for match in matches:
+        if os.path.isdir(match):
+            for root, dirs, files in os.walk(match):
+                dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS and not d.startswith("."))
+                for name in sorted(files):
+                    yield os.path.abspath(os.path.join(root, name))
+        elif os.path.isfile(match):
+            yield os.path.abspath(match)
+
+
+def _read_chunks(mm: mmap.mmap, size: int) -> Iterator[str]:
+    """Line-aligned chunks of about CHUNK_BYTES, decoded one at a time"""
+    start = 0
+    while start < size:
+        end = min(start + CHUNK_BYTES, size)
+        if end < size:
+            newline = mm.rfind(b"\n", start, end)
+            if newline >= start:
+                end = newline + 1
+        yield mm[start:end].decode("utf-8", errors="replace")
+        start = end
+
+
+def index_file(path: str) -> Tuple[int, str, int]:
+    """Make sure the index holds the current contents of path; return (size, digest, chunks)"""
+    try:
+        st = os.stat(path)
+    except OSError as e:
+        raise Skipped(e.strerror or str(e))
+    if st.st_size > MAX_FILE_BYTES:
+        raise Skipped(f"larger than {MAX_FILE_BYTES // (1024 * 1024)} MB")
+
+    with _lock:
+        conn = _connect()
+        row = conn.execute("SELECT mtime, size, digest, first_row, chunks FROM files WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[0] == st.st_mtime and row[1] == st.st_size:
+            conn.execute("UPDATE files SET used = ? WHERE path = ?", (time.time(), path))
+            return row[1], row[2], row[4]
+
+        with open(path, "rb") as f:
+            if st.st_size == 0:
+                mm, digest = b"", hashlib.sha1().hexdigest()
+            else:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if b"\0" in mm[:SNIFF_BYTES]:
+                    raise Skipped("binary file")
+                if st.st_size:
+                    digest = hashlib.sha1(mm).hexdigest()
+                if row is not None and row[2] == digest:
+                    # Touched but not changed: no need to re-chunk
+                    conn.execute(
+                        "UPDATE files SET mtime = ?, size = ?, used = ? WHERE path = ?",
+                        (st.st_mtime, st.st_size, time.time(), path),
+                    )
+                    return st.st_size, digest, row[4]
+
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # Another process may have re-indexed the file meanwhile
+                    row = conn.execute("SELECT first_row, chunks FROM files WHERE path = ?", (path,)).fetchone()
+                    if row is not None:
+                        _delete_file(conn, path, *row)
+                    first_row = conn.execute("SELECT COALESCE(MAX(rowid), 0) + 1 FROM chunks").fetchone()[0]
+                    count = 0
+                    for position, text in enumerate(_read_chunks(mm, st.st_size)):
+                        conn.execute(
+                            "INSERT INTO chunks (rowid, path, position, text) VALUES (?, ?, ?, ?)",
+                            (first_row + position, path, position, text),
+                        )
+                        count += 1
+                    conn.execute(
+                        "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (path, st.st_mtime, st.st_size, digest, first_row, count, time.time()),
+                    )
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            finally:
+                if isinstance(mm, mmap.mmap):
+                    mm.close()
+    return st.st_size, digest, count
+
+
+def add(spec: str) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """Attach a file, directory or glob; return (indexed paths, [(skipped path, reason)])"""
+    added, skipped = [], []
+    for path in expand(spec):
+        if len(added) >= MAX_FILES:
+            skipped.append((spec, f"stopped after {MAX_FILES} files"))
+            break
+        try:
+            index_file(path)
+            added.append(path)
+        except Skipped as e:
+            skipped.append((path, str(e)))
+    if added:
+        _session[spec] = None
+    return added, skipped
+
+
+def remove(spec: str) -> bool:
+    """Detach something passed to /add earlier (or everything, for "all")"""
+    if spec == "all":
+        found = bool(_session)
+        _session.clear()
+        return found
+    if spec not in _session:
+        return False
+    del _session[spec]
+    return True
+
+
+def attached() -> List[str]:
+    return list(_session)
+
+
+def context_entries() -> Dict[str, str]:
+    """A "File_<path>" entry per attached file, re-indexing files that changed since last time"""
+    entries = {}
+    for spec in _session:
+        for path in expand(spec):
+            if f"File_{path}" in entries or len(entries) >= MAX_FILES:
+                continue
+            try:
+                size, digest, chunks = index_file(path)
+            except Skipped:
+                continue  # binaries picked up by a glob; files deleted since
+            entries[f"File_{path}"] = f"attached, {size} bytes in {chunks} chunks (sha1 {digest[:12]})"
+    return entries
+
+
+def _match_expression(query: str) -> Optional[str]:
+    words = sorted(terms(query))
+    return " OR ".join(f'"{word}"' for word in words) if words else None
+
+
+def search(
+    query: str, paths: Sequence[str], budget: int, top_k: int = TOP_K, exclude: Sequence[Tuple[str, str]] = ()
+) -> List[Tuple[str, str]]:
+    """(path, chunk) pairs that best match the query within budget tokens, in file order
+
+    Chunks are ranked by BM25; when fewer than top_k match, the earliest
+    chunks of each file (titles, headers, imports) fill the remaining slots.
+    (path, chunk) pairs in exclude (already in the prompt) are never picked.
+    """
+    if not paths or budget <= 0:
+        return []
+    picked = {}  # (path, position) -> text
+    used = 0
+    exclude = set(exclude)
+
+    def take(rows) -> bool:
+        nonlocal used
+        for path, position, text in rows:
+            if len(picked) >= top_k:
+                return False
+            cost = estimate_tokens(text)
+            if (path, position) in picked or (path, text) in exclude or used + cost > budget:
+                continue
+            picked[(path, position)] = text
+            used += cost
+        return True
+
+    with _lock:
+        conn = _connect()
+        placeholders = ",".join("?" * len(paths))
+        expression = _match_expression(query)
+        if expression:
+            rows = conn.execute(
+                f"SELECT path, position, text FROM chunks WHERE chunks MATCH ? AND path IN ({placeholders}) "
+                "ORDER BY bm25(chunks) LIMIT ?",
+                (expression, *paths, top_k * 4),
+            ).fetchall()
+            take(rows)
+        for path in paths:
+            if len(picked) >= top_k:
+                break
+            row = conn.execute("SELECT first_row, chunks FROM files WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                continue
+            rows = conn.execute(
+                "SELECT path, position, text FROM chunks WHERE rowid BETWEEN ? AND ? ORDER BY rowid LIMIT ?",
+                (row[0], row[0] + row[1] - 1, top_k),
+            ).fetchall()
+            if not take(rows):
+                break
+
+    order = {path: i for i, path in enumerate(paths)}
+    keys = sorted(picked, key=lambda k: (order[k[0]], int(k[1])))
+    return [(path, picked[(path, position)]) for path, position in keys]
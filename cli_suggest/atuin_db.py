@@ -0,0 +1,177 @@
+"""Read-only access to atuin's history database.
+
+Querying history.db directly avoids forking `atuin` and scraping its colored
+`atuin stats` output. Callers should treat every function here as optional and
+fall back to the atuin CLI when `available()` is False or a query fails.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+BUSY_TIMEOUT = 2.0  # seconds to wait on atuin holding a write lock
+
+_connection = None
+_connection_path = None
+_lock = threading.Lock()
+
+
+def db_path() -> str:
+    """Location of atuin's history.db, honoring ATUIN_DB_PATH and XDG_DATA_HOME"""
+    path = os.environ.get("ATUIN_DB_PATH")
+    if path:
+        return os.path.expanduser(path)
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return os.path.join(data_home, "atuin", "history.db")
+
+
+def available() -> bool:
+    """True if the atuin database exists and can be opened"""
+    try:
+        _connect()
+        return True
+    except (OSError, sqlite3.Error):
+        return False
+
+
+def _connect() -> sqlite3.Connection:
+    global _connection, _connection_path
+    path = db_path()
+    if _connection is not None and _connection_path == path:
+        return _connection
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    # mode=ro never takes a write lock, so atuin (which runs in WAL mode) can
+    # keep appending while we read a consistent snapshot.
+    conn = sqlite3.connect(
+        f"file:{quote(path)}?mode=ro",
+        uri=True,
+        timeout=BUSY_TIMEOUT,
+        check_same_thread=False,
+    )
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    if _connection is not None:
+        _connection.close()
+    _connection, _connection_path = conn, path
+    return conn
+
+
+def close() -> None:
+    """Close the cached connection, if any"""
+    global _connection, _connection_path
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+        _connection, _connection_path = None, None
+
+
+def _query(sql: str, params: Tuple = ()) -> List[Tuple]:
+    with _lock:
+        return _connect().execute(sql, params).fetchall()
+
+
+def _filters(cwd: Optional[str], since: Optional[float], until: Optional[float]) -> Tuple[str, Tuple]:
+    # atuin soft-deletes by setting deleted_at (and replacing the command with
+    # random text), so deleted_at is the only reliable marker
+    clauses = ["deleted_at IS NULL"]
+    params = []
+    if cwd is not None:
+        clauses.append("cwd = ?")
+        params.append(cwd)
+    # atuin stores timestamps in nanoseconds since the epoch
+    if since is not None:
+        clauses.append("timestamp >= ?")
+        params.append(int(since * 1e9))
+    if until is not None:
+        clauses.append("timestamp < ?")
+        params.append(int(until * 1e9))
+    return " AND ".join(clauses), tuple(params)
+
+
+def recent_commands(
+    limit: int = 10,
+    cwd: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+) -> List[str]:
+    """Most recent commands, oldest first (the order `atuin history list` prints)"""
+    where, params = _filters(cwd, since, until)
+    rows = _query(
+        f"SELECT command FROM history WHERE {where} ORDER BY timestamp DESC LIMIT ?",
+        params + (limit,),
+    )
+    return [row[0] for row in reversed(rows)]
+
+
+def most_common_commands(
+    limit: int = 50,
+    cwd: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+) -> List[Tuple[str, int]]:
+    """Top commands by run count as (command, count) pairs"""
+    windowed = since is not None or until is not None
+    if not windowed and cwd is None:
+        return _most_common_overall(limit)
+    where, params = _filters(cwd, since, until)
+    group_by = "command"
+    source = "history"
+    if windowed:
+        # Walk the timestamp index over the window only; the unary + stops
+        # SQLite from scanning the whole command index to satisfy GROUP BY.
+        group_by = "+command"
+    else:
+        # atuin has no cwd index; a sequential scan beats walking the command
+        # index with a random table lookup per row.
+        source = "history NOT INDEXED"
+    return _query(
+        f"SELECT command, COUNT(*) AS runs FROM {source} WHERE {where} "
+        f"GROUP BY {group_by} ORDER BY runs DESC LIMIT ?",
+        params + (limit,),
+    )
+
+
+def _most_common_overall(limit: int) -> List[Tuple[str, int]]:
+    # Counting from the covering (command, timestamp) index is several times
+    # faster than any plan that reads deleted_at for every row, so count
+    # everything there and subtract the (few) soft-deleted rows afterwards.
+    deleted = dict(_query(
+        "SELECT command, COUNT(*) FROM history NOT INDEXED WHERE deleted_at IS NOT NULL GROUP BY command"
+    ))
+    # Each deleted command can push at most one entry out of the top `limit`
+    rows = _query(
+        "SELECT command, COUNT(*) AS runs FROM history GROUP BY command ORDER BY runs DESC LIMIT ?",
+        (limit + len(deleted),),
+    )
+    counts = [(command, runs - deleted.get(command, 0)) for command, runs in rows]
+    counts = [(command, runs) for command, runs in counts if runs > 0]
+    counts.sort(key=lambda c: c[1], reverse=True)
+    return counts[:limit]
+
+
+def commands_in_window(seconds: float, limit: int = 50, cwd: Optional[str] = None) -> List[Tuple[str, int]]:
+    """Top commands run within the last `seconds` seconds"""
+    return most_common_commands(limit, cwd=cwd, since=time.time() - seconds)
+
+
+def history_after(rowid: int, limit: int) -> List[Tuple[int, float, str, str, int, str]]:
+    """(rowid, timestamp in seconds, command, cwd, exit, session) of live rows after rowid, in rowid order
+
+    atuin only appends, so rowid is a cursor for reading new history incrementally.
+    """
+    return [
+        (row[0], row[1] / 1e9) + tuple(row[2:])
+        for row in _query(
+            "SELECT rowid, timestamp, command, cwd, exit, session FROM history "
+            "WHERE rowid > ? AND deleted_at IS NULL ORDER BY rowid LIMIT ?",
+            (rowid, limit),
+        )
+    ]
+
+
+def deleted_count() -> int:
+    """How many rows atuin has soft-deleted (a change means some history was deleted)"""
+    return _query("SELECT COUNT(*) FROM history NOT INDEXED WHERE deleted_at IS NOT NULL")[0][0]
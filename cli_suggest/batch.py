@@ -0,0 +1,152 @@
+"""Run one prompt over many stdin records: `llm --batch`.
+
+Each non-empty input line is a record: a JSON value if it parses as one,
+otherwise the raw text. Records are read lazily and sent through a bounded
+thread pool (the shared rate limiter still applies), and one JSON result per
+record is written as soon as it can be:
+
+    {"index": 0, "input": ..., "output": "..."}
+    {"index": 1, "input": ..., "error": "..."}
+
+By default results come out in input order; with ordered=False they come out
+as they finish. A checkpoint file keeps every successful result, so a killed
+job started again with the same checkpoint only sends the records it hasn't
+finished (failed ones are retried) and still writes the complete output.
+"""
+import json
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, IO, Iterable, Iterator, Tuple
+
+WINDOW_PER_WORKER = 4  # records read ahead (or held for ordering) per worker
+
+
+def parse_record(line: str):
+    """A JSON value if the line is one, else the stripped text"""
+    line = line.strip()
+    if line[:1] in ('{', '[', '"'):
+        try:
+            return json.loads(line)
+        except ValueError:
+            pass
+    return line
+
+
+def read_records(stream: IO[str]) -> Iterator[Tuple[int, object]]:
+    """(index, record) for each non-empty line, reading the stream lazily"""
+    index = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        yield index, parse_record(line)
+        index += 1
+
+
+def record_text(record) -> str:
+    return record if isinstance(record, str) else json.dumps(record)
+
+
+def load_checkpoint(path: str) -> Dict[int, dict]:
+    """Successful results saved by an earlier run, by index"""
+    done = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short when the job was killed
+                if "output" in result:
+                    done[result["index"]] = result
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def _process(process: Callable[[str], str], index: int, record) -> dict:
+    try:
+        return {"index": index, "input": record, "output": process(record_text(record))}
+    except Exception as e:
+        return {"index": index, "input": record, "error": str(e)}
+
+
+def run_batch(
+    records: Iterable[Tuple[int, object]],
+    process: Callable[[str], str],
+    workers: int = 4,
+    ordered: bool = True,
+    done: Dict[int, dict] = None,
+) -> Iterator[dict]:
+    """Yield a result dict per record; records already in done are not processed again"""
+    done = done or {}
+    window = workers * WINDOW_PER_WORKER
+    records = iter(records)
+    in_flight = {}  # future -> index
+    finished = {}  # index -> result not yet yielded
+    next_out = 0
+    exhausted = False
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            # Read ahead only as far as the window allows, so memory stays bounded
+            while not exhausted and len(in_flight) + len(finished) < window:
+                try:
+                    index, record = next(records)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if index in done:
+                    finished[index] = done[index]
+                else:
+                    in_flight[pool.submit(_process, process, index, record)] = index
+
+            if ordered:
+                while next_out in finished:
+                    yield finished.pop(next_out)
+                    next_out += 1
+            else:
+                for index in list(finished):
+                    yield finished.pop(index)
+
+            if not in_flight:
+                if exhausted:
+                    return
+                continue
+            completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in completed:
+                finished[in_flight.pop(future)] = future.result()
+    finally:
+        # On Ctrl-C or an abandoned generator, drop queued records instead of finishing them
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run(
+    stdin: IO[str],
+    stdout: IO[str],
+    process: Callable[[str], str],
+    workers: int = 4,
+    ordered: bool = True,
+    checkpoint: str = None,
+) -> int:
+    """Write JSONL results for every record; returns the number of failed records"""
+    done = load_checkpoint(checkpoint) if checkpoint else {}
+    failures = 0
+    saved = open(checkpoint, "a+") if checkpoint else None
+    if saved is not None and saved.tell() > 0:
+        saved.seek(saved.tell() - 1)
+        if saved.read(1) != "\n":
+            saved.write("\n")  # don't glue the next result onto a line cut short
+    try:
+        for result in run_batch(read_records(stdin), process, workers, ordered, done):
+            line = json.dumps(result)
+            stdout.write(line + "\n")
+            stdout.flush()
+            if "error" in result:
+                failures += 1
+            elif saved is not None and result["index"] not in done:
+                saved.write(line + "\n")
+                saved.flush()
+    finally:
+        if saved is not None:
+            saved.close()
+    return failures
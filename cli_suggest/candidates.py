@@ -0,0 +1,100 @@
+"""Rank alternative command suggestions locally.
+
+`/alt <query>` asks Claude for several commands in one call. Before they are
+shown they are ordered by checks that cost a few milliseconds in total:
+
+- does `bash -n` accept the command,
+- is its executable on $PATH (or a shell builtin),
+- how often that executable appears in shell history.
+
+The LLM's own order breaks ties, so a good first answer stays first.
+"""
+import os
+import re
+import shlex
+import subprocess
+from typing import Dict, List, NamedTuple, Set
+
+from . import typo_fixer
+
+SYNTAX_CHECK_TIMEOUT = 2.0  # seconds
+
+
+class Candidate(NamedTuple):
+    command: str
+    syntax_ok: bool
+    on_path: bool
+    history_count: int
+
+    def notes(self) -> str:
+        """Short reasons a candidate was ranked down, for the pick list"""
+        notes = []
+        if not self.syntax_ok:
+            notes.append("syntax error")
+        if not self.on_path:
+            notes.append("not installed")
+        return f" ({', '.join(notes)})" if notes else ""
+
+
+def parse_candidates(text: str) -> List[str]:
+    """Commands from a numbered (or bulleted) one-per-line reply, duplicates dropped"""
+    commands = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("```"):
+            continue
+        line = re.sub(r"^(\d+[.):]|[-*])\s*", "", line).strip().strip("`").strip()
+        if line and line not in commands:
+            commands.append(line)
+    return commands
+
+
+def base_executable(command: str) -> str:
+    """The program a command runs, skipping sudo, env and VAR=value prefixes"""
+    try:
+        words = shlex.split(command)
+    except ValueError:
+        words = command.split()
+    for word in words:
+        if word in ("sudo", "env", "command", "time") or re.match(r"^[A-Za-z_][A-Za-z0-9_]*=", word):
+            continue
+        return word
+    return ""
+
+
+def syntax_ok(command: str) -> bool:
+    """True if bash parses the command (nothing is executed)"""
+    try:
+        result = subprocess.run(
+            ["bash", "-n", "-c", command],
+            capture_output=True,
+            timeout=SYNTAX_CHECK_TIMEOUT,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return True  # no verdict; don't punish the candidate
+    return result.returncode == 0
+
+
+def rank(commands: List[str], history_counts: Dict[str, int], executables: Set[str]) -> List[Candidate]:
+    """Candidates best first; sorted() is stable so the LLM's order breaks ties"""
+    candidates = []
+    for command in commands:
+        executable = base_executable(command)
+        if "/" in executable:
+            on_path = os.access(os.path.expanduser(executable), os.X_OK)
+        else:
+            on_path = executable in executables
+        candidates.append(Candidate(
+            command=command,
+            syntax_ok=syntax_ok(command),
+            on_path=on_path,
+            history_count=history_counts.get(executable, 0),
+        ))
+    return sorted(candidates, key=lambda c: (c.syntax_ok, c.on_path, c.history_count), reverse=True)
+
+
+def rank_with_history(commands: List[str], history_loader) -> List[Candidate]:
+    """rank() against the cached history vocabulary and the current $PATH"""
+    vocabulary = typo_fixer.load_vocabulary(history_loader)
+    executables = typo_fixer.path_executables() | typo_fixer.SHELL_BUILTINS
+    return rank(commands, vocabulary.get("commands", {}), executables)
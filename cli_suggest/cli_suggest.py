@@ -1,35 +1,92 @@
 import os
 import sys
 import subprocess
-import anthropic
 import json
 import argparse
 import tempfile
 import re
-from typing import List, Tuple, Dict
-from ratelimit import limits, sleep_and_retry
-from prompt_toolkit import PromptSession
-from prompt_toolkit.history import FileHistory
+import time
+from typing import Callable, List, Tuple, Dict
 from collections import Counter
 from textwrap import dedent
-from prettytable import PrettyTable
-import requests
-from bs4 import BeautifulSoup
-import html2text
+import sqlite3
+from . import attachments
+from . import atuin_db
+from . import context_builder
+from . import history_index
+from . import metrics
+from .output_capture import OutputCapture, session_spill_path, stream_and_capture
+from . import rate_limiter
+from . import response_cache
+from . import typo_fixer
+
+# anthropic, requests, bs4, html2text, prompt_toolkit and prettytable are
+# imported inside the functions that need them: together they cost several
+# hundred ms of startup that the hook and one-shot queries mostly never use.
 
 API_KEY = None
-RATE_LIMIT = 20  # requests per minute
 PERPLEXITY_API_KEY = None
+PERPLEXITY_API_URL = "https://api.perplexity.ai/chat/completions"
+# Seconds before an API call or web fetch is abandoned. Override with
+# CLI_SUGGEST_API_TIMEOUT / CLI_SUGGEST_HTTP_TIMEOUT in the config file.
+API_TIMEOUT = 60.0
+HTTP_TIMEOUT = 15.0
+# Bytes of command output kept in memory (head + tail) and sent to history.
+# Override with CLI_SUGGEST_OUTPUT_LIMIT in the config file.
+OUTPUT_CAPTURE_LIMIT = 64 * 1024
+# Keep the full output of the last oversized command in one temp file that is
+# replaced on the next run and deleted at exit (CLI_SUGGEST_SPILL_OUTPUT).
+SPILL_OUTPUT = False
+# Ask for a suggestion in the background once the typed query has been still
+# for SPECULATIVE_DELAY seconds (--speculative / CLI_SUGGEST_SPECULATIVE).
+SPECULATIVE = False
+SPECULATIVE_DELAY = 0.6
+# How many alternatives /alt asks for (CLI_SUGGEST_CANDIDATES)
+CANDIDATES = 3
+# Mark the stable part of each prompt for the API's prompt cache (CLI_SUGGEST_PROMPT_CACHE)
+PROMPT_CACHE = True
+# Named lists of ssh destinations for /fan (CLI_SUGGEST_HOSTGROUPS)
+HOSTGROUPS: Dict[str, List[str]] = {}
+
+# Shared for the life of the process so every call reuses pooled keep-alive
+# connections instead of paying a fresh TLS handshake.
+_client = None
+_http_session = None
+
+# Seconds each piece of atuin-derived context stays valid before it is re-read.
+# Recent commands change with every command run, common commands barely move.
+CONTEXT_TTL = {
+    "Recent_Commands": 15,
+    "Common_Commands": 300,
+    "History_Insights": 60,
+}
+_context_cache: Dict[str, Tuple[float, str]] = {}
+# (start time, future) of the last background refresh started by prefetch_global_context
+_context_refresh = None
+# What happened during the REPL turn in progress (model latency and reply,
+# exit code of what ran), saved with the turn in the session store
+_turn: Dict[str, object] = {}
+# Webpages added with /web, merged into every global context (files added
+# with /add live in the attachments index)
+_attachments: Dict[str, str] = {}
 
 
 def load_api_keys() -> None:
-    global API_KEY, PERPLEXITY_API_KEY
+    global API_KEY, PERPLEXITY_API_KEY, API_TIMEOUT, HTTP_TIMEOUT, OUTPUT_CAPTURE_LIMIT, SPILL_OUTPUT, SPECULATIVE, CANDIDATES, PROMPT_CACHE, HOSTGROUPS
     config_file = os.path.expanduser("~/.config/scratch/config.json")
     if os.path.exists(config_file):
         with open(config_file, "r") as f:
             config = json.load(f)
             API_KEY = config.get("CLAUDE_API_KEY")
             PERPLEXITY_API_KEY = config.get("PERPLEXITY_API_KEY")
+            API_TIMEOUT = float(config.get("CLI_SUGGEST_API_TIMEOUT", API_TIMEOUT))
+            HTTP_TIMEOUT = float(config.get("CLI_SUGGEST_HTTP_TIMEOUT", HTTP_TIMEOUT))
+            OUTPUT_CAPTURE_LIMIT = int(config.get("CLI_SUGGEST_OUTPUT_LIMIT", OUTPUT_CAPTURE_LIMIT))
+            SPILL_OUTPUT = bool(config.get("CLI_SUGGEST_SPILL_OUTPUT", SPILL_OUTPUT))
+            SPECULATIVE = bool(config.get("CLI_SUGGEST_SPECULATIVE", SPECULATIVE))
+            CANDIDATES = int(config.get("CLI_SUGGEST_CANDIDATES", CANDIDATES))
+            PROMPT_CACHE = bool(config.get("CLI_SUGGEST_PROMPT_CACHE", PROMPT_CACHE))
+            HOSTGROUPS = dict(config.get("CLI_SUGGEST_HOSTGROUPS", HOSTGROUPS))
     if not API_KEY:
         print("Error: Claude API key not found in config file.")
         print(f"Please ensure you have a valid 'CLAUDE_API_KEY' in {config_file}")
@@ -41,20 +98,146 @@ def load_api_keys() -> None:
         print("You can obtain an API key from https://www.perplexity.ai")
 
 
-@sleep_and_retry
-@limits(calls=RATE_LIMIT, period=60)
-def rate_limited_api_call(client, prompt, max_tokens=100):
-    return client.messages.create(
-        model="claude-3-sonnet-20240229",
-        max_tokens=max_tokens,
-        temperature=0,
-        system="You are a command-line suggestion assistant. Provide concise, accurate command-line suggestions.",
-        messages=[{"role": "user", "content": prompt}],
+def get_client() -> "anthropic.Anthropic":
+    """Return the process-wide Anthropic client, creating it on first use"""
+    global _client
+    if _client is None:
+        import anthropic
+
+        # ANTHROPIC_BASE_URL is honored by the SDK, which is how tests point
+        # this at a local stub server.
+        _client = anthropic.Anthropic(api_key=API_KEY, timeout=API_TIMEOUT)
+    return _client
+
+
+def get_http_session() -> "requests.Session":
+    """Return the process-wide requests session used for web and Perplexity calls"""
+    global _http_session
+    if _http_session is None:
+        import requests
+
+        _http_session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        _http_session.mount("https://", adapter)
+        _http_session.mount("http://", adapter)
+    return _http_session
+
+
+def close_clients() -> None:
+    """Close the shared client and session (they are recreated on next use)"""
+    global _client, _http_session
+    if _client is not None:
+        _client.close()
+    if _http_session is not None:
+        _http_session.close()
+    _client, _http_session = None, None
+
+
+MODEL = "claude-3-sonnet-20240229"
+SYSTEM_PROMPT = "You are a command-line suggestion assistant. Provide concise, accurate command-line suggestions."
+
+
+def rate_limited_api_call(client, prompt, max_tokens=100, priority="interactive"):
+    message = rate_limiter.call(
+        lambda: client.messages.create(
+            model=MODEL,
+            max_tokens=max_tokens,
+            temperature=0,
+            system=SYSTEM_PROMPT,
+            messages=[{"role": "user", "content": prompt}],
+        ),
+        priority,
     )
+    metrics.add_usage(MODEL, getattr(message, "usage", None))
+    return message
+
+
+def rate_limited_stream_call(client, prompt, on_text, max_tokens=100, priority="interactive") -> str:
+    """Stream a response, passing each text delta to on_text, and return the full text
+
+    Stops early (closing the connection) if the engine job running it is cancelled.
+    """
+    from . import engine
+
+    def stream_once():
+        # A 429 is raised when the stream opens, before any text reaches on_text
+        chunks = []
+        opened = time.monotonic()
+        with client.messages.stream(
+            model=MODEL,
+            max_tokens=max_tokens,
+            temperature=0,
+            system=SYSTEM_PROMPT,
+            messages=[{"role": "user", "content": prompt}],
+        ) as stream:
+            for text in stream.text_stream:
+                if engine.cancelled():
+                    break
+                if not chunks:
+                    metrics.add_time("ttft", time.monotonic() - opened)
+                on_text(text)
+                chunks.append(text)
+            snapshot = getattr(stream, "current_message_snapshot", None)
+            metrics.add_usage(MODEL, getattr(snapshot, "usage", None))
+        return "".join(chunks)
+
+    return rate_limiter.call(stream_once, priority)
+
+
+def complete(prompt: str, max_tokens: int, on_text=None, priority: str = "interactive") -> str:
+    """Send prompt to Claude, streaming deltas to on_text if given, and return the stripped reply
+
+    priority is the rate limiter class; "speculative" raises RateLimited instead of waiting.
+    """
+    client = get_client()
+    if on_text is None:
+        message = rate_limited_api_call(client, prompt, max_tokens=max_tokens, priority=priority)
+        return message.content[0].text.strip()
+    return rate_limited_stream_call(client, prompt, on_text, max_tokens=max_tokens, priority=priority).strip()
+
+
+def cached_complete(
+    mode: str,
+    query: str,
+    global_context: Dict[str, str],
+    prompt: str,
+    max_tokens: int,
+    on_text=None,
+    history: str = "",
+    priority: str = "interactive",
+) -> str:
+    """complete() through the on-disk response cache; hits never touch the network
+
+    history is the conversation history sent in the prompt; it is part of the key.
+    """
+    started = time.monotonic()
+    cached = response_cache.get(mode, query, global_context, history)
+    metrics.note(cache_hit=cached is not None)
+    if cached is not None:
+        if on_text is not None:
+            on_text(cached)
+        response = cached
+    else:
+        response = complete(prompt, max_tokens, on_text=on_text, priority=priority)
+        response_cache.put(mode, query, global_context, response, history)
+    metrics.mark("total")
+    if priority != "speculative":
+        _turn.update(latency=time.monotonic() - started, reply=response)
+    return response
+
+
+def print_stream(text: str) -> None:
+    """on_text callback that renders streamed deltas to the terminal as they arrive"""
+    print(text, end="", flush=True)
 
 
 def get_recent_commands(limit=10):
     """Get the most recent commands from atuin history"""
+    if atuin_db.available():
+        try:
+            return atuin_db.recent_commands(limit)
+        except sqlite3.Error as e:
+            print(f"Warning: reading atuin database failed, falling back to atuin CLI: {e}")
     try:
         result = subprocess.run(
             ["atuin", "history", "list", "--cmd-only", "--limit", str(limit)],
@@ -69,6 +252,16 @@ def get_recent_commands(limit=10):
 
 def get_most_common_commands(limit=50):
     """Get the most common commands using atuin stats"""
+    if history_index.caught_up():
+        try:
+            return [cmd for cmd, _ in history_index.top_commands(limit)]
+        except sqlite3.Error as e:
+            print(f"Warning: reading the history index failed: {e}")
+    if atuin_db.available():
+        try:
+            return [cmd for cmd, _ in atuin_db.most_common_commands(limit)]
+        except sqlite3.Error as e:
+            print(f"Warning: reading atuin database failed, falling back to atuin CLI: {e}")
     try:
         result = subprocess.run(
             ["atuin", "stats", "--count", str(limit)], capture_output=True, text=True
@@ -111,90 +304,271 @@ def get_most_common_commands(limit=50):
         return []
 
 
+def history_command_counts(limit: int) -> List[Tuple[str, int]]:
+    """(command, run count) pairs from atuin history, most common first"""
+    if history_index.caught_up():
+        try:
+            return history_index.top_commands(limit)
+        except sqlite3.Error:
+            pass
+    if atuin_db.available():
+        try:
+            return atuin_db.most_common_commands(limit)
+        except sqlite3.Error:
+            pass
+    # atuin stats doesn't give usable counts, so weight by rank instead
+    commands = get_most_common_commands(limit)
+    return [(cmd, len(commands) - i) for i, cmd in enumerate(commands)]
+
+
+def get_history_insights() -> str:
+    """Frequent commands here, likely next commands and failure rates, from the history index"""
+    try:
+        return history_index.insights(os.getcwd())
+    except sqlite3.Error as e:
+        print(f"Warning: updating the history index failed: {e}")
+        return ""
+
+
+def predict_commands(prefix: str = "", limit: int = 10) -> List[Tuple[str, str]]:
+    """(command, why) likely to be typed next, starting with prefix, from the history index alone"""
+    if not os.path.exists(history_index.index_path()):
+        return []
+    try:
+        # atuin tags each shell with ATUIN_SESSION, so "previous" means the previous command in this terminal
+        previous = history_index.last_command(os.environ.get("ATUIN_SESSION"))
+        return history_index.predict(prefix, os.getcwd(), previous, limit)
+    except sqlite3.Error:
+        return []
+
+
+def is_known_command(query: str) -> bool:
+    """True if query is a command from history that mostly succeeded, so it needs no suggestion"""
+    if not os.path.exists(history_index.index_path()):
+        return False
+    try:
+        stats = history_index.command_stats(query.strip())
+    except sqlite3.Error:
+        return False
+    return stats is not None and stats[1] < stats[0]
+
+
+def _context_loaders() -> Dict[str, Callable[[], str]]:
+    return {
+        "Recent_Commands": lambda: ", ".join(get_recent_commands()),
+        "Common_Commands": lambda: ", ".join(get_most_common_commands()),
+        "History_Insights": get_history_insights,
+    }
+
+
+def _stale_context_keys() -> List[str]:
+    now = time.monotonic()
+    return [
+        key for key, ttl in CONTEXT_TTL.items()
+        if key not in _context_cache or now - _context_cache[key][0] >= ttl
+    ]
+
+
+def _cached_context_value(key: str, loader) -> str:
+    """Return a cached context value, calling loader() once its TTL has expired"""
+    now = time.monotonic()
+    entry = _context_cache.get(key)
+    if entry is not None and now - entry[0] < CONTEXT_TTL[key]:
+        return entry[1]
+    value = loader()
+    _context_cache[key] = (now, value)
+    return value
+
+
+def invalidate_context_cache(*keys: str) -> None:
+    """Drop cached context values (all of them if no keys are given)"""
+    global _context_refresh
+    _context_refresh = None  # an in-flight refresh may have read the old values
+    if not keys:
+        _context_cache.clear()
+    for key in keys:
+        _context_cache.pop(key, None)
+
+
+def prefetch_global_context() -> None:
+    """Start reloading stale atuin context on the engine, concurrently and without waiting"""
+    global _context_refresh
+    if _context_refresh is not None:
+        if not _context_refresh[1].done():
+            return
+        _collect_context_refresh()
+    stale = _stale_context_keys()
+    if not stale:
+        return
+    from . import engine
+
+    loaders = _context_loaders()
+    _context_refresh = (time.monotonic(), engine.gather({key: loaders[key] for key in stale}))
+
+
+def _collect_context_refresh() -> Dict[str, str]:
+    """Wait for a background refresh, if any, store its values and return them"""
+    global _context_refresh
+    if _context_refresh is None:
+        return {}
+    started, future = _context_refresh
+    _context_refresh = None
+    try:
+        values = future.result()
+    except Exception:
+        return {}  # get_global_context() reloads whatever is still stale
+    for key, value in values.items():
+        _context_cache[key] = (started, value)
+    return values
+
+
 def get_global_context() -> Dict[str, str]:
     """Gather global context information"""
-    context = {
-        "OS": os.name,
-        "PWD": os.getcwd(),
-        "Recent_Commands": ", ".join(get_recent_commands()),
-        "Common_Commands": ", ".join(get_most_common_commands()),
-    }
+    with metrics.span("context"):
+        values = _collect_context_refresh()
+        if len(set(_stale_context_keys()) - set(values)) > 1:
+            # Several atuin reads are due; run them side by side rather than in turn
+            prefetch_global_context()
+            values.update(_collect_context_refresh())
+        loaders = _context_loaders()
+        for key in CONTEXT_TTL:
+            if key not in values:
+                values[key] = _cached_context_value(key, loaders[key])
+        context = {
+            "OS": os.name,
+            "PWD": os.getcwd(),
+            "Recent_Commands": values["Recent_Commands"],
+            "Common_Commands": values["Common_Commands"],
+        }
+        if values["History_Insights"]:
+            context["History_Insights"] = values["History_Insights"]
+        context.update(attachments.context_entries())
+        context.update(_attachments)
     return context
 
 
-def add_file_to_context(filename: str) -> str:
-    """Read file contents and return them as a string"""
-    try:
-        with open(filename, 'r') as file:
-            return file.read()
-    except FileNotFoundError:
-        return f"Error: File '{filename}' not found."
-    except Exception as e:
-        return f"Error reading file '{filename}': {str(e)}"
+def split_prompt(instruction: str, stable: str, volatile: str, history: str, request: str, answer: str):
+    """The prompt as content blocks: a stable prefix marked for prompt caching, then what changes per query
+
+    The prefix (after the system prompt) is the instruction and the stable
+    context, so consecutive queries in the same directory with the same
+    attachments reuse it from the API's cache instead of paying for it again.
+    The API only caches prefixes above a minimum length (1024 tokens for
+    Sonnet); shorter ones are simply processed as usual.
+    """
+    prefix = f"{instruction}\n\nGlobal context:\n{stable}"
+    suffix = f"{volatile}\n\nConversation history:\n{history}\n\n{request}\n\n{answer}"
+    if not PROMPT_CACHE:
+        return f"{prefix}\n{suffix}"
+    return [
+        {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": suffix},
+    ]
 
 
 def get_suggestion(
     query: str,
-    conversation_history: str,
+    conversation_history: List[str],
     global_context: Dict[str, str],
     is_multiline: bool = False,
+    on_text=None,
+    speculative: bool = False,
 ) -> str:
-    """Use Claude to suggest a command or script based on the query, conversation history, and global context"""
-    client = anthropic.Anthropic(api_key=API_KEY)
+    """Use Claude to suggest a command or script based on the query, conversation history, and global context
 
-    context_str = "\n".join([f"{k}: {v}" for k, v in global_context.items()])
+    Speculative requests don't wait for the rate limit; they raise rate_limiter.RateLimited.
+    """
+    stable, volatile, conversation_history = context_builder.build_split_context(
+        query, conversation_history, global_context, "multi" if is_multiline else "command"
+    )
 
     if is_multiline:
-        prompt = f"""Suggest a multiline bash script for the following request, taking into account the conversation history and global context:
-
-Global context:
-{context_str}
-
-Conversation history:
-{conversation_history}
-
-Current request: {query}
-
-Provide only the bash script, without any explanation:"""
+        prompt = split_prompt(
+            "Suggest a multiline bash script for the following request, taking into account the conversation history and global context:",
+            stable,
+            volatile,
+            conversation_history,
+            f"Current request: {query}",
+            "Provide only the bash script, without any explanation:",
+        )
     else:
-        prompt = f"""Suggest a concise command-line instruction for the following request, taking into account the conversation history and global context:
-
-Global context:
-{context_str}
-
-Conversation history:
-{conversation_history}
-
-Current request: {query}
-
-Provide only the command, without any explanation:"""
+        prompt = split_prompt(
+            "Suggest a concise command-line instruction for the following request, taking into account the conversation history and global context:",
+            stable,
+            volatile,
+            conversation_history,
+            f"Current request: {query}",
+            "Provide only the command, without any explanation:",
+        )
 
-    message = rate_limited_api_call(
-        client, prompt, max_tokens=300 if is_multiline else 100
+    return cached_complete(
+        "multi" if is_multiline else "command",
+        query,
+        global_context,
+        prompt,
+        max_tokens=300 if is_multiline else 100,
+        on_text=on_text,
+        history=conversation_history,
+        priority="speculative" if speculative else "interactive",
     )
-    return message.content[0].text.strip()
 
 
-def ask_question(query, conversation_history, global_context: Dict[str, str]):
-    """Use Claude to answer a question based on the query, conversation history, and global context"""
-    client = anthropic.Anthropic(api_key=API_KEY)
+def get_candidates(
+    query: str,
+    conversation_history: List[str],
+    global_context: Dict[str, str],
+    n: int = None,
+) -> List["candidates.Candidate"]:
+    """Ask for n alternative commands in one call and return them ranked locally"""
+    from . import candidates
+
+    n = n or CANDIDATES
+    stable, volatile, conversation_history = context_builder.build_split_context(
+        query, conversation_history, global_context, "command"
+    )
+    prompt = split_prompt(
+        f"Suggest {n} different command-line instructions for the following request, taking into account the conversation history and global context:",
+        stable,
+        volatile,
+        conversation_history,
+        f"Current request: {query}",
+        f"Give each command on its own line, numbered 1 to {n}, best first, without any explanation:",
+    )
 
-    context_str = "\n".join([f"{k}: {v}" for k, v in global_context.items()])
+    reply = cached_complete(
+        f"alt{n}", query, global_context, prompt, max_tokens=100 * n, history=conversation_history
+    )
+    commands = candidates.parse_candidates(reply)[:n]
+    return candidates.rank_with_history(commands, history_command_counts)
 
-    prompt = f"""Answer the following question, taking into account the conversation history and global context:
 
-Global context:
-{context_str}
+def speculative_suggestion(query: str, conversation_history: List[str]) -> str:
+    """Suggestion for a query still being typed, built exactly as the REPL will ask for it"""
+    if is_known_command(query):
+        return query.strip()  # what process_suggestion would run without asking
+    history = conversation_history + [f"User: {query}"]
+    with metrics.request("speculative", "command"):
+        return get_suggestion(query, history, get_global_context(), speculative=True)
 
-Conversation history:
-{conversation_history}
 
-Current question: {query}
+def ask_question(query, conversation_history, global_context: Dict[str, str], on_text=None):
+    """Use Claude to answer a question based on the query, conversation history, and global context"""
+    stable, volatile, conversation_history = context_builder.build_split_context(
+        query, conversation_history, global_context, "ask"
+    )
 
-Provide a concise and informative answer:"""
+    prompt = split_prompt(
+        "Answer the following question, taking into account the conversation history and global context:",
+        stable,
+        volatile,
+        conversation_history,
+        f"Current question: {query}",
+        "Provide a concise and informative answer:",
+    )
 
-    message = rate_limited_api_call(client, prompt, max_tokens=300)
-    return message.content[0].text.strip()
+    return cached_complete(
+        "ask", query, global_context, prompt, max_tokens=300, on_text=on_text, history=conversation_history
+    )
 
 
 def extract_code_from_backticks(text: str) -> str:
@@ -208,6 +582,10 @@ def extract_code_from_backticks(text: str) -> str:
     return text
 
 
+def new_output_capture() -> OutputCapture:
+    return OutputCapture(OUTPUT_CAPTURE_LIMIT, spill_path=session_spill_path() if SPILL_OUTPUT else None)
+
+
 def execute_command(suggested_command, is_multiline=False):
     try:
         suggested_command = extract_code_from_backticks(suggested_command)
@@ -225,7 +603,6 @@ def execute_command(suggested_command, is_multiline=False):
                 shell=True,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
-                text=True,
             )
         else:
             # Add the command to atuin history
@@ -245,15 +622,12 @@ def execute_command(suggested_command, is_multiline=False):
                 shell=True,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
-                text=True,
             )
 
-        captured_output = []
-        for line in process.stdout:
-            print(line, end="")  # Stream to console
-            captured_output.append(line)  # Capture for history
-
+        capture = new_output_capture()
+        stream_and_capture(process.stdout, capture)
         exit_code = process.wait()
+        _turn["exit_code"] = exit_code
 
         if not is_multiline:
             subprocess.run(
@@ -261,32 +635,31 @@ def execute_command(suggested_command, is_multiline=False):
                 shell=True,
                 check=True,
             )
+            # The command we just ran is now the most recent one in atuin
+            invalidate_context_cache("Recent_Commands", "History_Insights")
 
         if is_multiline:
             os.unlink(temp_script_path)
 
-        return "".join(captured_output)
+        return capture.summary()
     except subprocess.CalledProcessError as e:
         print(f"Error executing command: {e}")
         return str(e)
 
 
 def execute_shell_command(command):
-    """Execute a shell command directly, print its output in real-time, and return the full output"""
+    """Execute a shell command directly, print its output in real-time, and return a bounded capture of it"""
     try:
         process = subprocess.Popen(
             command,
             shell=True,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            text=True,
         )
-        output = []
-        for line in process.stdout:
-            print(line, end="")  # Print output in real-time
-            output.append(line)
-        process.wait()
-        return "".join(output)
+        capture = new_output_capture()
+        stream_and_capture(process.stdout, capture)
+        _turn["exit_code"] = process.wait()
+        return capture.summary()
     except subprocess.CalledProcessError as e:
         error_message = f"Error: {e.stderr}"
         print(error_message)
@@ -313,22 +686,11 @@ Conversation History:
 
 
 def webpage_to_markdown(url):
+    """The main content of a webpage as markdown, or None (after printing why) on failure"""
+    from . import web_ingest
+
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        for script in soup(["script", "style"]):
-            script.decompose()
-        
-        text = soup.get_text()
-        
-        h = html2text.HTML2Text()
-        h.ignore_links = False
-        markdown = h.handle(text)
-        
-        return markdown
+        return web_ingest.fetch_markdown(get_http_session(), url, timeout=HTTP_TIMEOUT)
     except Exception as e:
         print(f"Error converting webpage to markdown: {e}")
         return None
@@ -336,13 +698,14 @@ def webpage_to_markdown(url):
 
 def perplexity_query(query: str, conversation_history: List[str], global_context: Dict[str, str]) -> str:
     """Use Perplexity API to get an answer for the given query, including context and conversation history"""
+    import requests
+
     if not PERPLEXITY_API_KEY:
         return "Error: Perplexity API key not set. Please add it to your config file."
 
-    url = "https://api.perplexity.ai/chat/completions"
-    
-    context_str = "\n".join([f"{k}: {v}" for k, v in global_context.items()])
-    history_str = "\n".join(conversation_history)
+    context_str, history_str = context_builder.build_context(
+        query, conversation_history, global_context, "perplexity"
+    )
     
     full_query = f"""Global Context:
 {context_str}
@@ -378,7 +741,9 @@ Please provide a concise and accurate answer based on the above context and quer
     }
 
     try:
-        response = requests.post(url, json=payload, headers=headers)
+        response = get_http_session().post(
+            PERPLEXITY_API_URL, json=payload, headers=headers, timeout=HTTP_TIMEOUT
+        )
         response.raise_for_status()
         result = response.json()
         return result['choices'][0]['message']['content']
@@ -386,18 +751,45 @@ Please provide a concise and accurate answer based on the above context and quer
         return f"Error querying Perplexity API: {str(e)}"
 
 
-def process_suggestion(query, conversation_history):
-    global_context = get_global_context()
+def process_suggestion(query, conversation_history, speculation=None):
+    """Handle one REPL query; speculation is a suggestion already fetched for it"""
+    # LLM and web calls run on the engine so Ctrl-C can abandon them
+    from . import engine
 
     if query.startswith("!"):
         command = query[1:].strip()
         print(f"> {command}")
         captured_output = execute_shell_command(command)
         return command, captured_output, conversation_history
+    elif query.startswith("/alt "):
+        request = query[5:].strip()
+        print("Thinking of alternatives...")
+        ranked = engine.call(get_candidates, request, conversation_history, get_global_context())
+        if not ranked:
+            return f"/alt {request}", "[No suggestions]", conversation_history
+        for number, candidate in enumerate(ranked, 1):
+            print(f"{number}. {candidate.command}{candidate.notes()}")
+        choice = input(f"\nRun which? [1-{len(ranked)}, Enter for 1, n to skip]: ").strip().lower()
+        if choice in ["n", "no"]:
+            return ranked[0].command, "[Command not executed]", conversation_history
+        if choice == "":
+            choice = "1"
+        if not choice.isdigit() or not 1 <= int(choice) <= len(ranked):
+            print("Invalid choice.")
+            return ranked[0].command, "[Command not executed]", conversation_history
+        command = ranked[int(choice) - 1].command
+        return command, execute_command(command), conversation_history
+    elif query.startswith("/fan "):
+        spec, _, request = query[5:].strip().partition(" ")
+        return fan_out_suggestion(spec, request.strip(), conversation_history)
     elif query.startswith("/ask "):
         question = query[5:].strip()
-        answer = ask_question(question, "\n".join(conversation_history), global_context)
-        print(f"Answer: {answer}")
+        global_context = get_global_context()
+        print("Answer: ", end="", flush=True)
+        answer = engine.call(
+            ask_question, question, conversation_history, global_context, on_text=print_stream
+        )
+        print()
         return f"/ask {question}", answer, conversation_history
     elif query.startswith("/sh "):
         command = query[4:].strip()
@@ -406,10 +798,17 @@ def process_suggestion(query, conversation_history):
         return command, captured_output, conversation_history
     elif query.startswith("/multi "):
         script_request = query[7:].strip()
-        suggested_script = get_suggestion(
-            script_request, "\n".join(conversation_history), global_context, is_multiline=True
+        global_context = get_global_context()
+        print("Suggested script:")
+        suggested_script = engine.call(
+            get_suggestion,
+            script_request,
+            conversation_history,
+            global_context,
+            is_multiline=True,
+            on_text=print_stream,
         )
-        print(f"Suggested script:\n{suggested_script}")
+        print()
         
         # Add the suggested script to the conversation history
         conversation_history.append(f"Assistant (multi-line script suggestion):\n{suggested_script}")
@@ -447,32 +846,58 @@ def process_suggestion(query, conversation_history):
         show_global_context()
         return "/context", "Global context displayed", conversation_history
     elif query.startswith("/add "):
-        filename = query[5:].strip()
-        file_contents = add_file_to_context(filename)
-        if file_contents.startswith("Error:"):
-            print(file_contents)
-            return f"/add {filename}", file_contents, conversation_history
-        else:
-            global_context[f"File_{filename}"] = file_contents
-            print(f"Added contents of '{filename}' to the context.")
-            return f"/add {filename}", f"Contents of '{filename}' added to context", conversation_history
+        spec = query[5:].strip()
+        added, skipped = attachments.add(spec)
+        for path, reason in skipped:
+            print(f"Skipped '{path}': {reason}")
+        if not added:
+            message = f"Error: Nothing to add from '{spec}'."
+            print(message)
+            return f"/add {spec}", message, conversation_history
+        print(f"Added {len(added)} file(s) from '{spec}' to the context; relevant parts are sent with each query.")
+        return f"/add {spec}", f"{len(added)} file(s) from '{spec}' added to context", conversation_history
+    elif query == "/drop" or query.startswith("/drop "):
+        spec = query[5:].strip() or "all"
+        if attachments.remove(spec):
+            print(f"Removed '{spec}' from the context.")
+            return f"/drop {spec}", f"'{spec}' removed from context", conversation_history
+        print(f"'{spec}' is not attached. Attached: {', '.join(attachments.attached()) or 'nothing'}")
+        return f"/drop {spec}", f"Error: '{spec}' is not attached", conversation_history
     elif query.startswith("/web "):
         url = query[5:].strip()
-        markdown = webpage_to_markdown(url)
+        markdown = engine.call(webpage_to_markdown, url)
         if markdown:
-            global_context[f"Webpage_{url}"] = markdown[:1000]  # Limit to first 1000 characters
-            print(f"Added content of '{url}' to the context (first 1000 characters).")
+            # Kept whole: context_builder sends the chunks most relevant to each query
+            _attachments[f"Webpage_{url}"] = markdown
+            print(f"Added content of '{url}' to the context ({len(markdown)} characters).")
             return f"/web {url}", f"Content of '{url}' added to context", conversation_history
         else:
             return f"/web {url}", f"Error: Failed to fetch or convert '{url}'", conversation_history
+    elif query.startswith("/recall "):
+        text = query[8:].strip()
+        return f"/recall {text}", recall(text), conversation_history
     elif query.startswith("/perplexity ") or query.startswith("/perp "):
         perplexity_query_text = query[11:].strip() if query.startswith("/perplexity ") else query[6:].strip()
-        answer = perplexity_query(perplexity_query_text, conversation_history, global_context)
+        answer = engine.call(
+            perplexity_query, perplexity_query_text, conversation_history, get_global_context()
+        )
         print(f"Perplexity Answer: {answer}")
         return f"/perplexity {perplexity_query_text}", answer, conversation_history
     else:
-        suggested_command = get_suggestion(query, "\n".join(conversation_history), global_context)
-        print(f"> {suggested_command}")
+        if speculation is not None:
+            suggested_command = speculation
+            print(f"> {suggested_command}")
+        elif is_known_command(query):
+            # Already a command (typed, or taken from the completions): the model has nothing to add
+            suggested_command = query.strip()
+            print(f"> {suggested_command}")
+        else:
+            global_context = get_global_context()
+            print("> ", end="", flush=True)
+            suggested_command = engine.call(
+                get_suggestion, query, conversation_history, global_context, on_text=print_stream
+            )
+            print()
 
         run_choice = input("\nRun? [Y/n]: ").lower()
         if run_choice in ["y", ""]:
@@ -482,18 +907,109 @@ def process_suggestion(query, conversation_history):
             return suggested_command, "[Command not executed]", conversation_history
 
 
-def handle_conversation():
+def fan_out_suggestion(spec: str, request: str, conversation_history):
+    """/fan: get one command for request and run it on every host of the group spec"""
+    from . import engine
+    from . import fanout
+
+    hosts = fanout.resolve_hosts(spec, HOSTGROUPS)
+    if not hosts or not request:
+        groups = ", ".join(sorted(HOSTGROUPS)) or "none configured"
+        message = f"Usage: /fan <hostgroup or host1,host2,...> <query> (host groups: {groups})"
+        print(message)
+        return f"/fan {spec} {request}".strip(), f"Error: {message}", conversation_history
+
+    # The command runs remotely, so the local directory and OS in the context don't apply to it
+    remote_request = f"{request}\n(The command will run over ssh on each of these hosts: {', '.join(hosts)})"
+    print("> ", end="", flush=True)
+    suggested_command = engine.call(
+        get_suggestion, remote_request, conversation_history, get_global_context(), on_text=print_stream
+    )
+    print()
+    command = extract_code_from_backticks(suggested_command)
+    if input(f"\nRun on {len(hosts)} host(s)? [Y/n]: ").lower() not in ["y", ""]:
+        return suggested_command, "[Command not executed]", conversation_history
+
+    results = fanout.fan_out(hosts, command)
+    _turn["exit_code"] = fanout.exit_code(results)
+    summary = fanout.summarize(results)
+    failed = [result.host for result in results if result.exit_code]
+    print(f"\nFinished on {len(hosts)} host(s); " + (f"failed on {', '.join(failed)}." if failed else "all succeeded."))
+    return command, summary, conversation_history
+
+
+def recall(text: str) -> str:
+    """Print what earlier sessions suggested for text (no API call) and return it"""
+    from . import session_store
+
+    exact = session_store.last_answer(text)
+    turns = [t for t in session_store.search(text) if exact is None or t.id != exact.id]
+    if exact is not None:
+        turns.insert(0, exact)
+    if not turns:
+        print(f"Nothing found for '{text}'.")
+        return "[Nothing found]"
+    lines = []
+    for turn in turns:
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(turn.created))
+        status = "" if turn.exit_code is None else f" (exit {turn.exit_code})"
+        suggestion = context_builder.truncate_middle(turn.suggestion, 300)
+        lines.append(f"[{when}] {turn.query}{status}\n    {suggestion}")
+    if exact is not None:
+        print("Last time for this query:")
+    print("\n".join(lines))
+    return "\n".join(lines)
+
+
+def handle_conversation(resume: str = None):
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.completion import ThreadedCompleter
+    from prompt_toolkit.history import FileHistory
+
+    from . import session_store
+    from .completion import HistoryCompleter
+
     conversation_history = []
+    session_id = None
+    if resume is not None:
+        session_id = session_store.resolve_session(resume)
+        if session_id is None:
+            print(f"No saved session '{resume}'; starting a new one.")
+        else:
+            conversation_history = session_store.load_history(session_id)
+            print(f"Resumed session {session_id} ({len(conversation_history)} history entries).")
     history_file = os.path.expanduser("~/.cli_suggest_history")
-    session = PromptSession(history=FileHistory(history_file))
+    # Completions come from the local history index; in a thread so typing never waits on it
+    options = {
+        "history": FileHistory(history_file),
+        "completer": ThreadedCompleter(HistoryCompleter(predict_commands)),
+    }
+    speculator = None
+    if SPECULATIVE:
+        from .speculative import Speculator
+
+        speculator = Speculator(
+            lambda text: speculative_suggestion(text, conversation_history), delay=SPECULATIVE_DELAY
+        )
+        # refresh_interval redraws the toolbar when a background suggestion lands
+        session = PromptSession(bottom_toolbar=speculator.hint, refresh_interval=0.25, **options)
+        session.default_buffer.on_text_changed += lambda buffer: speculator.on_text_changed(buffer.text)
+    else:
+        session = PromptSession(**options)
 
     print("Welcome to CLI Suggest. Available commands:")
     print_help_table()
     print("Enter your request or type '/help' to see the command list again.")
 
     while True:
+        # Stale atuin context reloads in the background while the user types
+        prefetch_global_context()
         try:
             query = session.prompt("> ")
+        except KeyboardInterrupt:
+            if speculator is not None:
+                speculator.reset()
+            continue  # like a shell: Ctrl-C clears the line
         except EOFError:
             break
 
@@ -502,11 +1018,24 @@ def handle_conversation():
         elif query.lower() == "/help":
             print_help_table()
             continue
+        elif query.lower() == "/stats":
+            print(metrics.summary())
+            continue
 
+        turn_start = len(conversation_history)
         conversation_history.append(f"User: {query}")
-        suggested_command, output, updated_history = process_suggestion(
-            query, conversation_history
-        )
+        _turn.clear()
+        try:
+            speculation = speculator.take(query) if speculator is not None else None
+            with metrics.request("repl", session_store.mode_of(query)):
+                suggested_command, output, updated_history = process_suggestion(
+                    query, conversation_history, speculation
+                )
+        except KeyboardInterrupt:
+            print("\n[Cancelled]")
+            conversation_history.append("User: [Cancelled the request]")
+            session_id = save_turn(session_id, query, conversation_history[turn_start:])
+            continue
 
         conversation_history = updated_history
 
@@ -521,6 +1050,70 @@ def handle_conversation():
         if output == "[Command not executed]":
             conversation_history.append("User: [Chose not to execute the command]")
 
+        session_id = save_turn(session_id, query, conversation_history[turn_start:], suggested_command, output)
+
+
+def save_turn(session_id, query, entries, suggested_command=None, output=None):
+    """Record a REPL turn in the session store, starting the session on its first turn"""
+    from . import session_store
+
+    mode = session_store.mode_of(query)
+    if mode in ("ask", "perplexity"):
+        suggestion = output  # the answer
+    elif mode == "multi":
+        suggestion = _turn.get("reply")  # the script; suggested_command is just "/multi ..."
+    elif mode in ("command", "alt", "shell"):
+        suggestion = suggested_command
+    else:
+        suggestion = None
+    if _turn.get("exit_code") is None:
+        output = None  # only the output of something that ran is digested
+    try:
+        if session_id is None:
+            session_id = session_store.start_session(os.getcwd())
+        session_store.record_turn(
+            session_id,
+            query,
+            entries,
+            suggestion=suggestion,
+            exit_code=_turn.get("exit_code"),
+            output=output,
+            latency=_turn.get("latency"),
+        )
+    except sqlite3.Error as e:
+        print(f"Warning: saving the session failed: {e}")
+    return session_id
+
+
+def list_sessions() -> None:
+    from . import session_store
+
+    sessions = session_store.recent_sessions()
+    if not sessions:
+        print("No saved sessions.")
+    for session_id, started, cwd, turns, first_query in sessions:
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(started))
+        print(f"{session_id:>5}  {when}  {turns:>3} turns  {cwd}  {first_query}")
+
+
+def show_next(prefix: str) -> None:
+    """Print the likely next commands, best first, one per line (for shell key bindings)"""
+    try:
+        history_index.refresh(budget=0)
+    except sqlite3.Error as e:
+        print(f"Warning: updating the history index failed: {e}", file=sys.stderr)
+    for command, _ in predict_commands(prefix):
+        print(command)
+
+
+def index_history() -> None:
+    if not atuin_db.available():
+        print(f"No atuin database at {atuin_db.db_path()}.")
+        return
+    start = time.monotonic()
+    rows = history_index.refresh(budget=None)
+    print(f"Indexed {rows} new history entries in {time.monotonic() - start:.1f}s ({history_index.index_path()}).")
+
 
 def show_global_context():
     """Display the current global context"""
@@ -528,9 +1121,12 @@ def show_global_context():
     context_str = "\n".join([f"{k}: {v}" for k, v in context.items()])
     print("\nCurrent Global Context:")
     print(context_str)
+    print(f"\nResponse cache: {response_cache.summary()}")
 
 
 def print_help_table():
+    from prettytable import PrettyTable
+
     table = PrettyTable()
     table.field_names = ["Command", "Description"]
     table.align["Command"] = "l"
@@ -540,11 +1136,16 @@ def print_help_table():
         ["<query>", "Get a command suggestion based on your query"],
         ["!<command>", "Execute a direct bash command"],
         ["/multi <query>", "Get a suggestion for a multiline script"],
+        ["/alt <query>", "Get several alternative commands, ranked, and pick one by number"],
         ["/ask <question>", "Ask a question about command-line operations"],
+        ["/fan <hostgroup> <query>", "Get a command and run it on every host of the group over ssh"],
         ["/sh <command>", "Execute a specific shell command"],
         ["/context", "Display the current global context"],
         ["/copy", "Copy global context and conversation history to clipboard"],
-        ["/add <filename>", "Add file contents to the context"],
+        ["/add <path>", "Attach a file, directory or glob; relevant parts go with each query"],
+        ["/drop [path]", "Detach something added with /add (everything if no path)"],
+        ["/recall <text>", "Show what earlier sessions suggested for similar queries (no API call)"],
+        ["/stats", "Show latency percentiles, cache hit rate and token spend"],
         ["/web <url>", "Add webpage content as markdown to the context"],
         ["/perplexity <query>", "Get an answer using the Perplexity API"],
         ["/perp <query>", "Alias for /perplexity"],
@@ -557,9 +1158,16 @@ def print_help_table():
 
 import base64
 
-def handle_failed_command(failed_command: str) -> None:
-    """Handle a failed command and suggest a fix"""
-    client = anthropic.Anthropic(api_key=API_KEY)
+def suggest_fix(failed_command: str, path: str = None, cwd: str = None) -> str:
+    """Suggest a fix for a failed command, trying the offline typo fixer before Claude
+
+    path and cwd are the $PATH and directory of the shell the command failed in
+    (the daemon's own may differ).
+    """
+    vocabulary = typo_fixer.load_vocabulary(history_command_counts)
+    local = typo_fixer.local_fix(failed_command, vocabulary, path)
+    if local is not None:
+        return local
 
     prompt = f"""A command has failed. Suggest a fix or alternative command.
 
@@ -567,8 +1175,14 @@ Failed command: {failed_command}
 
 Provide only a single command to fix the issue or an alternative command, without any explanation:"""
 
-    message = rate_limited_api_call(client, prompt, max_tokens=200)
-    suggested_command = message.content[0].text.strip()
+    context = {"OS": os.name, "PWD": cwd or os.getcwd()}
+    with metrics.request("hook", "fix"):
+        return cached_complete("fix", failed_command, context, prompt, max_tokens=200, priority="hook")
+
+
+def handle_failed_command(failed_command: str) -> None:
+    """Handle a failed command and suggest a fix"""
+    suggested_command = suggest_fix(failed_command)
 
     print(f"Suggested fix: {suggested_command}")
     
@@ -583,23 +1197,89 @@ def main():
     parser = argparse.ArgumentParser(description="Get command-line suggestions.")
     parser.add_argument("--hook", action="store_true", help="Run in hook mode for failed commands")
     parser.add_argument("--failed-command", help="The failed command")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Serve hook requests over a Unix socket so the shell hook skips Python startup",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Bypass the local response and webpage caches and always ask Claude",
+    )
+    parser.add_argument(
+        "--speculative",
+        action="store_true",
+        help="Fetch a suggestion in the background while you type (uses spare rate limit only)",
+    )
+    parser.add_argument(
+        "--resume",
+        nargs="?",
+        const="last",
+        metavar="SESSION",
+        help="Continue the last REPL session (or the one with this id from --sessions)",
+    )
+    parser.add_argument("--sessions", action="store_true", help="List recent REPL sessions and exit")
+    parser.add_argument(
+        "--next",
+        nargs="?",
+        const="",
+        metavar="PREFIX",
+        help="Print the commands likely to come next (starting with PREFIX) from local history, no API call, and exit",
+    )
+    parser.add_argument(
+        "--index-history",
+        action="store_true",
+        help="Bring the local atuin history index up to date now (it otherwise catches up a little per query)",
+    )
+    parser.add_argument(
+        "--stats",
+        nargs="?",
+        const=0.0,
+        type=float,
+        metavar="DAYS",
+        help="Show latency percentiles, cache hit rate and token spend (of the last DAYS days) and exit",
+    )
     parser.add_argument(
         "query", nargs=argparse.REMAINDER, help="The query for command suggestion"
     )
     args = parser.parse_args()
 
     load_api_keys()
+    if args.no_cache:
+        from . import web_ingest
+
+        response_cache.enabled = False
+        web_ingest.enabled = False
+    if args.speculative:
+        global SPECULATIVE
+        SPECULATIVE = True
 
-    if args.hook:
+    if args.daemon:
+        from . import daemon
+
+        daemon.serve()
+    elif args.hook:
         if not args.failed_command:
             print("Error: --failed-command is required in hook mode")
             sys.exit(1)
         handle_failed_command(args.failed_command)
+    elif args.sessions:
+        list_sessions()
+    elif args.next is not None:
+        show_next(args.next)
+    elif args.index_history:
+        index_history()
+    elif args.stats is not None:
+        print(metrics.summary(time.time() - args.stats * 86400 if args.stats else 0.0))
     elif args.query:
         query = " ".join(args.query)
-        process_suggestion(query, "")
+        from . import session_store
+
+        with metrics.request("oneshot", session_store.mode_of(query)):
+            process_suggestion(query, [])
     else:
-        handle_conversation()
+        handle_conversation(resume=args.resume)
 
 if __name__ == "__main__":
     main()
@@ -22,6 +22,16 @@ cli_suggest_hook() {
     if [[ "$last_command" =~ ^(python|python3|pytest) ]]; then
         echo "Python command detected. Skipping suggestion." >&2
     else
+        # Ask the warm daemon first (see `cli-suggest --daemon`); exit status 75
+        # means it is not running, so fall back to a one-off in-process run.
+        local socket="${CLI_SUGGEST_SOCKET:-$HOME/.cli_suggest/daemon.sock}"
+        local client="$HOME/.cli_suggest/cli_suggest_client.py"
+        if [[ -S "$socket" && -f "$client" ]]; then
+            python3 "$client" --failed-command "$last_command"
+            if [[ $? -ne 75 ]]; then
+                return
+            fi
+        fi
         cli-suggest --hook --failed-command "$last_command"
     fi
 }
@@ -0,0 +1,31 @@
+"""REPL completions for shell commands, from the local history index.
+
+HistoryCompleter completes what is typed as a command (a plain line, `!cmd`
+or `/sh cmd`) with the commands likely to come next: the ones that usually
+followed the previous command, then the ones most run in this directory,
+then anywhere (see history_index.predict). Tab on an empty line lists the
+predictions. Nothing is sent to the API.
+"""
+from typing import Callable, List, Tuple
+
+from prompt_toolkit.completion import Completer, Completion
+
+COMMAND_PREFIXES = ("!", "/sh ")
+
+
+class HistoryCompleter(Completer):
+    def __init__(self, predict: Callable[[str], List[Tuple[str, str]]]):
+        self.predict = predict
+
+    def get_completions(self, document, complete_event):
+        text = document.text_before_cursor
+        for marker in COMMAND_PREFIXES:
+            if text.startswith(marker):
+                text = text[len(marker):]
+                break
+        else:
+            if text.startswith("/"):
+                return  # the other slash commands take questions, paths and URLs
+        prefix = text.lstrip()
+        for command, why in self.predict(prefix):
+            yield Completion(command, start_position=-len(prefix), display_meta=why)
@@ -0,0 +1,250 @@
+"""Assemble prompt context under a per-mode token budget.
+
+Long REPL sessions used to paste the whole global context, every attached file
+and the full conversation (including raw command output) into each prompt.
+build_context() keeps the prompt bounded instead:
+
+- every history entry (command output, suggested or edited scripts) is cut
+  to its head and tail,
+- the latest exchanges are kept first, older ones are added by a
+  recency + query-relevance score until the history share of the budget is used,
+- attached files/webpages are chunked and only the chunks that best match the
+  query are included.
+"""
+import math
+import re
+from typing import Dict, List, Sequence, Tuple, Union
+
+from . import metrics
+
+# Approximate prompt tokens available for context + history in each mode
+MODE_BUDGETS = {
+    "command": 2000,
+    "multi": 4000,
+    "ask": 6000,
+    "perplexity": 6000,
+}
+HISTORY_SHARE = 0.5  # of the budget; attachments get what is left after the base context
+KEEP_RECENT_EXCHANGES = 2
+ENTRY_CHARS = 1500  # per history entry
+FIELD_CHARS = 2000  # per base context field (e.g. Common_Commands)
+CHUNK_CHARS = 1200
+ATTACHMENT_PREFIXES = ("File_", "Webpage_")
+# Global context fields that rarely change between queries (see build_split_context)
+STABLE_FIELDS = ("OS", "PWD", "Common_Commands")
+PINNED_SHARE = 0.5  # of the attached-file budget, for opening chunks in the stable part
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English and code)"""
+    return len(text) // 4 + 1
+
+
+def truncate_middle(text: str, max_chars: int) -> str:
+    """Keep the head and tail of text, replacing the middle with a marker"""
+    if len(text) <= max_chars:
+        return text
+    half = max_chars // 2
+    omitted = len(text) - 2 * half
+    return f"{text[:half]}\n[... {omitted} characters omitted ...]\n{text[-half:]}"
+
+
+def terms(text: str) -> set:
+    return set(re.findall(r"[a-z0-9_./-]{2,}", text.lower()))
+
+
+def relevance(query_terms: set, text: str) -> float:
+    """Overlap between the query and text, damped for long texts"""
+    if not query_terms:
+        return 0.0
+    overlap = len(query_terms & terms(text))
+    return overlap / math.sqrt(1 + estimate_tokens(text) / 100)
+
+
+def _starts_exchange(entry: str) -> bool:
+    # "User: [Chose not to execute the command]" is a note on the previous exchange
+    return entry.startswith("User:") and not entry.startswith("User: [")
+
+
+def split_exchanges(history: Sequence[str]) -> List[List[str]]:
+    """Group history entries into exchanges, each starting at a user query"""
+    exchanges = []
+    for entry in history:
+        if _starts_exchange(entry) or not exchanges:
+            exchanges.append([])
+        exchanges[-1].append(entry)
+    return exchanges
+
+
+def build_history(query: str, history: Sequence[str], budget: int) -> str:
+    """Pick whole exchanges to fit budget tokens, keeping chronological order"""
+    exchanges = [[truncate_middle(e, ENTRY_CHARS) for e in ex] for ex in split_exchanges(history)]
+    if not exchanges:
+        return ""
+    texts = ["\n".join(ex) for ex in exchanges]
+    query_terms = terms(query)
+    newest = len(exchanges) - 1
+
+    # The newest exchange is always kept, cut down to the budget if it has to be
+    texts[newest] = truncate_middle(texts[newest], max(budget, 1) * 4)
+    chosen = {newest}
+    used = estimate_tokens(texts[newest])
+    for i in range(newest - 1, max(-1, newest - KEEP_RECENT_EXCHANGES), -1):
+        cost = estimate_tokens(texts[i])
+        if used + cost > budget:
+            break
+        chosen.add(i)
+        used += cost
+
+    def score(i):
+        recency = 0.85 ** (newest - i)
+        return recency + relevance(query_terms, texts[i])
+
+    for i in sorted(set(range(len(exchanges))) - chosen, key=score, reverse=True):
+        cost = estimate_tokens(texts[i])
+        if used + cost > budget:
+            continue
+        chosen.add(i)
+        used += cost
+
+    parts = []
+    skipped = 0
+    for i, text in enumerate(texts):
+        if i in chosen:
+            if skipped:
+                parts.append(f"[{skipped} earlier exchange(s) omitted]")
+                skipped = 0
+            parts.append(text)
+        else:
+            skipped += 1
+    return "\n".join(parts)
+
+
+def chunk_text(text: str, chunk_chars: int = CHUNK_CHARS) -> List[str]:
+    """Split text on line boundaries into chunks of roughly chunk_chars"""
+    chunks = []
+    current = []
+    size = 0
+    for line in text.splitlines(keepends=True):
+        if size + len(line) > chunk_chars and current:
+            chunks.append("".join(current))
+            current, size = [], 0
+        # A single huge line (minified files) is split hard
+        while len(line) > chunk_chars:
+            chunks.append(line[:chunk_chars])
+            line = line[chunk_chars:]
+        current.append(line)
+        size += len(line)
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def select_chunks(query: str, attachments: Dict[str, str], budget: int) -> List[Tuple[str, str]]:
+    """Return (name, chunk) pairs most relevant to the query that fit in budget tokens"""
+    query_terms = terms(query)
+    candidates = []
+    for name, text in attachments.items():
+        for position, chunk in enumerate(chunk_text(text)):
+            # Earlier chunks win ties: titles, headers and imports come first
+            candidates.append((relevance(query_terms, chunk) - position * 1e-3, name, position, chunk))
+    candidates.sort(key=lambda c: c[0], reverse=True)
+
+    picked = []
+    used = 0
+    for _, name, position, chunk in candidates:
+        cost = estimate_tokens(chunk)
+        if used + cost > budget:
+            continue
+        picked.append((name, position, chunk))
+        used += cost
+    picked.sort(key=lambda p: (p[0], p[1]))
+    return [(name, chunk) for name, _, chunk in picked]
+
+
+def build_context(
+    query: str,
+    history: Union[Sequence[str], str],
+    global_context: Dict[str, str],
+    mode: str,
+) -> Tuple[str, str]:
+    """Return (context_str, history_str) for a prompt, bounded by MODE_BUDGETS[mode]"""
+    with metrics.span("prompt"):
+        stable, volatile, history_str = _build_context(query, history, global_context, mode, pin=False)
+    return "\n".join(stable + volatile), history_str
+
+
+def build_split_context(
+    query: str,
+    history: Union[Sequence[str], str],
+    global_context: Dict[str, str],
+    mode: str,
+) -> Tuple[str, str, str]:
+    """Like build_context, but with the context split into (stable, volatile, history_str)
+
+    The stable part is the same from query to query while the directory and
+    attached files don't change (STABLE_FIELDS, and the opening chunks of
+    attached files), so it can be sent as a prompt-cache prefix; the rest
+    (recent commands, excerpts picked for this query) goes after it.
+    """
+    with metrics.span("prompt"):
+        stable, volatile, history_str = _build_context(query, history, global_context, mode, pin=True)
+    return "\n".join(stable), "\n".join(volatile), history_str
+
+
+def _excerpt_lines(excerpts: Sequence[Tuple[str, str]], label: str) -> List[str]:
+    lines = []
+    current = None
+    for name, chunk in excerpts:
+        if name != current:
+            lines.append(f"{name} ({label}):")
+            current = name
+        lines.append(chunk.rstrip("\n"))
+    return lines
+
+
+def _build_context(
+    query: str,
+    history: Union[Sequence[str], str],
+    global_context: Dict[str, str],
+    mode: str,
+    pin: bool,
+) -> Tuple[List[str], List[str], str]:
+    if isinstance(history, str):
+        history = [history] if history else []
+    budget = MODE_BUDGETS[mode]
+
+    base = {k: v for k, v in global_context.items() if not k.startswith(ATTACHMENT_PREFIXES)}
+    attachments = {k: v for k, v in global_context.items() if k.startswith(ATTACHMENT_PREFIXES)}
+    stable, volatile = [], []
+    for k, v in base.items():
+        (stable if pin and k in STABLE_FIELDS else volatile).append(f"{k}: {truncate_middle(str(v), FIELD_CHARS)}")
+    remaining = budget - estimate_tokens("\n".join(stable + volatile))
+
+    history_str = build_history(query, history, int(remaining * HISTORY_SHARE))
+    remaining -= estimate_tokens(history_str)
+
+    if attachments and remaining > 0:
+        # File_ entries only describe files in the attachments index; pages are chunked here
+        files = [k[len("File_"):] for k in attachments if k.startswith("File_")]
+        pages = {k: v for k, v in attachments.items() if not k.startswith("File_")}
+        if files:
+            from . import attachments as attachment_index
+
+            share = remaining // 2 if pages else remaining
+            pinned = []
+            if pin:
+                # The files' opening chunks (no query terms), the same for every query
+                pinned = attachment_index.search("", files, int(share * PINNED_SHARE))
+                stable += _excerpt_lines([(f"File_{path}", chunk) for path, chunk in pinned], "opening excerpts")
+                share -= sum(estimate_tokens(chunk) for _, chunk in pinned)
+                remaining -= sum(estimate_tokens(chunk) for _, chunk in pinned)
+            found = attachment_index.search(query, files, share, exclude=pinned)
+            excerpts = [(f"File_{path}", chunk) for path, chunk in found]
+            remaining -= sum(estimate_tokens(chunk) for _, chunk in excerpts)
+        else:
+            excerpts = []
+        if pages:
+            excerpts += select_chunks(query, pages, remaining)
+        volatile += _excerpt_lines(excerpts, "relevant excerpts")
+    return stable, volatile, history_str
@@ -0,0 +1,84 @@
+"""Long-running server that answers failure-hook requests over a Unix socket.
+
+Start it with `cli-suggest --daemon`. The hook talks to it through
+daemon_client.py, which only needs the standard library, so a failing command
+no longer pays for importing anthropic and friends or building a new client.
+
+Protocol: one JSON object per line in each direction.
+    {"op": "ping"}                      -> {"ok": true}
+    {"op": "fix", "command": "gti st", "path": "$PATH", "cwd": "$PWD"}
+                                        -> {"ok": true, "suggestion": "...", "command": "git st"}
+
+"suggestion" is the raw reply to show; "command" has code fences stripped.
+"""
+import json
+import os
+import socketserver
+import sys
+
+from . import cli_suggest, typo_fixer
+
+
+def socket_path() -> str:
+    """Where the daemon listens, overridable with CLI_SUGGEST_SOCKET"""
+    return os.environ.get("CLI_SUGGEST_SOCKET") or os.path.expanduser("~/.cli_suggest/daemon.sock")
+
+
+def handle_request(request: dict) -> dict:
+    op = request.get("op")
+    if op == "ping":
+        return {"ok": True}
+    if op == "fix":
+        suggestion = cli_suggest.suggest_fix(
+            request["command"], path=request.get("path"), cwd=request.get("cwd")
+        )
+        return {
+            "ok": True,
+            "suggestion": suggestion,
+            "command": cli_suggest.extract_code_from_backticks(suggestion),
+        }
+    return {"ok": False, "error": f"Unknown op: {op!r}"}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = handle_request(json.loads(line))
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+            self.wfile.write(json.dumps(reply).encode() + b"\n")
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(path: str = None) -> socketserver.BaseServer:
+    """Bind the daemon socket (replacing a stale one) without serving yet"""
+    path = path or socket_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.unlink(path)
+    server = _Server(path, _Handler)
+    os.chmod(path, 0o600)
+    return server
+
+
+def serve(path: str = None) -> None:
+    """Warm up the client and typo vocabulary, then serve until interrupted"""
+    path = path or socket_path()
+    cli_suggest.get_client()
+    # The fix path only needs the vocabulary; the global context is never used here
+    typo_fixer.load_vocabulary(cli_suggest.history_command_counts)
+    server = make_server(path)
+    print(f"cli-suggest daemon listening on {path}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
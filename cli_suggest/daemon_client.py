@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Failure-hook client for the cli-suggest daemon.
+
+This file must only import the standard library: the installer copies it to
+~/.cli_suggest/cli_suggest_client.py and the shell hook runs it directly, so
+startup stays in the tens of milliseconds. Exit status EXIT_NO_DAEMON tells
+the hook to fall back to `cli-suggest --hook`.
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+
+EXIT_NO_DAEMON = 75  # EX_TEMPFAIL
+TIMEOUT = 60.0
+
+
+def socket_path() -> str:
+    return os.environ.get("CLI_SUGGEST_SOCKET") or os.path.expanduser("~/.cli_suggest/daemon.sock")
+
+
+def request(payload: dict, path: str = None, timeout: float = TIMEOUT) -> dict:
+    """Send one request to the daemon and return its reply; raises OSError if it is down"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path or socket_path())
+        sock.sendall(json.dumps(payload).encode() + b"\n")
+        with sock.makefile("rb") as reply:
+            line = reply.readline()
+    if not line:
+        raise ConnectionError("daemon closed the connection")
+    return json.loads(line)
+
+
+def run_command(command: str) -> int:
+    """Run the accepted fix in the user's shell, recording it in atuin like execute_command does"""
+    atuin = shutil.which("atuin")
+    atuin_id = None
+    if atuin:
+        started = subprocess.run(
+            [atuin, "history", "start", "--", command], capture_output=True, text=True
+        )
+        atuin_id = started.stdout.strip() if started.returncode == 0 else None
+    exit_code = subprocess.call(command, shell=True)
+    if atuin_id:
+        subprocess.run([atuin, "history", "end", "--exit", str(exit_code), atuin_id])
+    return exit_code
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Ask the cli-suggest daemon to fix a failed command.")
+    parser.add_argument("--failed-command", required=True)
+    args = parser.parse_args(argv)
+
+    try:
+        reply = request({
+            "op": "fix",
+            "command": args.failed_command,
+            "path": os.environ.get("PATH", ""),
+            "cwd": os.getcwd(),
+        })
+    except (OSError, ValueError):
+        return EXIT_NO_DAEMON
+    if not reply.get("ok"):
+        print(f"Error: {reply.get('error')}", file=sys.stderr)
+        return 1
+
+    print(f"Suggested fix: {reply['suggestion']}")
+    run_choice = input("\nRun this command? [Y/n]: ").lower()
+    if run_choice in ["y", ""]:
+        return run_command(reply["command"])
+    print("Command not executed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
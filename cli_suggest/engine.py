@@ -0,0 +1,97 @@
+"""Background asyncio loop for the REPL's slow work.
+
+The REPL stays a plain synchronous prompt_toolkit loop; everything that waits
+on the network or on atuin is handed to one event loop running in a daemon
+thread. That lets context gathering run concurrently (and start while the user
+is still typing) and lets Ctrl-C abandon an LLM call or web fetch without
+ending the session.
+
+Blocking functions run in the loop's thread pool. Cancelling them is
+cooperative: run() sets an event that long-running loops poll through
+cancelled() (the streaming LLM call and the web fetch do).
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+from typing import Callable, Dict
+
+_loop = None
+_loop_lock = threading.Lock()
+_cancel_event: contextvars.ContextVar = contextvars.ContextVar("cli_suggest_cancel_event", default=None)
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the engine's event loop, starting its thread on first use"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="cli-suggest-engine", daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+def submit(coro) -> concurrent.futures.Future:
+    """Schedule a coroutine on the engine loop from any thread"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def cancelled() -> bool:
+    """True once the job running the current function has been cancelled"""
+    event = _cancel_event.get()
+    return event is not None and event.is_set()
+
+
+class Job:
+    """A blocking call running on the engine; result() waits and handles Ctrl-C"""
+
+    def __init__(self, future: concurrent.futures.Future, event: threading.Event):
+        self.future = future
+        self.event = event
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def cancel(self) -> None:
+        self.event.set()
+        self.future.cancel()
+
+    def result(self, timeout: float = None):
+        """Wait for the call; on Ctrl-C cancel it and re-raise KeyboardInterrupt"""
+        try:
+            return self.future.result(timeout)
+        except KeyboardInterrupt:
+            self.cancel()
+            raise
+
+
+async def _in_thread(context: contextvars.Context, fn: Callable, args, kwargs):
+    return await asyncio.to_thread(context.run, fn, *args, **kwargs)
+
+
+def run(fn: Callable, *args, **kwargs) -> Job:
+    """Start fn(*args, **kwargs) in the engine's thread pool
+
+    fn runs in a copy of the caller's context (so e.g. the metrics record of
+    the request follows it) with its own cancel event.
+    """
+    event = threading.Event()
+    context = contextvars.copy_context()
+    context.run(_cancel_event.set, event)
+    return Job(submit(_in_thread(context, fn, args, kwargs)), event)
+
+
+def call(fn: Callable, *args, **kwargs):
+    """run() and wait for the result (Ctrl-C cancels it)"""
+    return run(fn, *args, **kwargs).result()
+
+
+async def _gather(loaders: Dict[str, Callable]) -> Dict:
+    values = await asyncio.gather(*(asyncio.to_thread(fn) for fn in loaders.values()))
+    return dict(zip(loaders, values))
+
+
+def gather(loaders: Dict[str, Callable]) -> concurrent.futures.Future:
+    """Run several blocking loaders concurrently; the future resolves to {name: value}"""
+    return submit(_gather(loaders))
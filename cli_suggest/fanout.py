@@ -0,0 +1,144 @@
+"""Run one command on many hosts over ssh: the REPL's `/fan <hostgroup> <query>`.
+
+Host groups are named lists of ssh destinations (CLI_SUGGEST_HOSTGROUPS in
+the config file); a comma-separated list of hosts works as an ad-hoc group.
+fan_out() runs the command on at most POOL_SIZE hosts at a time. ssh is told
+to multiplex (ControlMaster/ControlPersist), so the first command to a host
+opens a connection that the next /fan reuses for CONTROL_PERSIST seconds
+instead of paying for a new handshake.
+
+Each output line is printed as it arrives, prefixed with its host, and each
+host's bounded output and exit code come back as a HostResult. summarize()
+groups hosts that printed the same thing and diffs the odd ones out against
+the most common output; that summary is what goes into the conversation
+history.
+
+The executor is `argv`, a function from (host, command) to the process to
+run; ssh_argv is the real one, and tests pass one that runs locally.
+"""
+import difflib
+import os
+import subprocess
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from .context_builder import truncate_middle
+from .output_capture import OutputCapture
+
+POOL_SIZE = 8  # hosts running at once
+CONNECT_TIMEOUT = 10  # seconds
+CONTROL_PERSIST = 300  # seconds an idle multiplexed connection stays open
+OUTPUT_LIMIT = 64 * 1024  # bytes of output kept per host
+SUMMARY_CHARS = 2000  # of the common output, in the summary
+DIFF_LINES = 20  # per differing host, in the summary
+SSH_FAILED = 255  # ssh's own exit code when it can't connect
+
+
+class HostResult(NamedTuple):
+    host: str
+    exit_code: int
+    output: str
+
+
+def resolve_hosts(spec: str, groups: Dict[str, List[str]]) -> List[str]:
+    """Hosts of the named group, or of a comma-separated list ([] if neither)"""
+    if spec in groups:
+        return list(groups[spec])
+    if "," not in spec:
+        return []  # a mistyped group name shouldn't become an ssh destination
+    return [host.strip() for host in spec.split(",") if host.strip()]
+
+
+def control_dir() -> str:
+    return os.path.expanduser("~/.cli_suggest/ssh")
+
+
+def ssh_argv(host: str, command: str) -> List[str]:
+    os.makedirs(control_dir(), mode=0o700, exist_ok=True)
+    return [
+        "ssh",
+        "-T",
+        "-o", "BatchMode=yes",  # no password prompts from several hosts at once
+        "-o", f"ConnectTimeout={CONNECT_TIMEOUT}",
+        "-o", "ControlMaster=auto",
+        # %C is a hash of the destination: short enough for the socket path limit
+        "-o", f"ControlPath={control_dir()}/%C",
+        "-o", f"ControlPersist={CONTROL_PERSIST}",
+        host,
+        command,
+    ]
+
+
+def line_printer(hosts: List[str]) -> Callable[[str, str], None]:
+    """emit(host, line) printing "host | line" with the hosts aligned, whole lines at a time"""
+    width = max(len(host) for host in hosts)
+    lock = threading.Lock()
+
+    def emit(host: str, line: str) -> None:
+        with lock:
+            print(f"{host:<{width}} | {line}", flush=True)
+
+    return emit
+
+
+def run_on_host(host: str, command: str, argv: Callable, emit: Callable[[str, str], None]) -> HostResult:
+    capture = OutputCapture(OUTPUT_LIMIT)
+    try:
+        # stdin is the REPL's; a remote command must not read it
+        process = subprocess.Popen(
+            argv(host, command), stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+        )
+    except OSError as e:
+        emit(host, f"[failed to start: {e}]")
+        return HostResult(host, SSH_FAILED, str(e))
+    try:
+        for line in process.stdout:
+            capture.feed(line)
+            emit(host, line.decode("utf-8", errors="replace").rstrip("\n"))
+    finally:
+        capture.close()
+    return HostResult(host, process.wait(), capture.summary())
+
+
+def fan_out(
+    hosts: List[str],
+    command: str,
+    argv: Optional[Callable] = None,
+    emit: Optional[Callable[[str, str], None]] = None,
+    pool_size: int = POOL_SIZE,
+) -> List[HostResult]:
+    """Run command on every host, pool_size at a time; results in hosts order"""
+    argv = argv or ssh_argv
+    emit = emit or line_printer(hosts)
+    with ThreadPoolExecutor(max_workers=min(pool_size, len(hosts))) as pool:
+        return list(pool.map(lambda host: run_on_host(host, command, argv, emit), hosts))
+
+
+def exit_code(results: List[HostResult]) -> int:
+    """0 if every host succeeded, else the first failing host's exit code"""
+    return next((result.exit_code for result in results if result.exit_code), 0)
+
+
+def summarize(results: List[HostResult]) -> str:
+    """Exit codes, the output most hosts agree on, and a diff for each host that differs"""
+    lines = ["exit codes: " + ", ".join(f"{result.host}={result.exit_code}" for result in results)]
+    common, count = Counter(result.output for result in results).most_common(1)[0]
+    agreeing = [result.host for result in results if result.output == common]
+    if count == len(results):
+        lines.append(f"all {count} hosts printed:")
+    else:
+        lines.append(f"{count} of {len(results)} hosts ({', '.join(agreeing)}) printed:")
+    lines.append(truncate_middle(common, SUMMARY_CHARS).rstrip("\n") or "[no output]")
+    for result in results:
+        if result.output == common:
+            continue
+        diff = list(difflib.unified_diff(
+            common.splitlines(), result.output.splitlines(), agreeing[0], result.host, n=1, lineterm=""
+        ))
+        if len(diff) > DIFF_LINES:
+            diff = diff[:DIFF_LINES] + [f"[... {len(diff) - DIFF_LINES} more diff lines ...]"]
+        lines.append(f"{result.host} differs:")
+        lines.extend(diff)
+    return "\n".join(lines)
@@ -0,0 +1,330 @@
+"""Precomputed statistics over atuin history, so richer context costs nothing per query.
+
+The index lives in ~/.cli_suggest/history_index.db (or
+CLI_SUGGEST_HISTORY_INDEX_PATH) and holds, for every directory and for all
+directories together (cwd ''):
+
+- how often each command ran there, how often it failed, and a
+  recency-weighted score (each run counts 1, halving every HALF_LIFE),
+- "next command" transitions: which command followed which within the same
+  atuin session.
+
+refresh() reads only the atuin rows added since the last history rowid it
+saw, and stops after REFRESH_BUDGET seconds (the rest is picked up by the
+next call), so it can run in the background before every query. atuin
+replaces the text of deleted commands, so deletions can't be subtracted;
+when atuin's count of deleted rows changes, the index is rebuilt from
+scratch instead, and deleted commands never linger in it.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from . import atuin_db
+
+HALF_LIFE = 14 * 86400  # seconds
+REFRESH_BUDGET = 0.25  # seconds of indexing per refresh()
+BATCH_ROWS = 2000
+DELETION_CHECK_INTERVAL = 3600  # seconds
+CHAIN_GAP = 3600  # seconds; a command run this long after the previous one doesn't continue a chain
+SESSION_TTL = 86400  # forget the last command of sessions idle this long
+TRANSITION_TTL = 90 * 86400  # drop transitions seen only once, this long ago
+NOT_FAILURES = {0, -1, 130}  # success, still running or unknown, Ctrl-C
+MIN_RUNS_FOR_FAILURE_RATE = 3
+FAILURE_RATE = 0.3
+
+_connection = None
+_lock = threading.Lock()
+
+
+def index_path() -> str:
+    return os.environ.get("CLI_SUGGEST_HISTORY_INDEX_PATH") or os.path.expanduser(
+        "~/.cli_suggest/history_index.db"
+    )
+
+
+def _decay(age: float) -> float:
+    return 0.5 ** (age / HALF_LIFE)
+
+
+def _connect() -> sqlite3.Connection:
+    global _connection
+    if _connection is None:
+        path = index_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")  # a lost refresh is simply redone
+        conn.create_function("decay", 1, _decay, deterministic=True)
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS commands (
+                cwd TEXT NOT NULL,
+                command TEXT NOT NULL,
+                runs INTEGER NOT NULL,
+                failures INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                score REAL NOT NULL,
+                PRIMARY KEY (cwd, command)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_commands_runs ON commands(cwd, runs);
+            CREATE TABLE IF NOT EXISTS transitions (
+                cwd TEXT NOT NULL,
+                prev TEXT NOT NULL,
+                command TEXT NOT NULL,
+                runs INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (cwd, prev, command)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS sessions (
+                session TEXT PRIMARY KEY,
+                command TEXT NOT NULL,
+                timestamp REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_timestamp ON sessions(timestamp);
+            """
+        )
+        _connection = conn
+    return _connection
+
+
+def close() -> None:
+    global _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+        _connection = None
+
+
+def _get(conn: sqlite3.Connection, key: str, default: float = 0.0) -> float:
+    row = conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def _set(conn: sqlite3.Connection, key: str, value: float) -> None:
+    conn.execute("INSERT OR REPLACE INTO state VALUES (?, ?)", (key, value))
+
+
+def _reset(conn: sqlite3.Connection) -> None:
+    for table in ("commands", "transitions", "sessions", "state"):
+        conn.execute(f"DELETE FROM {table}")
+
+
+# Merging two (runs, failures, last_used, score) aggregates: scores decay to the later last_used
+_MERGE_COMMANDS = """
+    INSERT INTO commands VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (cwd, command) DO UPDATE SET
+        runs = runs + excluded.runs,
+        failures = failures + excluded.failures,
+        score = score * decay(MAX(last_used, excluded.last_used) - last_used)
+              + excluded.score * decay(MAX(last_used, excluded.last_used) - excluded.last_used),
+        last_used = MAX(last_used, excluded.last_used)
+"""
+_MERGE_TRANSITIONS = """
+    INSERT INTO transitions VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (cwd, prev, command) DO UPDATE SET
+        runs = runs + excluded.runs, last_used = MAX(last_used, excluded.last_used)
+"""
+
+
+def _apply(conn: sqlite3.Connection, rows) -> None:
+    """Count a batch of history rows, aggregated in memory first (one upsert per distinct key)"""
+    commands: Dict[Tuple[str, str], List[float]] = {}  # -> [runs, failures, last_used, score]
+    transitions: Dict[Tuple[str, str, str], List[float]] = {}  # -> [runs, last_used]
+    sessions = {}
+    for _, timestamp, command, cwd, exit_code, session in rows:
+        failed = int(exit_code not in NOT_FAILURES)
+        for scope in ("", cwd):
+            entry = commands.get((scope, command))
+            if entry is None:
+                commands[(scope, command)] = [1, failed, timestamp, 1.0]
+            else:
+                last = max(entry[2], timestamp)
+                entry[3] = entry[3] * _decay(last - entry[2]) + _decay(last - timestamp)
+                entry[0] += 1
+                entry[1] += failed
+                entry[2] = last
+        if session not in sessions:
+            row = conn.execute("SELECT command, timestamp FROM sessions WHERE session = ?", (session,)).fetchone()
+            sessions[session] = tuple(row) if row else None
+        previous = sessions[session]
+        if previous and previous[0] != command and 0 <= timestamp - previous[1] <= CHAIN_GAP:
+            for scope in ("", cwd):
+                entry = transitions.setdefault((scope, previous[0], command), [0, timestamp])
+                entry[0] += 1
+                entry[1] = max(entry[1], timestamp)
+        sessions[session] = (command, timestamp)
+    conn.executemany(_MERGE_COMMANDS, [key + tuple(value) for key, value in commands.items()])
+    conn.executemany(_MERGE_TRANSITIONS, [key + tuple(value) for key, value in transitions.items()])
+    conn.executemany(
+        "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+        [(session, command, timestamp) for session, (command, timestamp) in sessions.items()],
+    )
+
+
+def refresh(budget: Optional[float] = REFRESH_BUDGET) -> int:
+    """Index atuin rows added since the last refresh, for up to budget seconds (None: all); return rows indexed"""
+    if not atuin_db.available():
+        return 0
+    deadline = None if budget is None else time.monotonic() + budget
+    indexed = 0
+    with _lock:
+        conn = _connect()
+        now = time.time()
+        if now - _get(conn, "deletions_checked") >= DELETION_CHECK_INTERVAL:
+            deleted = atuin_db.deleted_count()
+            if deleted != _get(conn, "deleted_rows", -1):
+                _reset(conn)
+            _set(conn, "deleted_rows", deleted)
+            _set(conn, "deletions_checked", now)
+
+        # Bigger batches aggregate better when there is no deadline to keep
+        limit = BATCH_ROWS if deadline is not None else BATCH_ROWS * 25
+        while True:
+            rows = atuin_db.history_after(int(_get(conn, "last_rowid")), limit)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if rows:
+                    _apply(conn, rows)
+                    _set(conn, "last_rowid", rows[-1][0])
+                _set(conn, "caught_up", int(len(rows) < limit))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            indexed += len(rows)
+            if len(rows) < limit or (deadline is not None and time.monotonic() >= deadline):
+                break
+        conn.execute("DELETE FROM sessions WHERE timestamp < ?", (now - SESSION_TTL,))
+        if indexed:
+            # One-off transitions that never repeated are noise, and most of the table
+            conn.execute("DELETE FROM transitions WHERE runs = 1 AND last_used < ?", (now - TRANSITION_TTL,))
+    return indexed
+
+
+def caught_up() -> bool:
+    """True once the index holds all of atuin's history (as of the last refresh)"""
+    if not os.path.exists(index_path()):
+        return False
+    with _lock:
+        return bool(_get(_connect(), "caught_up"))
+
+
+def _prefix_range(prefix: str) -> Tuple[str, str]:
+    # Every string starting with prefix sorts in [prefix, prefix + U+10FFFF), so the primary key is range-scanned
+    return prefix, prefix + "\U0010ffff"
+
+
+def top_commands(limit: int = 50, cwd: str = "", prefix: str = "") -> List[Tuple[str, int]]:
+    """(command, runs) starting with prefix, most run first, in cwd ('' for everywhere)"""
+    if prefix:
+        # +runs keeps SQLite off idx_commands_runs, which would walk every command in cwd
+        # looking for a rare prefix; sorting the prefix's key range is fast either way
+        query = "SELECT command, runs FROM commands WHERE cwd = ? AND command >= ? AND command < ? ORDER BY +runs"
+        params = (cwd,) + _prefix_range(prefix)
+    else:
+        query, params = "SELECT command, runs FROM commands WHERE cwd = ? ORDER BY runs", (cwd,)
+    with _lock:
+        return _connect().execute(query + " DESC LIMIT ?", params + (limit,)).fetchall()
+
+
+def command_stats(command: str, cwd: str = "") -> Optional[Tuple[int, int]]:
+    """(runs, failures) of exactly this command, or None if it was never run"""
+    with _lock:
+        row = _connect().execute(
+            "SELECT runs, failures FROM commands WHERE cwd = ? AND command = ?", (cwd, command)
+        ).fetchone()
+    return tuple(row) if row else None
+
+
+def directory_commands(cwd: str, limit: int = 10, now: Optional[float] = None) -> List[Tuple[str, int]]:
+    """(command, runs) in cwd by recency-weighted score"""
+    now = time.time() if now is None else now
+    with _lock:
+        return _connect().execute(
+            "SELECT command, runs FROM commands WHERE cwd = ? "
+            "ORDER BY score * decay(? - last_used) DESC LIMIT ?",
+            (cwd, now, limit),
+        ).fetchall()
+
+
+def next_commands(prev: str, cwd: str = "", limit: int = 5, prefix: str = "") -> List[Tuple[str, int]]:
+    """(command, times) that followed prev, counting transitions in cwd double"""
+    with _lock:
+        rows = _connect().execute(
+            "SELECT command, SUM(CASE WHEN cwd = '' THEN runs ELSE runs * 2 END) AS weight "
+            "FROM transitions WHERE prev = ? AND cwd IN ('', ?) AND command >= ? AND command < ? "
+            "GROUP BY command ORDER BY weight DESC LIMIT ?",
+            (prev, cwd) + _prefix_range(prefix) + (limit,),
+        ).fetchall()
+    return [(command, int(weight)) for command, weight in rows]
+
+
+def failing_commands(cwd: str, limit: int = 5) -> List[Tuple[str, int, int]]:
+    """(command, failures, runs) that often fail in cwd"""
+    with _lock:
+        return _connect().execute(
+            "SELECT command, failures, runs FROM commands WHERE cwd = ? AND runs >= ? "
+            "AND failures >= ? * runs ORDER BY failures DESC LIMIT ?",
+            (cwd, MIN_RUNS_FOR_FAILURE_RATE, FAILURE_RATE, limit),
+        ).fetchall()
+
+
+def last_command(session: Optional[str] = None) -> Optional[str]:
+    """The newest command the index has seen in session (None: in any session)"""
+    with _lock:
+        conn = _connect()
+        row = None
+        if session:
+            row = conn.execute("SELECT command FROM sessions WHERE session = ?", (session,)).fetchone()
+        if row is None:
+            row = conn.execute("SELECT command FROM sessions ORDER BY timestamp DESC LIMIT 1").fetchone()
+    return row[0] if row else None
+
+
+def predict(prefix: str = "", cwd: str = "", prev: Optional[str] = None, limit: int = 10) -> List[Tuple[str, str]]:
+    """Likely commands starting with prefix, best first, as (command, why)
+
+    A back-off over the index: commands that followed prev ("next"), then
+    the ones most run in cwd ("here"), then the most run anywhere
+    ("history"). Every lookup is a key range scan, a few ms at most.
+    """
+    ranked: Dict[str, str] = {}
+    tiers = [
+        ("next", lambda: next_commands(prev, cwd, limit, prefix) if prev else []),
+        ("here", lambda: top_commands(limit, cwd, prefix) if cwd else []),
+        ("history", lambda: top_commands(limit, prefix=prefix)),
+    ]
+    for why, lookup in tiers:
+        for command, _ in lookup():
+            # Completing to what was typed already, or the command just run (up-arrow has it), is no help
+            if command not in (prefix, prev):
+                ranked.setdefault(command, why)
+        if len(ranked) >= limit:
+            break
+    return list(ranked.items())[:limit]
+
+
+def insights(cwd: str) -> str:
+    """Refresh the index, then summarize what it knows about cwd for the global context"""
+    if refresh() == 0 and not os.path.exists(index_path()):
+        return ""
+    lines = []
+    here = directory_commands(cwd)
+    if here:
+        lines.append("frequent in this directory: " + ", ".join(f"{command} ({runs}x)" for command, runs in here))
+    previous = last_command()
+    if previous:
+        following = next_commands(previous, cwd)
+        if following:
+            lines.append(f"usually run after `{previous}`: " + ", ".join(command for command, _ in following))
+    failing = failing_commands(cwd)
+    if failing:
+        lines.append(
+            "often fails here: "
+            + ", ".join(f"{command} ({failures} of {runs} runs)" for command, failures, runs in failing)
+        )
+    return "; ".join(lines)
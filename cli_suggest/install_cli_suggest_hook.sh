@@ -7,8 +7,10 @@ HOOK_SCRIPT="$SCRIPT_DIR/cli_suggest_hook.sh"
 if [ ! -f "$HOOK_SCRIPT" ]; then
     HOOK_SCRIPT="$SCRIPT_DIR/../cli_suggest/cli_suggest_hook.sh"
 fi
+CLIENT_SCRIPT="$(dirname "$HOOK_SCRIPT")/daemon_client.py"
 DEST_DIR="$HOME/.cli_suggest"
 DEST_SCRIPT="$DEST_DIR/cli_suggest_hook.sh"
+DEST_CLIENT="$DEST_DIR/cli_suggest_client.py"
 
 # Create destination directory if it doesn't exist
 mkdir -p "$DEST_DIR"
@@ -19,6 +21,10 @@ cp "$HOOK_SCRIPT" "$DEST_SCRIPT"
 # Make the script executable
 chmod +x "$DEST_SCRIPT"
 
+# Copy the stdlib-only daemon client used by the hook
+cp "$CLIENT_SCRIPT" "$DEST_CLIENT"
+chmod +x "$DEST_CLIENT"
+
 # Function to add hook to shell config file
 add_hook_to_config() {
     local config_file="$1"
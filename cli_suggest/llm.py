@@ -1,6 +1,8 @@
 import argparse
 import sys
 
+from . import metrics
+from . import stdin_input
 from .anthropic_client import AnthropicClient
 
 def main():
@@ -13,20 +15,101 @@ def main():
         nargs="?",
         const="",
     )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Run the prompt against each stdin line (text or JSON) and write JSONL results",
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent requests in --batch and --map-reduce modes")
+    parser.add_argument(
+        "--unordered",
+        action="store_true",
+        help="In --batch mode, write results as they finish instead of in input order",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        help="In --batch mode, save finished results here and skip them when re-run",
+    )
+    parser.add_argument(
+        "--max-input-tokens",
+        type=int,
+        default=stdin_input.MAX_INPUT_TOKENS,
+        help="Cap on stdin sent in one request (about 4 bytes per token); the middle of longer input is left out",
+    )
+    parser.add_argument(
+        "--sample",
+        action="store_true",
+        help="When stdin is over the cap, send evenly spaced lines instead of its head and tail",
+    )
+    parser.add_argument(
+        "--map-reduce",
+        action="store_true",
+        help="Take notes on each chunk of a long stdin concurrently, then combine them into one answer",
+    )
+    parser.add_argument(
+        "--chunk-tokens",
+        type=int,
+        default=stdin_input.CHUNK_TOKENS,
+        help="Chunk size in --map-reduce mode",
+    )
     args = parser.parse_args()
+    max_bytes = args.max_input_tokens * stdin_input.BYTES_PER_TOKEN
 
     anthropic_client = AnthropicClient()
 
-    # Read input from stdin
-    stdin_input = sys.stdin.read().strip()
+    def measured(mode, fn):
+        # Each API call is its own request in --stats (batch lines run on pool threads)
+        def run(prompt):
+            with metrics.request("llm", mode):
+                return fn(prompt)
+
+        return run
+
+    if args.batch:
+        from . import batch
+
+        instruction = args.prompt or ""
 
-    if args.prompt is not None:
-        prompt = f"{args.prompt}\n{stdin_input}".strip()
-    else:
-        prompt = stdin_input
+        complete = measured("batch", lambda prompt: anthropic_client.complete(prompt, priority="batch"))
+
+        def process(record):
+            return complete(f"{instruction}\n{record}".strip())
+
+        failures = batch.run(
+            sys.stdin,
+            sys.stdout,
+            process,
+            workers=args.workers,
+            ordered=not args.unordered,
+            checkpoint=args.checkpoint,
+        )
+        if failures:
+            print(f"{failures} record(s) failed", file=sys.stderr)
+            sys.exit(1)
+        return
 
     try:
-        anthropic_client.stream_response(prompt)
+        if args.map_reduce:
+            stdin_input.map_reduce(
+                sys.stdin.buffer,
+                args.prompt,
+                measured("map-reduce", lambda prompt: anthropic_client.complete(prompt, priority="batch")),
+                measured("map-reduce", anthropic_client.stream_response),
+                chunk_bytes=args.chunk_tokens * stdin_input.BYTES_PER_TOKEN,
+                max_bytes=max_bytes,
+                workers=args.workers,
+            )
+            return
+
+        # Read stdin in blocks, keeping no more than the cap in memory
+        stdin_text = stdin_input.read_capped(sys.stdin.buffer, max_bytes, sample=args.sample).strip()
+
+        if args.prompt is not None:
+            prompt = f"{args.prompt}\n{stdin_text}".strip()
+        else:
+            prompt = stdin_text
+
+        measured("prompt", anthropic_client.stream_response)(prompt)
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
         sys.exit(1)
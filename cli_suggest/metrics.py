@@ -0,0 +1,273 @@
+"""Local latency and token accounting, for /stats and --stats.
+
+Each request (a REPL turn, a one-shot query, a hook fix, an `llm` run, a
+speculative suggestion) is wrapped in request(), and the code it runs adds
+to the current record through a context variable:
+
+    context          gathering the global context (atuin, attachments)
+    prompt           building the prompt (history and attachment selection)
+    rate_limit_wait  waiting for the shared rate limit, including 429 backoff
+    ttft             from sending a streamed request to its first text
+    model            the API calls themselves
+    total            from the start of the request to the finished reply
+
+plus whether the response cache answered and the token usage the API
+reported, including prompt-cache reads and writes. Finished records go to ~/.cli_suggest/metrics.db (or
+CLI_SUGGEST_METRICS_PATH) and, when CLI_SUGGEST_METRICS_EXPORT names a file,
+are also appended to it as JSON lines for dashboards.
+"""
+import contextvars
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+
+PHASES = ("context", "prompt", "rate_limit_wait", "ttft", "model", "total")
+# USD per million input / output tokens; prompt-cache writes cost 1.25x input, reads 0.1x
+PRICES = {
+    "claude-3-sonnet-20240229": (3.0, 15.0),
+    "claude-3-5-sonnet-20240620": (3.0, 15.0),
+    "claude-3-haiku-20240307": (0.25, 1.25),
+    "claude-3-opus-20240229": (15.0, 75.0),
+}
+CACHE_WRITE_PRICE = 1.25
+CACHE_READ_PRICE = 0.1
+MAX_RECORDS = 100_000
+_COLUMNS = (
+    "created, kind, mode, model, cache_hit, calls, input_tokens, output_tokens, "
+    "cache_write_tokens, cache_read_tokens, error, spans"
+)
+
+_record: contextvars.ContextVar = contextvars.ContextVar("cli_suggest_metrics_record", default=None)
+_connection = None
+_lock = threading.Lock()
+
+
+def metrics_path() -> str:
+    return os.environ.get("CLI_SUGGEST_METRICS_PATH") or os.path.expanduser("~/.cli_suggest/metrics.db")
+
+
+def _connect() -> sqlite3.Connection:
+    global _connection
+    if _connection is None:
+        path = metrics_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS requests (
+                id INTEGER PRIMARY KEY,
+                created REAL NOT NULL,
+                kind TEXT NOT NULL,
+                mode TEXT,
+                model TEXT,
+                cache_hit INTEGER,
+                calls INTEGER NOT NULL,
+                input_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                cache_write_tokens INTEGER NOT NULL DEFAULT 0,
+                cache_read_tokens INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                spans TEXT NOT NULL
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_requests_created ON requests(created)")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(requests)")}
+        for column in ("cache_write_tokens", "cache_read_tokens"):
+            if column not in columns:  # metrics.db from before prompt caching
+                conn.execute(f"ALTER TABLE requests ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+        _connection = conn
+    return _connection
+
+
+def close() -> None:
+    global _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+        _connection = None
+
+
+def current() -> Optional[dict]:
+    return _record.get()
+
+
+@contextmanager
+def request(kind: str, mode: str = None) -> Iterator[dict]:
+    """Measure everything run inside the block as one request, and save it at the end"""
+    record = {
+        "created": time.time(),
+        "started": time.monotonic(),
+        "kind": kind,
+        "mode": mode,
+        "model": None,
+        "cache_hit": None,
+        "calls": 0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cache_write_tokens": 0,
+        "cache_read_tokens": 0,
+        "error": None,
+        "spans": {},
+    }
+    token = _record.set(record)
+    try:
+        yield record
+    except KeyboardInterrupt:
+        record["error"] = "cancelled"
+        raise
+    except Exception as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        _record.reset(token)
+        save(record)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Add the time spent in the block to phase `name` of the current request"""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        add_time(name, time.monotonic() - started)
+
+
+def add_time(name: str, seconds: float) -> None:
+    record = _record.get()
+    if record is not None:
+        record["spans"][name] = record["spans"].get(name, 0.0) + seconds
+
+
+def mark(name: str) -> None:
+    """Set phase `name` to the time since the request started (e.g. "total")"""
+    record = _record.get()
+    if record is not None:
+        record["spans"][name] = time.monotonic() - record["started"]
+
+
+def note(**fields) -> None:
+    """Set fields of the current request, e.g. note(cache_hit=True)"""
+    record = _record.get()
+    if record is not None:
+        record.update(fields)
+
+
+def add_usage(model: str, usage) -> None:
+    """Count one API call and the tokens in its usage object (anthropic's Message.usage)"""
+    record = _record.get()
+    if record is None:
+        return
+    record["model"] = model
+    record["calls"] += 1
+    if usage is not None:
+        record["input_tokens"] += getattr(usage, "input_tokens", 0) or 0
+        record["output_tokens"] += getattr(usage, "output_tokens", 0) or 0
+        record["cache_write_tokens"] += getattr(usage, "cache_creation_input_tokens", 0) or 0
+        record["cache_read_tokens"] += getattr(usage, "cache_read_input_tokens", 0) or 0
+
+
+def save(record: dict) -> None:
+    """Store a finished record; requests that neither called the API nor checked the cache are dropped"""
+    if not record["calls"] and record["cache_hit"] is None:
+        return
+    spans = {name: round(seconds * 1000, 1) for name, seconds in record["spans"].items()}
+    row = (
+        record["created"], record["kind"], record["mode"], record["model"],
+        None if record["cache_hit"] is None else int(record["cache_hit"]),
+        record["calls"], record["input_tokens"], record["output_tokens"], record["cache_write_tokens"],
+        record["cache_read_tokens"], record["error"], json.dumps(spans),
+    )
+    try:
+        with _lock:
+            conn = _connect()
+            conn.execute(
+                f"INSERT INTO requests ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            conn.execute(
+                "DELETE FROM requests WHERE id <= (SELECT id FROM requests ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (MAX_RECORDS,),
+            )
+        export = os.environ.get("CLI_SUGGEST_METRICS_EXPORT")
+        if export:
+            with open(os.path.expanduser(export), "a") as f:
+                f.write(json.dumps(_as_dict(row)) + "\n")
+    except (sqlite3.Error, OSError) as e:
+        print(f"Warning: recording metrics failed: {e}")
+
+
+def _as_dict(row: Sequence) -> dict:
+    (created, kind, mode, model, cache_hit, calls, input_tokens, output_tokens,
+     cache_write_tokens, cache_read_tokens, error, spans) = row
+    return {
+        "created": created, "kind": kind, "mode": mode, "model": model,
+        "cache_hit": None if cache_hit is None else bool(cache_hit), "calls": calls,
+        "input_tokens": input_tokens, "output_tokens": output_tokens,
+        "cache_write_tokens": cache_write_tokens, "cache_read_tokens": cache_read_tokens, "error": error,
+        "spans_ms": json.loads(spans),
+    }
+
+
+def records(since: float = 0.0) -> List[dict]:
+    with _lock:
+        rows = _connect().execute(
+            f"SELECT {_COLUMNS} FROM requests WHERE created >= ? ORDER BY id",
+            (since,),
+        ).fetchall()
+    return [_as_dict(row) for row in rows]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of values (which must not be empty)"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def cost(record: dict) -> float:
+    input_price, output_price = PRICES.get(record["model"], (0.0, 0.0))
+    cached = record["cache_write_tokens"] * CACHE_WRITE_PRICE + record["cache_read_tokens"] * CACHE_READ_PRICE
+    return ((record["input_tokens"] + cached) * input_price + record["output_tokens"] * output_price) / 1e6
+
+
+def summary(since: float = 0.0) -> str:
+    """Percentiles per phase, cache hit rate and token spend for requests since `since`"""
+    rows = records(since)
+    if not rows:
+        return "No requests recorded yet."
+    kinds: Dict[str, int] = {}
+    for row in rows:
+        kinds[row["kind"]] = kinds.get(row["kind"], 0) + 1
+    lines = [f"Requests: {len(rows)} ({', '.join(f'{kind} {count}' for kind, count in sorted(kinds.items()))})"]
+
+    lookups = [row for row in rows if row["cache_hit"] is not None]
+    if lookups:
+        hits = sum(row["cache_hit"] for row in lookups)
+        lines.append(f"Response cache: {hits} hits / {len(lookups)} lookups ({hits / len(lookups):.0%})")
+    errors = sum(1 for row in rows if row["error"])
+    if errors:
+        lines.append(f"Errors or cancellations: {errors}")
+
+    lines.append(f"{'phase':<16}{'p50':>10}{'p90':>10}{'p99':>10}{'n':>7}")
+    for phase in PHASES:
+        values = [row["spans_ms"][phase] for row in rows if phase in row["spans_ms"]]
+        if values:
+            p50, p90, p99 = (percentile(values, pct) for pct in (50, 90, 99))
+            lines.append(f"{phase:<16}{p50:>8.0f}ms{p90:>8.0f}ms{p99:>8.0f}ms{len(values):>7}")
+
+    input_tokens = sum(row["input_tokens"] for row in rows)
+    output_tokens = sum(row["output_tokens"] for row in rows)
+    calls = sum(row["calls"] for row in rows)
+    spend = sum(cost(row) for row in rows)
+    lines.append(f"Tokens: {input_tokens:,} in, {output_tokens:,} out over {calls} API calls (~${spend:.2f})")
+    written = sum(row["cache_write_tokens"] for row in rows)
+    read = sum(row["cache_read_tokens"] for row in rows)
+    if written or read:
+        share = read / (read + written + input_tokens) if read else 0.0
+        lines.append(f"Prompt cache: {read:,} tokens read, {written:,} written ({share:.0%} of input served from cache)")
+    return "\n".join(lines)
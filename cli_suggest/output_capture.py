@@ -0,0 +1,145 @@
+"""Bounded capture of command output.
+
+Commands run from the REPL stream their output to the terminal and also feed
+it to OutputCapture, which keeps only the first and last `limit // 2` bytes in
+memory, and summary() produces a compact head/tail text for the conversation
+history.
+
+Spilling is opt-in: given a spill_path, output that outgrows the limit is
+written there in full (up to SPILL_LIMIT bytes). Callers reuse one path per
+session, so each run replaces the previous spill instead of piling up files.
+"""
+import atexit
+import codecs
+import os
+import sys
+import tempfile
+
+CHUNK_SIZE = 64 * 1024
+SPILL_LIMIT = 256 * 1024 * 1024
+
+_session_spill_path = None
+
+
+def session_spill_path() -> str:
+    """The single spill file for this process; removed when the process exits"""
+    global _session_spill_path
+    if _session_spill_path is None:
+        fd, _session_spill_path = tempfile.mkstemp(prefix="cli_suggest_output_", suffix=".log")
+        os.close(fd)
+        atexit.register(remove_session_spill)
+    return _session_spill_path
+
+
+def remove_session_spill() -> None:
+    global _session_spill_path
+    if _session_spill_path is not None:
+        try:
+            os.unlink(_session_spill_path)
+        except OSError:
+            pass
+        _session_spill_path = None
+
+
+class OutputCapture:
+    def __init__(self, limit: int, spill_path: str = None):
+        self.limit = limit
+        self.half = limit // 2
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total_bytes = 0
+        self.total_lines = 0
+        self.spill = spill_path is not None
+        self.spill_target = spill_path
+        self.spill_path = None
+        self._spill_file = None
+        self._spilled_bytes = 0
+        self._last_byte = b""
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_bytes > self.limit
+
+    def feed(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        was_truncated = self.truncated
+        self.total_bytes += len(chunk)
+        self.total_lines += chunk.count(b"\n")
+        self._last_byte = chunk[-1:]
+
+        if self.spill and self.truncated:
+            if not was_truncated:
+                # Everything so far still fits in head + tail; start the spill file with it
+                self._open_spill(bytes(self.head) + bytes(self.tail))
+            self._write_spill(chunk)
+
+        room = self.half - len(self.head)
+        if room > 0:
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+        self.tail += chunk
+        if len(self.tail) > self.half:
+            del self.tail[: len(self.tail) - self.half]
+
+    def _open_spill(self, data: bytes) -> None:
+        # "wb" truncates whatever the previous command spilled here
+        self._spill_file = open(self.spill_target, "wb")
+        self.spill_path = self.spill_target
+        self._write_spill(data)
+
+    def _write_spill(self, data: bytes) -> None:
+        if self._spill_file is None or self._spilled_bytes >= SPILL_LIMIT:
+            return
+        data = data[: SPILL_LIMIT - self._spilled_bytes]
+        self._spill_file.write(data)
+        self._spilled_bytes += len(data)
+
+    def close(self) -> None:
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def summary(self) -> str:
+        """Full output if it fit in the limit, otherwise head + marker + tail"""
+        head = self.head.decode("utf-8", errors="replace")
+        if not self.truncated:
+            return head + self.tail.decode("utf-8", errors="replace")
+        lines = self.total_lines + (1 if self._last_byte not in (b"", b"\n") else 0)
+        marker = f"[... output truncated: {self.total_bytes} bytes, {lines} lines total"
+        if self.spill_path:
+            marker += f"; full output saved to {self.spill_path}"
+        marker += " ...]"
+        return f"{head}\n{marker}\n{self.tail.decode('utf-8', errors='replace')}"
+
+
+def stream_and_capture(stream, capture: OutputCapture, echo=None) -> None:
+    """Copy a binary pipe to the terminal in chunks while feeding capture"""
+    if echo is None:
+        sys.stdout.flush()  # keep earlier print() output ahead of the raw bytes
+        echo = getattr(sys.stdout, "buffer", None) or _TextEcho(sys.stdout)
+    fd = stream.fileno()
+    try:
+        while True:
+            chunk = os.read(fd, CHUNK_SIZE)
+            if not chunk:
+                break
+            echo.write(chunk)
+            echo.flush()
+            capture.feed(chunk)
+    finally:
+        capture.close()
+
+
+class _TextEcho:
+    """Adapts a text-only stdout (no .buffer) to the bytes interface used above"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def write(self, data: bytes) -> None:
+        self.stream.write(self.decoder.decode(data))
+
+    def flush(self) -> None:
+        self.stream.flush()
@@ -0,0 +1,172 @@
+"""Token-bucket rate limit shared by every cli-suggest process.
+
+The REPL, the failure hook, the daemon and `llm` pipes all draw from one
+bucket stored in a small SQLite file (~/.cli_suggest/rate_limit.db, or
+CLI_SUGGEST_RATE_LIMIT_PATH). Each take is a short BEGIN IMMEDIATE
+transaction, so concurrent processes never hand out the same token.
+
+Priority classes keep headroom for the user: "hook" calls leave
+RESERVE["hook"] tokens in the bucket, and "batch" (`llm --batch`) and
+"speculative" ones leave more, so a burst of background requests can't make
+an interactive one wait. Speculative callers never wait at all; they get
+RateLimited and drop the request.
+
+When the API answers 429 anyway, call() pauses the whole bucket for the
+Retry-After time (or a jittered exponential backoff) so other processes hold
+off too, then retries.
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+
+from . import metrics
+
+RATE_LIMIT = 20  # calls per minute, across all processes
+BURST = 20  # tokens the bucket holds when idle
+RESERVE = {"interactive": 0, "hook": 2, "batch": 4, "speculative": 5}
+MAX_ATTEMPTS = 4  # per call, including the first
+BACKOFF_BASE = 1.0  # seconds
+BACKOFF_CAP = 30.0
+
+_connection = None
+_connection_path = None
+_lock = threading.Lock()
+
+
+class RateLimited(Exception):
+    """No token is available (or the API said 429) and the caller won't wait"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limited, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def bucket_path() -> str:
+    return os.environ.get("CLI_SUGGEST_RATE_LIMIT_PATH") or os.path.expanduser(
+        "~/.cli_suggest/rate_limit.db"
+    )
+
+
+def _connect() -> sqlite3.Connection:
+    global _connection, _connection_path
+    path = bucket_path()
+    if _connection is not None and _connection_path == path:
+        return _connection
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS bucket (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            tokens REAL NOT NULL,
+            updated REAL NOT NULL,
+            paused_until REAL NOT NULL DEFAULT 0
+        )"""
+    )
+    conn.execute("INSERT OR IGNORE INTO bucket VALUES (1, ?, ?, 0)", (BURST, time.time()))
+    if _connection is not None:
+        _connection.close()
+    _connection, _connection_path = conn, path
+    return conn
+
+
+def close() -> None:
+    global _connection, _connection_path
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+        _connection, _connection_path = None, None
+
+
+def _try_take(priority: str) -> float:
+    """Take a token if the priority's reserve allows; return 0, or seconds until it would"""
+    rate = RATE_LIMIT / 60.0
+    needed = 1 + RESERVE[priority]
+    with _lock:
+        conn = _connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            tokens, updated, paused_until = conn.execute(
+                "SELECT tokens, updated, paused_until FROM bucket WHERE id = 1"
+            ).fetchone()
+            now = time.time()
+            tokens = min(BURST, tokens + max(0.0, now - updated) * rate)
+            if now < paused_until:
+                wait = paused_until - now
+            elif tokens >= needed:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (needed - tokens) / rate
+            conn.execute("UPDATE bucket SET tokens = ?, updated = ? WHERE id = 1", (tokens, now))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    return wait
+
+
+def acquire(priority: str = "interactive", timeout: Optional[float] = None) -> None:
+    """Block until a token is available; speculative callers raise RateLimited instead"""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        wait = _try_take(priority)
+        if wait == 0:
+            return
+        if priority == "speculative" or (deadline is not None and time.monotonic() + wait > deadline):
+            raise RateLimited(wait)
+        # Re-check at least every second: other processes may pause or refill meanwhile
+        time.sleep(min(wait, 1.0))
+
+
+def pause(seconds: float) -> None:
+    """Stop every process from taking tokens for the next `seconds` seconds"""
+    with _lock:
+        conn = _connect()
+        conn.execute(
+            "UPDATE bucket SET paused_until = MAX(paused_until, ?) WHERE id = 1",
+            (time.time() + seconds,),
+        )
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Seconds to wait before retry number `attempt` (0-based), honoring Retry-After"""
+    if retry_after is not None:
+        # A little jitter so processes paused together don't all retry at once
+        return retry_after + random.uniform(0, BACKOFF_BASE)
+    # "Full jitter": spread retries from many processes across the window
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """For a 429 from the anthropic SDK or requests, the Retry-After seconds (-1 if absent); else None"""
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    if status != 429:
+        return None
+    header = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        return max(0.0, float(header))
+    except (TypeError, ValueError):
+        return -1.0
+
+
+def call(fn: Callable, priority: str = "interactive"):
+    """Run fn() under the shared limit, retrying 429 responses with backoff"""
+    for attempt in range(MAX_ATTEMPTS):
+        with metrics.span("rate_limit_wait"):
+            acquire(priority)
+        try:
+            with metrics.span("model"):
+                return fn()
+        except Exception as exc:
+            seconds = retry_after(exc)
+            if seconds is None:
+                raise
+            delay = backoff_delay(attempt, seconds if seconds >= 0 else None)
+            pause(delay)
+            if priority == "speculative" or attempt == MAX_ATTEMPTS - 1:
+                raise RateLimited(delay) from exc
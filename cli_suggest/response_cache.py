@@ -0,0 +1,134 @@
+"""On-disk cache of Claude responses.
+
+Entries are keyed on the mode ("command", "multi", "ask", "fix"), the
+normalized query and a hash of everything else in the prompt that changes the
+answer: the PWD and OS fields, attached files/webpages and the conversation
+history that was sent. The cache is a small SQLite file so the REPL, the hook and the
+daemon can all share it; it is bounded by MAX_ENTRIES with least-recently-used
+eviction and entries expire after TTL seconds.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from .context_builder import ATTACHMENT_PREFIXES
+
+MAX_ENTRIES = 1000
+TTL = 7 * 24 * 3600  # seconds
+CONTEXT_FIELDS = ("OS", "PWD")
+
+# Set to False (--no-cache) to neither read nor write the cache
+enabled = True
+stats = {"hits": 0, "misses": 0}
+
+_connection = None
+_lock = threading.Lock()
+
+
+def cache_path() -> str:
+    return os.environ.get("CLI_SUGGEST_CACHE_PATH") or os.path.expanduser(
+        "~/.cli_suggest/response_cache.db"
+    )
+
+
+def _connect() -> sqlite3.Connection:
+    global _connection
+    if _connection is None:
+        path = cache_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                mode TEXT NOT NULL,
+                query TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        _connection = conn
+    return _connection
+
+
+def close() -> None:
+    global _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+        _connection = None
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace so trivially different queries share an entry"""
+    return " ".join(query.lower().split())
+
+
+def make_key(mode: str, query: str, context: Dict[str, str], history: str = "") -> str:
+    fingerprint = {field: context.get(field) for field in CONTEXT_FIELDS}
+    fingerprint.update((k, v) for k, v in context.items() if k.startswith(ATTACHMENT_PREFIXES))
+    payload = json.dumps([mode, normalize_query(query), fingerprint, history], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get(mode: str, query: str, context: Dict[str, str], history: str = "") -> Optional[str]:
+    """Return the cached response, or None on a miss (or when the cache is disabled)"""
+    if not enabled:
+        return None
+    key = make_key(mode, query, context, history)
+    now = time.time()
+    with _lock:
+        conn = _connect()
+        row = conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None and now - row[1] > TTL:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            row = None
+        if row is None:
+            stats["misses"] += 1
+            return None
+        conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        stats["hits"] += 1
+        return row[0]
+
+
+def put(mode: str, query: str, context: Dict[str, str], response: str, history: str = "") -> None:
+    """Store a response, evicting the least recently used entries beyond MAX_ENTRIES"""
+    if not enabled:
+        return
+    now = time.time()
+    with _lock:
+        conn = _connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+            (make_key(mode, query, context, history), mode, normalize_query(query), response, now, now),
+        )
+        conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (MAX_ENTRIES,),
+        )
+
+
+def clear() -> None:
+    with _lock:
+        _connect().execute("DELETE FROM responses")
+
+
+def entry_count() -> int:
+    with _lock:
+        return _connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+def summary() -> str:
+    """One-line description of the cache for /context"""
+    if not enabled:
+        return "disabled (--no-cache)"
+    lookups = stats["hits"] + stats["misses"]
+    rate = f" ({stats['hits'] / lookups:.0%} hit rate)" if lookups else ""
+    return f"{stats['hits']} hits, {stats['misses']} misses this session{rate}, {entry_count()} entries stored"
@@ -0,0 +1,207 @@
+"""REPL sessions saved to disk, for --resume and /recall.
+
+Every REPL turn is stored in ~/.cli_suggest/sessions.db (or
+CLI_SUGGEST_SESSIONS_PATH) as a structured row: the query, its mode, the
+suggestion or answer, the exit code and a digest of the output of anything
+that ran, the model latency, and the conversation history entries the turn
+added (each cut to context_builder.ENTRY_CHARS, which is all a prompt would
+ever send of it). --resume rebuilds the conversation history from those
+entries and keeps appending to the same session.
+
+Queries and suggestions are indexed with FTS5 for /recall, and normalized
+queries have their own index, so "what did it tell me last time" is a local
+lookup instead of a new API call. The store keeps the newest MAX_TURNS turns.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from .context_builder import ENTRY_CHARS, terms, truncate_middle
+from .response_cache import normalize_query
+
+MAX_TURNS = 50_000
+MODES = {
+    "/multi": "multi",
+    "/alt": "alt",
+    "/ask": "ask",
+    "/sh": "shell",
+    "/fan": "fan",
+    "/perplexity": "perplexity",
+    "/perp": "perplexity",
+    "/web": "web",
+    "/add": "add",
+    "/drop": "drop",
+    "/recall": "recall",
+}
+
+_connection = None
+_lock = threading.Lock()
+
+
+class Turn(NamedTuple):
+    id: int
+    session_id: int
+    created: float
+    query: str
+    mode: str
+    suggestion: Optional[str]
+    exit_code: Optional[int]
+
+
+def store_path() -> str:
+    return os.environ.get("CLI_SUGGEST_SESSIONS_PATH") or os.path.expanduser("~/.cli_suggest/sessions.db")
+
+
+def _connect() -> sqlite3.Connection:
+    global _connection
+    if _connection is None:
+        path = store_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                id INTEGER PRIMARY KEY,
+                started REAL NOT NULL,
+                cwd TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS turns (
+                id INTEGER PRIMARY KEY,
+                session_id INTEGER NOT NULL,
+                created REAL NOT NULL,
+                query TEXT NOT NULL,
+                normalized TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                suggestion TEXT,
+                exit_code INTEGER,
+                output_digest TEXT,
+                latency REAL,
+                entries TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_turns_session ON turns(session_id, id);
+            CREATE INDEX IF NOT EXISTS idx_turns_normalized ON turns(normalized, id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5(
+                query, suggestion, content='turns', content_rowid='id'
+            );
+            CREATE TRIGGER IF NOT EXISTS turns_ai AFTER INSERT ON turns BEGIN
+                INSERT INTO turns_fts(rowid, query, suggestion) VALUES (new.id, new.query, new.suggestion);
+            END;
+            CREATE TRIGGER IF NOT EXISTS turns_ad AFTER DELETE ON turns BEGIN
+                INSERT INTO turns_fts(turns_fts, rowid, query, suggestion)
+                VALUES ('delete', old.id, old.query, old.suggestion);
+            END;
+            """
+        )
+        _connection = conn
+    return _connection
+
+
+def close() -> None:
+    global _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+        _connection = None
+
+
+def mode_of(query: str) -> str:
+    if query.startswith("!"):
+        return "shell"
+    return MODES.get(query.split(" ", 1)[0], "command")
+
+
+def start_session(cwd: str) -> int:
+    with _lock:
+        return _connect().execute("INSERT INTO sessions (started, cwd) VALUES (?, ?)", (time.time(), cwd)).lastrowid
+
+
+def record_turn(
+    session_id: int,
+    query: str,
+    entries: Sequence[str],
+    suggestion: Optional[str] = None,
+    exit_code: Optional[int] = None,
+    output: Optional[str] = None,
+    latency: Optional[float] = None,
+) -> None:
+    digest = hashlib.sha1(output.encode("utf-8", errors="replace")).hexdigest() if output else None
+    compact = json.dumps([truncate_middle(entry, ENTRY_CHARS) for entry in entries])
+    with _lock:
+        conn = _connect()
+        conn.execute(
+            "INSERT INTO turns (session_id, created, query, normalized, mode, suggestion, exit_code, "
+            "output_digest, latency, entries) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (session_id, time.time(), query, normalize_query(query), mode_of(query), suggestion,
+             exit_code, digest, latency, compact),
+        )
+        conn.execute(
+            "DELETE FROM turns WHERE id <= (SELECT id FROM turns ORDER BY id DESC LIMIT 1 OFFSET ?)", (MAX_TURNS,)
+        )
+
+
+def resolve_session(which: str = "last") -> Optional[int]:
+    """The id of session `which` ("last" = the most recent with any turns), if it exists"""
+    with _lock:
+        conn = _connect()
+        if which == "last":
+            row = conn.execute("SELECT session_id FROM turns ORDER BY id DESC LIMIT 1").fetchone()
+        elif which.isdigit():
+            row = conn.execute("SELECT id FROM sessions WHERE id = ?", (int(which),)).fetchone()
+        else:
+            row = None
+    return row[0] if row else None
+
+
+def load_history(session_id: int) -> List[str]:
+    """The conversation history of a session, as the REPL had built it"""
+    with _lock:
+        rows = _connect().execute(
+            "SELECT entries FROM turns WHERE session_id = ? ORDER BY id", (session_id,)
+        ).fetchall()
+    return [entry for (entries,) in rows for entry in json.loads(entries)]
+
+
+_TURN_COLUMNS = "turns.id, turns.session_id, turns.created, turns.query, turns.mode, turns.suggestion, turns.exit_code"
+
+
+def last_answer(query: str) -> Optional[Turn]:
+    """The newest turn with the same (normalized) query that got a suggestion"""
+    with _lock:
+        row = _connect().execute(
+            f"SELECT {_TURN_COLUMNS} FROM turns WHERE normalized = ? AND suggestion IS NOT NULL "
+            "ORDER BY id DESC LIMIT 1",
+            (normalize_query(query),),
+        ).fetchone()
+    return Turn(*row) if row else None
+
+
+def search(text: str, limit: int = 10) -> List[Turn]:
+    """Past turns whose query or suggestion matches text, best matches first"""
+    words = sorted(terms(text))
+    if not words:
+        return []
+    expression = " OR ".join(f'"{word}"' for word in words)
+    with _lock:
+        rows = _connect().execute(
+            f"SELECT {_TURN_COLUMNS} FROM turns_fts JOIN turns ON turns.id = turns_fts.rowid "
+            "WHERE turns_fts MATCH ? AND turns.suggestion IS NOT NULL ORDER BY bm25(turns_fts) LIMIT ?",
+            (expression, limit),
+        ).fetchall()
+    return [Turn(*row) for row in rows]
+
+
+def recent_sessions(limit: int = 10) -> List[Tuple[int, float, str, int, str]]:
+    """(id, started, cwd, turns, first query) of the latest sessions that have turns"""
+    with _lock:
+        return _connect().execute(
+            "SELECT s.id, s.started, s.cwd, COUNT(t.id), "
+            "(SELECT query FROM turns WHERE session_id = s.id ORDER BY id LIMIT 1) "
+            "FROM sessions s JOIN turns t ON t.session_id = s.id "
+            "GROUP BY s.id ORDER BY s.id DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
@@ -0,0 +1,86 @@
+"""Speculative suggestions for the query the user is still typing.
+
+With speculative mode on (--speculative or CLI_SUGGEST_SPECULATIVE), the REPL
+feeds every buffer change to a Speculator. Once the text has been still for
+`delay` seconds it asks for a suggestion in the background; any change before
+that cancels the pending request. The result is shown in the bottom toolbar,
+and pressing Enter on the same text uses it instead of asking again.
+
+Requests are low priority: the fetch function is expected to give up (raise)
+rather than wait when the rate limit has no room, and it goes through the
+response cache like any other suggestion.
+"""
+import asyncio
+import concurrent.futures
+from typing import Callable, Optional
+
+from . import engine
+
+MIN_CHARS = 4  # don't speculate on the first few keystrokes
+
+
+class Speculator:
+    def __init__(self, fetch: Callable[[str], str], delay: float = 0.6):
+        self.fetch = fetch
+        self.delay = delay
+        self.text = ""
+        self.future: Optional[concurrent.futures.Future] = None
+
+    @staticmethod
+    def eligible(text: str) -> bool:
+        # Slash commands, !shell lines and exit aren't suggestion requests
+        text = text.strip()
+        return len(text) >= MIN_CHARS and not text.startswith(("/", "!")) and text.lower() != "exit"
+
+    def on_text_changed(self, text: str) -> None:
+        """Called on every edit; restarts the debounce for the new text"""
+        text = text.strip()
+        if text == self.text:
+            return
+        self.reset()
+        self.text = text
+        if self.eligible(text):
+            self.future = engine.submit(self._debounced(text))
+
+    async def _debounced(self, text: str) -> str:
+        # Cancelling the future during the sleep means no request is ever sent
+        await asyncio.sleep(self.delay)
+        return await asyncio.to_thread(self.fetch, text)
+
+    def reset(self) -> None:
+        if self.future is not None:
+            self.future.cancel()
+        self.text, self.future = "", None
+
+    def hint(self) -> str:
+        """Toolbar text for the current buffer"""
+        if self.future is None:
+            return ""
+        if not self.future.done():
+            return "Suggestion: ..."
+        result = self.result()
+        return f"Suggestion: {' '.join(result.split())}" if result else ""
+
+    def result(self) -> Optional[str]:
+        """The finished suggestion, or None if there is none (yet)"""
+        if self.future is None or not self.future.done() or self.future.cancelled():
+            return None
+        if self.future.exception() is not None:
+            return None
+        return self.future.result()
+
+    def take(self, text: str) -> Optional[str]:
+        """Suggestion for text if one was speculated, waiting for it if still in flight"""
+        future, matches = self.future, text.strip() == self.text
+        self.text, self.future = "", None
+        if future is None or not matches:
+            if future is not None:
+                future.cancel()
+            return None
+        try:
+            return future.result()
+        except KeyboardInterrupt:
+            future.cancel()
+            raise
+        except Exception:  # cancelled, rate limited or failed: ask normally
+            return None
@@ -0,0 +1,188 @@
+"""Reading large stdin for `llm` without holding all of it in memory.
+
+read_capped() streams stdin in blocks and keeps at most max_bytes of it,
+either the head and tail (via OutputCapture) or an evenly spaced sample of
+lines, with a marker saying what was left out.
+
+map_reduce() cuts stdin into chunks at line boundaries, asks for notes on
+each chunk concurrently (through the batch pool, so reading stays bounded
+and the shared rate limit applies), shows each chunk's notes as soon as they
+are ready, then combines the notes into one answer. Notes that are too long
+to combine at once are combined in groups first.
+"""
+import sys
+from collections import deque
+from itertools import chain
+from typing import Callable, IO, Iterator, List
+
+from . import batch
+from .context_builder import truncate_middle
+from .output_capture import OutputCapture
+
+READ_SIZE = 64 * 1024
+BYTES_PER_TOKEN = 4  # same estimate as context_builder.estimate_tokens
+MAX_INPUT_TOKENS = 100_000  # per request
+CHUNK_TOKENS = 20_000
+MAX_CHUNKS = 50  # beyond this, only the first and last MAX_CHUNKS // 2 are sent
+DEFAULT_INSTRUCTION = "Summarize the input."
+
+MAP_PROMPT = """{instruction}
+
+The input is too long to read at once, so it is split into parts. This is part {part}.
+Write concise notes on what in this part matters for the instruction above; they will be combined with the notes on the other parts.
+
+{chunk}"""
+
+REDUCE_PROMPT = """{instruction}
+
+The input was too long to read at once, so it was split into parts. Below are notes on each part, in order. Use them to answer.
+
+{notes}"""
+
+
+def _blocks(stream: IO[bytes]) -> Iterator[bytes]:
+    read = getattr(stream, "read1", stream.read)  # return what a pipe has rather than waiting for a full block
+    while True:
+        block = read(READ_SIZE)
+        if not block:
+            return
+        yield block
+
+
+def read_head_tail(stream: IO[bytes], max_bytes: int) -> str:
+    """The whole input if it fits in max_bytes, otherwise its head and tail"""
+    capture = OutputCapture(max_bytes)
+    for block in _blocks(stream):
+        capture.feed(block)
+    return capture.summary()
+
+
+def read_sampled(stream: IO[bytes], max_bytes: int) -> str:
+    """The whole input if it fits in max_bytes, otherwise every Nth line, N a power of two"""
+    kept = []  # (line number, line)
+    kept_bytes = total_bytes = lines = 0
+    stride = 1
+    # readline(max_bytes) so a single huge line can't be slurped whole
+    for number, line in enumerate(iter(lambda: stream.readline(max_bytes), b"")):
+        total_bytes += len(line)
+        lines += 1
+        if number % stride:
+            continue
+        kept.append((number, line))
+        kept_bytes += len(line)
+        while kept_bytes > max_bytes:
+            stride *= 2
+            kept = [(n, l) for n, l in kept if n % stride == 0]
+            kept_bytes = sum(len(l) for _, l in kept)
+    text = b"".join(l for _, l in kept).decode("utf-8", errors="replace")
+    if stride == 1:
+        return text
+    marker = f"[... input sampled: every {stride}th line, {len(kept)} of {lines} lines ({total_bytes} bytes) shown ...]"
+    return f"{marker}\n{text}"
+
+
+def read_capped(stream: IO[bytes], max_bytes: int, sample: bool = False) -> str:
+    return (read_sampled if sample else read_head_tail)(stream, max_bytes)
+
+
+def iter_chunks(stream: IO[bytes], chunk_bytes: int) -> Iterator[str]:
+    """Yield the input in pieces of at most chunk_bytes, cut after a newline where possible"""
+    pending = bytearray()
+    for block in _blocks(stream):
+        pending += block
+        while len(pending) >= chunk_bytes:
+            cut = pending.rfind(b"\n", 0, chunk_bytes) + 1 or chunk_bytes
+            yield pending[:cut].decode("utf-8", errors="replace")
+            del pending[:cut]
+    if pending:
+        yield pending.decode("utf-8", errors="replace")
+
+
+def limit_chunks(chunks: Iterator[str], max_chunks: int) -> Iterator[str]:
+    """Pass through the first and last max_chunks // 2 chunks, skipping the middle"""
+    head = max_chunks - max_chunks // 2
+    tail = deque(maxlen=max_chunks // 2)
+    skipped = skipped_chars = 0
+    for count, chunk in enumerate(chunks):
+        if count < head:
+            yield chunk
+            continue
+        if len(tail) == tail.maxlen:
+            skipped += 1
+            skipped_chars += len(tail[0])
+        tail.append(chunk)
+    for i, chunk in enumerate(tail):
+        if i == 0 and skipped:
+            chunk = f"[... {skipped} parts ({skipped_chars} characters) omitted ...]\n{chunk}"
+        yield chunk
+
+
+def _complete_all(prompts, complete: Callable[[str], str], workers: int) -> Iterator[str]:
+    """Yield each prompt's reply in order, as soon as it (and the ones before it) are done"""
+    for result in batch.run_batch(enumerate(prompts), complete, workers):
+        if "error" in result:
+            raise RuntimeError(f"part {result['index'] + 1}: {result['error']}")
+        yield result["output"]
+
+
+def _join_notes(notes: List[str]) -> str:
+    return "\n\n".join(f"Part {i}:\n{note}" for i, note in enumerate(notes, 1))
+
+
+def _combine(instruction: str, notes: List[str], complete, max_chars: int, workers: int) -> List[str]:
+    """Combine groups of notes until all of them fit in one prompt of max_chars"""
+    while len(notes) > 1 and len(_join_notes(notes)) > max_chars:
+        groups = [[]]
+        size = 0
+        for note in notes:
+            if groups[-1] and size + len(note) > max_chars:
+                groups.append([])
+                size = 0
+            groups[-1].append(note)
+            size += len(note)
+        if len(groups) == len(notes):
+            break  # every note is too long to pair up; the final prompt truncates them
+        combined = _complete_all(
+            [REDUCE_PROMPT.format(instruction=instruction, notes=_join_notes(g)) for g in groups if len(g) > 1],
+            complete,
+            workers,
+        )
+        notes = [g[0] if len(g) == 1 else next(combined) for g in groups]
+    return notes
+
+
+def map_reduce(
+    stream: IO[bytes],
+    instruction: str,
+    complete: Callable[[str], str],
+    finish: Callable[[str], None],
+    chunk_bytes: int = CHUNK_TOKENS * BYTES_PER_TOKEN,
+    max_bytes: int = MAX_INPUT_TOKENS * BYTES_PER_TOKEN,
+    workers: int = 4,
+    max_chunks: int = MAX_CHUNKS,
+    progress: IO[str] = None,
+) -> None:
+    """Take notes on each chunk with complete(), then hand the combining prompt to finish()"""
+    instruction = instruction or DEFAULT_INSTRUCTION
+    progress = progress or sys.stderr
+    chunks = iter_chunks(stream, chunk_bytes)
+    first = next(chunks, None)
+    if first is None:
+        raise ValueError("no input")
+    second = next(chunks, None)
+    if second is None:
+        finish(f"{instruction}\n{first}")  # small enough to send as is
+        return
+
+    chunks = limit_chunks(chain([first, second], chunks), max_chunks)
+    prompts = (MAP_PROMPT.format(instruction=instruction, part=i + 1, chunk=c) for i, c in enumerate(chunks))
+    notes = []
+    for i, note in enumerate(_complete_all(prompts, complete, workers)):
+        print(f"--- part {i + 1} ---\n{note}\n", file=progress, flush=True)
+        notes.append(note)
+
+    notes = _combine(instruction, notes, complete, max_bytes, workers)
+    print("--- combined ---", file=progress, flush=True)
+    per_note = max_bytes // len(notes)
+    notes = [truncate_middle(note, per_note) for note in notes]
+    finish(REDUCE_PROMPT.format(instruction=instruction, notes=_join_notes(notes)))
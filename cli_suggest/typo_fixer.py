@@ -0,0 +1,203 @@
+"""Offline fixes for mistyped commands, tried before asking Claude.
+
+A failed command is checked in two places: the executable (`gti status`,
+`sl`) against the names on $PATH plus executables from shell history, and,
+for tools in KNOWN_SUBCOMMANDS only, the subcommand (`git psuh`) against the
+known list plus subcommands seen in history. The first argument of other
+commands is a hostname, file or make target and is never "corrected".
+A fix is only returned when one candidate is clearly best; anything
+ambiguous is left for the LLM.
+
+Everything here is plain set lookups over small vocabularies so a fix comes
+back in about a millisecond. The history vocabulary is cached in
+~/.cli_suggest/typo_vocab.json and rebuilt once it is older than VOCAB_TTL.
+"""
+import json
+import os
+import re
+import shlex
+import string
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+VOCAB_TTL = 24 * 3600  # seconds
+EMPTY_VOCAB_TTL = 300  # retry sooner when history couldn't be read
+VOCAB_SIZE = 2000  # distinct history commands to learn from
+WORD_CHARS = string.ascii_lowercase + string.digits + "-_."
+
+SHELL_BUILTINS = {
+    "alias", "bg", "cd", "echo", "eval", "exec", "exit", "export", "fg", "history",
+    "jobs", "kill", "popd", "pushd", "pwd", "read", "set", "source", "type", "ulimit",
+    "umask", "unalias", "unset", "wait", "which",
+}
+# Executables whose first argument is a subcommand, with the subcommands worth
+# knowing before they show up in history. Nothing else gets subcommand fixes.
+KNOWN_SUBCOMMANDS = {
+    "git": {
+        "add", "bisect", "blame", "branch", "checkout", "cherry-pick", "clone", "commit",
+        "diff", "fetch", "grep", "init", "log", "merge", "mv", "pull", "push", "rebase",
+        "remote", "reset", "restore", "revert", "rm", "show", "stash", "status", "switch", "tag",
+    },
+    "docker": {
+        "build", "compose", "exec", "images", "inspect", "logs", "ps", "pull", "push",
+        "rm", "rmi", "run", "start", "stop",
+    },
+    "kubectl": {
+        "apply", "config", "create", "delete", "describe", "edit", "exec", "get", "logs",
+        "port-forward", "rollout", "scale",
+    },
+    "npm": {"ci", "install", "publish", "run", "start", "test", "uninstall", "update"},
+    "cargo": {"add", "bench", "build", "check", "clippy", "doc", "fmt", "install", "run", "test", "update"},
+    "pip": {"download", "freeze", "install", "list", "show", "uninstall"},
+    "systemctl": {"disable", "enable", "reload", "restart", "start", "status", "stop"},
+    "brew": {"info", "install", "list", "search", "uninstall", "update", "upgrade"},
+    "apt": {"install", "list", "remove", "search", "show", "update", "upgrade"},
+}
+
+_vocabulary = None
+
+
+def path_executables(path: Optional[str] = None) -> Set[str]:
+    """Names of everything in the $PATH directories (listdir only, no stat calls)"""
+    names = set()
+    for directory in (path if path is not None else os.environ.get("PATH", "")).split(os.pathsep):
+        try:
+            names.update(os.listdir(directory or "."))
+        except OSError:
+            continue
+    return names
+
+
+def build_vocabulary(command_counts: Iterable[Tuple[str, int]]) -> Dict:
+    """Count executables and per-executable subcommands from (command, count) pairs"""
+    commands = Counter()
+    subcommands = defaultdict(Counter)
+    for command, count in command_counts:
+        words = command.split()
+        if words and words[0] == "sudo":
+            words = words[1:]
+        if not words:
+            continue
+        commands[words[0]] += count
+        if len(words) > 1 and _looks_like_subcommand(words[1]):
+            subcommands[words[0]][words[1]] += count
+    return {
+        "built": time.time(),
+        "commands": dict(commands),
+        "subcommands": {cmd: dict(subs) for cmd, subs in subcommands.items()},
+    }
+
+
+def vocabulary_path() -> str:
+    return os.path.expanduser("~/.cli_suggest/typo_vocab.json")
+
+
+def _fresh(vocabulary: Dict) -> bool:
+    ttl = VOCAB_TTL if vocabulary.get("commands") else EMPTY_VOCAB_TTL
+    return time.time() - vocabulary["built"] < ttl
+
+
+def load_vocabulary(loader: Callable[[int], List[Tuple[str, int]]]) -> Dict:
+    """Return the history vocabulary, rebuilding it with loader(VOCAB_SIZE) when stale"""
+    global _vocabulary
+    if _vocabulary is not None and _fresh(_vocabulary):
+        return _vocabulary
+    path = vocabulary_path()
+    try:
+        with open(path) as f:
+            vocabulary = json.load(f)
+        if _fresh(vocabulary):
+            _vocabulary = vocabulary
+            return vocabulary
+    except (OSError, ValueError, KeyError):
+        pass
+    _vocabulary = build_vocabulary(loader(VOCAB_SIZE))
+    if not _vocabulary["commands"]:
+        # atuin missing or failing: keep it in memory briefly, don't persist it
+        return _vocabulary
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(_vocabulary, f)
+    except OSError:
+        pass
+    return _vocabulary
+
+
+def _looks_like_subcommand(word: str) -> bool:
+    return bool(re.fullmatch(r"[a-z][a-z0-9-]*", word))
+
+
+def edits1(word: str) -> Set[str]:
+    """All strings one deletion, transposition, substitution or insertion away"""
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    deletes = {a + b[1:] for a, b in splits if b}
+    transposes = {a + b[1] + b[0] + b[2:] for a, b in splits if len(b) > 1}
+    replaces = {a + c + b[1:] for a, b in splits if b for c in WORD_CHARS}
+    inserts = {a + c + b for a, b in splits for c in WORD_CHARS}
+    return deletes | transposes | replaces | inserts
+
+
+def _is_transposition(a: str, b: str) -> bool:
+    if len(a) != len(b) or a == b:
+        return False
+    diffs = [i for i in range(len(a)) if a[i] != b[i]]
+    return len(diffs) == 2 and diffs[1] == diffs[0] + 1 and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]]
+
+
+def best_candidate(word: str, vocabulary: Set[str], frequency: Dict[str, int]) -> Optional[str]:
+    """The single confident correction for word within one edit, or None"""
+    if len(word) < 2:
+        return None
+    candidates = edits1(word) & vocabulary
+    candidates.discard(word)
+    if not candidates:
+        return None
+    if len(candidates) == 1:
+        return candidates.pop()
+    ranked = sorted(candidates, key=lambda c: frequency.get(c, 0), reverse=True)
+    top, runner_up = frequency.get(ranked[0], 0), frequency.get(ranked[1], 0)
+    if top > 0 and top >= 2 * runner_up:
+        return ranked[0]
+    # Swapped neighbouring letters are by far the most common typo
+    swaps = [c for c in candidates if _is_transposition(word, c)]
+    if len(swaps) == 1:
+        return swaps[0]
+    return None
+
+
+def local_fix(failed_command: str, vocabulary: Dict, path: Optional[str] = None) -> Optional[str]:
+    """Return a corrected command if the failure looks like a simple typo"""
+    try:
+        words = shlex.split(failed_command)
+    except ValueError:
+        words = failed_command.split()
+    if not words:
+        return None
+    index = 1 if words[0] == "sudo" and len(words) > 1 else 0
+    executable = words[index]
+    if "/" in executable or "=" in executable:
+        return None
+
+    history_commands = vocabulary.get("commands", {})
+    known = path_executables(path) | SHELL_BUILTINS | set(history_commands)
+    if executable not in known:
+        fixed = best_candidate(executable, known, history_commands)
+        return _replace_word(failed_command, executable, fixed) if fixed else None
+
+    if executable not in KNOWN_SUBCOMMANDS:
+        return None
+    if len(words) <= index + 1 or not _looks_like_subcommand(words[index + 1]):
+        return None
+    subcommand = words[index + 1]
+    seen = vocabulary.get("subcommands", {}).get(executable, {})
+    valid = set(seen) | KNOWN_SUBCOMMANDS[executable]
+    if subcommand in valid:
+        return None
+    fixed = best_candidate(subcommand, valid, seen)
+    return _replace_word(failed_command, subcommand, fixed) if fixed else None
+
+
+def _replace_word(command: str, old: str, new: str) -> str:
+    return re.sub(rf"(?<!\S){re.escape(old)}(?!\S)", new, command, count=1)
@@ -0,0 +1,211 @@
+"""Fetching webpages for /web.
+
+fetch_markdown() streams the response and stops reading at MAX_BYTES, keeps
+only the page's main content (the <main>/<article> element, or the block
+holding most paragraph text, with navigation, footers and the like removed)
+and converts that HTML to markdown. Plain text, markdown and JSON are kept
+as they are.
+
+Converted pages are cached in a small SQLite file (~/.cli_suggest/web_cache.db,
+or CLI_SUGGEST_WEB_CACHE_PATH) with the page's ETag and Last-Modified; the
+next fetch of the same URL is a conditional request, and a 304 reuses the
+stored markdown without downloading or parsing anything.
+"""
+import importlib.util
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+from . import engine
+
+MAX_BYTES = 2 * 1024 * 1024  # of the response body
+MAX_CHARS = 100_000  # of markdown kept; context_builder picks the relevant chunks
+MAX_ENTRIES = 200
+READ_SIZE = 64 * 1024
+TEXT_TYPES = ("text/plain", "text/markdown", "application/json")
+
+# Removed before looking for the main content
+BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "svg", "iframe", "form", "nav", "header", "footer", "aside"]
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search"}
+BOILERPLATE_NAMES = re.compile(
+    r"(^|[-_ ])(nav|navbar|menu|sidebar|footer|breadcrumbs?|cookie|banner|share|social|related|comments?|advert|ads|promo|subscribe)($|[-_ ])",
+    re.I,
+)
+
+# Set to False (--no-cache) to neither read nor write the cache
+enabled = True
+
+_connection = None
+_lock = threading.Lock()
+
+
+def cache_path() -> str:
+    return os.environ.get("CLI_SUGGEST_WEB_CACHE_PATH") or os.path.expanduser("~/.cli_suggest/web_cache.db")
+
+
+def _connect() -> sqlite3.Connection:
+    global _connection
+    if _connection is None:
+        path = cache_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                markdown TEXT NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        _connection = conn
+    return _connection
+
+
+def close() -> None:
+    global _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+        _connection = None
+
+
+def _cached(url: str) -> Optional[Tuple[str, str, str]]:
+    """(etag, last_modified, markdown) stored for url"""
+    if not enabled:
+        return None
+    with _lock:
+        return _connect().execute(
+            "SELECT etag, last_modified, markdown FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+
+
+def _store(url: str, etag: Optional[str], last_modified: Optional[str], markdown: str) -> None:
+    if not enabled or not (etag or last_modified):
+        return  # nothing to revalidate with, so the next fetch is a full one anyway
+    with _lock:
+        conn = _connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)", (url, etag, last_modified, markdown, time.time())
+        )
+        conn.execute(
+            "DELETE FROM pages WHERE url IN (SELECT url FROM pages ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (MAX_ENTRIES,),
+        )
+
+
+def _touch(url: str) -> None:
+    with _lock:
+        _connect().execute("UPDATE pages SET last_access = ? WHERE url = ?", (time.time(), url))
+
+
+def read_capped(response, max_bytes: int = MAX_BYTES) -> Tuple[bytes, bool]:
+    """The body up to max_bytes, and whether there was more; the rest is never downloaded"""
+    body = bytearray()
+    for block in response.iter_content(READ_SIZE):
+        if engine.cancelled():
+            raise InterruptedError("fetch cancelled")  # Ctrl-C in the REPL: stop downloading
+        body += block
+        if len(body) > max_bytes:
+            response.close()
+            return bytes(body[:max_bytes]), True
+    return bytes(body), False
+
+
+def html_parser() -> str:
+    """lxml when it is installed (several times faster), else the standard library parser"""
+    return "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+
+def _is_boilerplate(tag) -> bool:
+    if tag.name in ("html", "body", "main", "article"):
+        return False  # e.g. <body class="has-sidebar">
+    if tag.get("role") in BOILERPLATE_ROLES or tag.get("aria-hidden") == "true":
+        return True
+    names = " ".join([tag.get("id") or ""] + list(tag.get("class") or []))
+    return bool(names.strip()) and bool(BOILERPLATE_NAMES.search(names))
+
+
+def main_content(soup):
+    """The element holding the page's main text"""
+    for tag in soup(BOILERPLATE_TAGS) + soup.find_all(_is_boilerplate):
+        if tag.decomposed:
+            continue  # went with an ancestor
+        if tag.name in ("header", "footer") and tag.find_parent(["article", "main"]):
+            continue  # an article's own title block
+        tag.decompose()
+
+    for selector in ("main", "article", "[role=main]"):
+        found = soup.select(selector)
+        if len(found) == 1:
+            return found[0]
+
+    # Score each block by the paragraph text directly under it (and half for its grandparent)
+    scores = {}
+    for p in soup.find_all(["p", "pre", "li"]):
+        length = len(p.get_text(strip=True))
+        if length < 25:
+            continue
+        for parent, weight in ((p.parent, 1.0), (p.parent.parent if p.parent else None, 0.5)):
+            if parent is not None and parent.name not in ("[document]", "html"):
+                scores[id(parent)] = (scores.get(id(parent), (0, parent))[0] + length * weight, parent)
+    if scores:
+        best = max(scores.values(), key=lambda item: item[0])[1]
+        body_text = len((soup.body or soup).get_text(strip=True)) or 1
+        if len(best.get_text(strip=True)) >= 0.25 * body_text:
+            return best
+    return soup.body or soup
+
+
+def html_to_markdown(html) -> str:
+    from bs4 import BeautifulSoup
+    import html2text
+
+    soup = BeautifulSoup(html, html_parser())
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    converter = html2text.HTML2Text()
+    converter.ignore_links = False
+    converter.ignore_images = True
+    converter.body_width = 0  # don't hard-wrap; it wastes characters of the budget
+    markdown = converter.handle(str(main_content(soup))).strip()
+    markdown = re.sub(r"\n{3,}", "\n\n", markdown)
+    return f"# {title}\n\n{markdown}" if title and title not in markdown[:200] else markdown
+
+
+def fetch_markdown(session, url: str, timeout: float) -> str:
+    """The page's main content as markdown; raises on HTTP errors and unsupported content"""
+    cached = _cached(url)
+    headers = {}
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    with session.get(url, timeout=timeout, stream=True, headers=headers) as response:
+        if cached and response.status_code == 304:
+            _touch(url)
+            return cached[2]
+        response.raise_for_status()
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type and content_type not in TEXT_TYPES and "html" not in content_type:
+            raise ValueError(f"unsupported content type {content_type}")
+        body, truncated = read_capped(response)
+        declared_charset = "charset=" in response.headers.get("Content-Type", "")
+        encoding = response.encoding if declared_charset else None
+
+    if content_type in TEXT_TYPES:
+        markdown = body.decode(encoding or "utf-8", errors="replace")
+    else:
+        # Without a declared charset, let BeautifulSoup sniff <meta charset> from the bytes
+        markdown = html_to_markdown(body.decode(encoding, errors="replace") if encoding else body)
+    if truncated or len(markdown) > MAX_CHARS:
+        marker = f"\n\n[... page truncated ({len(markdown)} characters from {len(body)} bytes read) ...]"
+        markdown = markdown[: MAX_CHARS - len(marker)] + marker
+    _store(url, response.headers.get("ETag"), response.headers.get("Last-Modified"), markdown)
+    return markdown
@@ -6,7 +6,6 @@ setup(
     py_modules=['cli_suggest'],
     install_requires=[
         'anthropic',
-        'ratelimit',
     ],
     entry_points={
         'console_scripts': [
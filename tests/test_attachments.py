@@ -0,0 +1,93 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from cli_suggest import attachments
+
+
+class TestAttachments(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        patcher = mock.patch.dict(os.environ, {"CLI_SUGGEST_ATTACHMENTS_PATH": os.path.join(tmp.name, "index.db")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        attachments.close()
+        self.addCleanup(attachments.close)
+        self.addCleanup(attachments.remove, "all")
+
+    def write(self, name, data):
+        path = os.path.join(self.dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+        return path
+
+    def test_large_file_contributes_only_relevant_chunks(self):
+        filler = "".join(f"line {i} of boring text\n" for i in range(20000))
+        path = self.write("big.log", filler + "To rotate the credentials run rotate-keys --force\n" + filler)
+        added, _ = attachments.add(path)
+        self.assertEqual(added, [path])
+        excerpts = attachments.search("how do I rotate credentials", [path], budget=2000)
+        self.assertLessEqual(len(excerpts), attachments.TOP_K)
+        self.assertTrue(any("rotate-keys --force" in chunk for _, chunk in excerpts))
+        self.assertLess(sum(len(chunk) for _, chunk in excerpts), 2000 * 4)
+
+    def test_chunks_are_line_aligned(self):
+        path = self.write("lines.txt", "".join(f"line {i}\n" for i in range(1000)))
+        attachments.add(path)
+        excerpts = attachments.search("", [path], budget=100000, top_k=1000)
+        self.assertTrue(all(chunk.endswith("\n") for _, chunk in excerpts))
+        self.assertEqual("".join(chunk for _, chunk in excerpts), open(path).read())
+
+    def test_directories_and_globs_skip_binaries_and_vcs(self):
+        self.write("src/app.py", "print('app')\n")
+        self.write("src/lib/util.py", "def util(): pass\n")
+        self.write("src/logo.png", b"\x89PNG\r\n\x1a\n\x00\x00")
+        self.write("src/.git/config", "[core]\n")
+        self.write("src/node_modules/x.js", "x\n")
+        added, skipped = attachments.add(os.path.join(self.dir, "src"))
+        self.assertEqual([os.path.relpath(p, self.dir) for p in added], ["src/app.py", "src/lib/util.py"])
+        self.assertEqual([reason for _, reason in skipped], ["binary file"])
+        added, _ = attachments.add(os.path.join(self.dir, "src", "**", "*.py"))
+        self.assertEqual(len(added), 2)
+
+    def test_only_changed_files_are_reindexed(self):
+        path = self.write("notes.md", "deploy with make ship\n")
+        attachments.add(path)
+        with mock.patch.object(attachments, "_read_chunks", wraps=attachments._read_chunks) as read:
+            attachments.context_entries()
+            read.assert_not_called()  # same mtime and size
+            os.utime(path, (time.time() + 10, time.time() + 10))
+            attachments.context_entries()
+            read.assert_not_called()  # touched, same hash
+            self.write("notes.md", "deploy with make release\n")
+            entries = attachments.context_entries()
+            self.assertEqual(read.call_count, 1)
+        self.assertIn("25 bytes", entries[f"File_{path}"])
+        excerpts = attachments.search("deploy", [path], budget=1000)
+        self.assertEqual(excerpts, [(path, "deploy with make release\n")])
+
+    def test_entries_follow_the_session(self):
+        first = self.write("a.txt", "alpha\n")
+        second = self.write("b.txt", "beta\n")
+        attachments.add(first)
+        attachments.add(second)
+        self.assertEqual(list(attachments.context_entries()), [f"File_{first}", f"File_{second}"])
+        self.assertTrue(attachments.remove(first))
+        self.assertFalse(attachments.remove(first))
+        self.assertEqual(list(attachments.context_entries()), [f"File_{second}"])
+        os.unlink(second)
+        self.assertEqual(attachments.context_entries(), {})
+
+    def test_index_survives_restarts(self):
+        path = self.write("notes.md", "deploy with make ship\n")
+        attachments.add(path)
+        attachments.close()
+        attachments.remove("all")
+        with mock.patch.object(attachments, "_read_chunks") as read:
+            attachments.add(path)
+        read.assert_not_called()
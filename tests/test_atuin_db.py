@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from cli_suggest import atuin_db, cli_suggest
+
+SCHEMA = """
+create table history (
+    id text primary key,
+    timestamp integer not null,
+    duration integer not null,
+    exit integer not null,
+    command text not null,
+    cwd text not null,
+    session text not null,
+    hostname text not null,
+    deleted_at integer,
+    unique(timestamp, cwd, command)
+);
+create index idx_history_timestamp on history(timestamp);
+create index idx_history_command on history(command);
+create index idx_history_command_timestamp on history(command, timestamp);
+"""
+
+
+def make_history_db(path, commands):
+    """Create an atuin-shaped history.db from (command, cwd, age_seconds) tuples"""
+    now = time.time()
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executemany(
+        "insert into history values (?, ?, 0, 0, ?, ?, 's', 'h', NULL)",
+        [
+            (str(i), int((now - age) * 1e9), command, cwd)
+            for i, (command, cwd, age) in enumerate(commands)
+        ],
+    )
+    conn.commit()
+    return conn
+
+
+class TestAtuinDb(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "history.db")
+        history = [("git status", "/repo", 1000 + i) for i in range(30)]
+        history += [("ls", "/tmp", 5000 + i) for i in range(20)]
+        history += [("make", "/repo", 10 + i) for i in range(5)]
+        history += [("vim notes", "/home", 1)]
+        self.writer = make_history_db(self.path, history)
+        self.addCleanup(self.writer.close)
+        patcher = mock.patch.dict(os.environ, {"ATUIN_DB_PATH": self.path})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(atuin_db.close)
+
+    def test_recent_commands_oldest_first(self):
+        self.assertEqual(atuin_db.recent_commands(3), ["make", "make", "vim notes"])
+
+    def test_most_common_commands(self):
+        self.assertEqual(
+            atuin_db.most_common_commands(2), [("git status", 30), ("ls", 20)]
+        )
+
+    def test_per_cwd_and_time_window(self):
+        self.assertEqual(
+            atuin_db.most_common_commands(5, cwd="/repo"), [("git status", 30), ("make", 5)]
+        )
+        self.assertEqual(
+            atuin_db.commands_in_window(100), [("make", 5), ("vim notes", 1)]
+        )
+
+    def test_connection_is_read_only(self):
+        with self.assertRaises(sqlite3.OperationalError):
+            atuin_db._query("delete from history")
+
+    def test_sees_rows_written_by_atuin(self):
+        atuin_db.recent_commands(1)
+        self.writer.execute(
+            "insert into history values ('new', ?, 0, 0, 'htop', '/', 's', 'h', NULL)",
+            (int(time.time() * 1e9),),
+        )
+        self.writer.commit()
+        self.assertEqual(atuin_db.recent_commands(1), ["htop"])
+
+    def test_deleted_rows_are_ignored(self):
+        # atuin replaces the command of a deleted row with random text
+        self.writer.execute(
+            "update history set deleted_at = 1, command = 'q8Zk2LxW0vNfR4tYb7HcJ1mPa9sDe3Gu' "
+            "where command = 'vim notes'"
+        )
+        self.writer.commit()
+        self.assertEqual(atuin_db.recent_commands(1), ["make"])
+        commands = [command for command, _ in atuin_db.most_common_commands(50)]
+        self.assertNotIn("q8Zk2LxW0vNfR4tYb7HcJ1mPa9sDe3Gu", commands)
+        self.assertNotIn("q8Zk2LxW0vNfR4tYb7HcJ1mPa9sDe3Gu", atuin_db.recent_commands(50))
+
+    def test_deleted_rows_drop_out_of_counts(self):
+        # Deleting 15 of the 30 `git status` runs (without touching the text) reorders the top two
+        self.writer.execute("update history set deleted_at = 1 where command = 'git status' and cast(id as integer) < 15")
+        self.writer.commit()
+        self.assertEqual(atuin_db.most_common_commands(2), [("ls", 20), ("git status", 15)])
+        self.assertEqual(atuin_db.most_common_commands(1, cwd="/repo"), [("git status", 15)])
+
+    def test_cli_helpers_prefer_database(self):
+        with mock.patch.object(cli_suggest.subprocess, "run") as run:
+            self.assertEqual(cli_suggest.get_most_common_commands(1), ["git status"])
+            self.assertEqual(cli_suggest.get_recent_commands(1), ["vim notes"])
+        run.assert_not_called()
+
+    def test_falls_back_to_cli_without_database(self):
+        atuin_db.close()
+        os.environ["ATUIN_DB_PATH"] = self.path + ".missing"
+        self.assertFalse(atuin_db.available())
+        result = mock.Mock(stdout="ls\npwd\n", returncode=0)
+        with mock.patch.object(cli_suggest.subprocess, "run", return_value=result) as run:
+            self.assertEqual(cli_suggest.get_recent_commands(2), ["ls", "pwd"])
+        run.assert_called_once()
@@ -0,0 +1,111 @@
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from cli_suggest import batch
+
+
+def lines(*records):
+    return io.StringIO("".join(f"{r}\n" for r in records))
+
+
+def results(out):
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.checkpoint = os.path.join(tmp.name, "job.jsonl")
+
+    def test_records_are_text_or_json(self):
+        out = io.StringIO()
+        batch.run(lines("disk full", "", '{"id": 7, "msg": "oom"}', "{not json"), out, str.upper)
+        self.assertEqual(
+            [(r["index"], r["input"], r["output"]) for r in results(out)],
+            [(0, "disk full", "DISK FULL"), (1, {"id": 7, "msg": "oom"}, '{"ID": 7, "MSG": "OOM"}'),
+             (2, "{not json", "{NOT JSON")],
+        )
+
+    def test_ordered_output_despite_uneven_latency(self):
+        def slow_first(text):
+            time.sleep(0.2 if text == "0" else 0.01)
+            return text
+
+        out = io.StringIO()
+        batch.run(lines(*range(10)), out, slow_first, workers=4)
+        self.assertEqual([r["index"] for r in results(out)], list(range(10)))
+
+    def test_unordered_output_in_completion_order(self):
+        def slow_first(text):
+            time.sleep(0.3 if text == "0" else 0.01)
+            return text
+
+        out = io.StringIO()
+        batch.run(lines(*range(4)), out, slow_first, workers=4, ordered=False)
+        self.assertEqual([r["index"] for r in results(out)][-1], 0)
+
+    def test_requests_run_concurrently_within_the_pool(self):
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def track(text):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return text
+
+        batch.run(lines(*range(20)), io.StringIO(), track, workers=3)
+        self.assertEqual(peak[0], 3)
+
+    def test_input_is_read_lazily(self):
+        consumed = []
+
+        def records():
+            for i in range(1000):
+                consumed.append(i)
+                yield i, str(i)
+
+        first = next(batch.run_batch(records(), str, workers=2))
+        self.assertEqual(first["index"], 0)
+        self.assertLessEqual(len(consumed), 2 * batch.WINDOW_PER_WORKER + 1)
+
+    def test_errors_are_reported_per_record(self):
+        def fail_on_b(text):
+            if text == "b":
+                raise RuntimeError("overloaded")
+            return text
+
+        out = io.StringIO()
+        failures = batch.run(lines("a", "b", "c"), out, fail_on_b)
+        self.assertEqual(failures, 1)
+        self.assertEqual(results(out)[1], {"index": 1, "input": "b", "error": "overloaded"})
+
+    def test_resume_skips_finished_records(self):
+        def flaky(text):
+            if text in ("c", "d"):
+                raise RuntimeError("connection reset")
+            return text.upper()
+
+        batch.run(lines("a", "b", "c", "d"), io.StringIO(), flaky, checkpoint=self.checkpoint)
+        # The job was killed mid-write: a partial line is left behind
+        with open(self.checkpoint, "a") as f:
+            f.write('{"index": 2, "inp')
+
+        sent = []
+        out = io.StringIO()
+        failures = batch.run(lines("a", "b", "c", "d"), out, lambda text: sent.append(text) or text.upper(),
+                             checkpoint=self.checkpoint)
+        self.assertEqual(failures, 0)
+        self.assertEqual(sorted(sent), ["c", "d"])
+        self.assertEqual([r["output"] for r in results(out)], ["A", "B", "C", "D"])
+        self.assertEqual(sorted(batch.load_checkpoint(self.checkpoint)), [0, 1, 2, 3])
+
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from benchmarks import fake_atuin, mock_llm, run
+from benchmarks.bench_atuin_db import build_history_db
+from cli_suggest import atuin_db, cli_suggest
+
+
+class TestRegressionGate(unittest.TestCase):
+    def test_compare_applies_tolerance_per_unit(self):
+        baseline = {"oneshot": {"e2e_ms": 1000.0, "rss_kb": 60000, "subprocesses": 1, "ttft_ms": None}}
+        within = {"oneshot": {"e2e_ms": 1900.0, "rss_kb": 70000, "subprocesses": 1, "ttft_ms": 200.0}}
+        self.assertEqual(run.compare(within, baseline), [])
+        worse = {"oneshot": {"e2e_ms": 2500.0, "rss_kb": 90000, "subprocesses": 2}, "new": {"e2e_ms": 1.0}}
+        regressions = run.compare(worse, baseline)
+        self.assertEqual([r.split(":")[0] for r in regressions],
+                         ["oneshot e2e_ms", "oneshot rss_kb", "oneshot subprocesses"])
+
+    def test_median_skips_missing_values(self):
+        results = [{"e2e_ms": 3.0, "ttft_ms": None}, {"e2e_ms": 1.0, "ttft_ms": None}, {"e2e_ms": 2.0, "ttft_ms": 5.0}]
+        summary = run.median(results)
+        self.assertEqual((summary["e2e_ms"], summary["ttft_ms"], summary["rss_kb"]), (2.0, 5.0, None))
+
+
+class TestFakes(unittest.TestCase):
+    def test_fake_atuin_output_parses_like_the_real_one(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = os.path.join(tmp, "history.db")
+            build_history_db(db, 2000)
+            fake_atuin.install(os.path.join(tmp, "bin"))
+            env = {"PATH": os.path.join(tmp, "bin") + os.pathsep + os.environ["PATH"], "FAKE_ATUIN_DB": db,
+                   "ATUIN_DB_PATH": os.path.join(tmp, "missing.db")}
+            with mock.patch.dict(os.environ, env):
+                atuin_db.close()
+                self.assertFalse(atuin_db.available())
+                recent = cli_suggest.get_recent_commands(5)
+                common = cli_suggest.get_most_common_commands(10)
+            atuin_db.close()
+        self.assertEqual(len(recent), 5)
+        self.assertEqual(len(common), 10)
+        self.assertTrue(all(" " in command for command in common))
+
+    def test_mock_server_streams_after_the_configured_delay(self):
+        import anthropic
+
+        server, url = mock_llm.start(ttft=0.3, token_delay=0.0)
+        self.addCleanup(server.shutdown)
+        client = anthropic.Anthropic(api_key="test", base_url=url)
+        start = time.monotonic()
+        with client.messages.stream(model="mock", max_tokens=10, messages=[{"role": "user", "content": "hi"}]) as stream:
+            pieces = list(stream.text_stream)
+        self.assertEqual("".join(pieces), mock_llm.REPLY)
+        self.assertEqual(pieces, mock_llm.split_tokens(mock_llm.REPLY))
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+        self.assertEqual(server.requests, 1)
+
+if __name__ == "__main__":
+    unittest.main()
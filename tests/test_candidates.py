@@ -0,0 +1,47 @@
+import unittest
+from unittest import mock
+
+from cli_suggest import candidates, cli_suggest
+
+EXECUTABLES = {"du", "find", "ls", "sort", "ncdu", "cd"}
+
+
+class TestCandidates(unittest.TestCase):
+    def test_parse_numbered_reply(self):
+        reply = "```\n1. `du -sh * | sort -h`\n2) ncdu\n- find . -size +100M\n1. du -sh * | sort -h\n```"
+        self.assertEqual(
+            candidates.parse_candidates(reply),
+            ["du -sh * | sort -h", "ncdu", "find . -size +100M"],
+        )
+
+    def test_base_executable_skips_prefixes(self):
+        self.assertEqual(candidates.base_executable("sudo FOO=1 env du -sh"), "du")
+        self.assertEqual(candidates.base_executable("ls | wc -l"), "ls")
+
+    def test_rank_prefers_valid_installed_and_familiar(self):
+        commands = [
+            "dust -r",  # not installed
+            "du -sh * | sort -h",
+            "find . -size +100M -exec ls -lh {} \\;",
+            "du -sh $(",  # syntax error
+        ]
+        ranked = candidates.rank(commands, {"find": 40, "du": 3}, EXECUTABLES)
+        self.assertEqual(
+            [c.command for c in ranked],
+            [commands[2], commands[1], commands[0], commands[3]],
+        )
+        self.assertEqual(ranked[2].notes(), " (not installed)")
+        self.assertIn("syntax error", ranked[3].notes())
+
+    def test_ties_keep_llm_order(self):
+        ranked = candidates.rank(["ls -la", "ls -1"], {}, EXECUTABLES)
+        self.assertEqual([c.command for c in ranked], ["ls -la", "ls -1"])
+
+    def test_get_candidates_uses_one_call(self):
+        reply = "1. dust\n2. du -sh .\n3. ncdu"
+        with mock.patch.object(cli_suggest, "cached_complete", return_value=reply) as complete, \
+                mock.patch.object(cli_suggest.typo_fixer, "load_vocabulary", return_value={"commands": {"du": 9}}), \
+                mock.patch.object(cli_suggest.typo_fixer, "path_executables", return_value=EXECUTABLES):
+            ranked = cli_suggest.get_candidates("disk usage", [], {"OS": "posix"}, n=3)
+        complete.assert_called_once()
+        self.assertEqual([c.command for c in ranked], ["du -sh .", "ncdu", "dust"])
@@ -1,4 +1,8 @@
+import os
+import tempfile
 import unittest
+from unittest import mock
+from cli_suggest import cli_suggest
 from cli_suggest.cli_suggest import extract_code_from_backticks
 
 class TestExtractCodeFromBackticks(unittest.TestCase):
@@ -44,3 +48,85 @@ print("Second")
         input_text = "Non-empty code block:\n```\nprint('Hello, world!')\n```\nEnd"
         expected_output = "print('Hello, world!')"
         self.assertEqual(extract_code_from_backticks(input_text), expected_output)
+
+
+class TestGlobalContextCache(unittest.TestCase):
+    def setUp(self):
+        cli_suggest.invalidate_context_cache()
+        self.addCleanup(cli_suggest.invalidate_context_cache)
+        patcher = mock.patch.object(cli_suggest, "get_history_insights", return_value="")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_atuin_queried_once_within_ttl(self):
+        with mock.patch.object(cli_suggest, "get_recent_commands", return_value=["ls"]) as recent, \
+                mock.patch.object(cli_suggest, "get_most_common_commands", return_value=["git status"]) as common:
+            first = cli_suggest.get_global_context()
+            second = cli_suggest.get_global_context()
+        self.assertEqual(first, second)
+        self.assertEqual(recent.call_count, 1)
+        self.assertEqual(common.call_count, 1)
+
+    def test_invalidate_refreshes_only_given_key(self):
+        with mock.patch.object(cli_suggest, "get_recent_commands", return_value=["ls"]) as recent, \
+                mock.patch.object(cli_suggest, "get_most_common_commands", return_value=["git status"]) as common:
+            cli_suggest.get_global_context()
+            cli_suggest.invalidate_context_cache("Recent_Commands")
+            cli_suggest.get_global_context()
+        self.assertEqual(recent.call_count, 2)
+        self.assertEqual(common.call_count, 1)
+
+    def test_expired_entries_are_reloaded(self):
+        with mock.patch.object(cli_suggest, "get_recent_commands", return_value=["ls"]) as recent, \
+                mock.patch.object(cli_suggest, "get_most_common_commands", return_value=[]), \
+                mock.patch.dict(cli_suggest.CONTEXT_TTL, {"Recent_Commands": 0}):
+            cli_suggest.get_global_context()
+            cli_suggest.get_global_context()
+        self.assertEqual(recent.call_count, 2)
+
+    def test_add_attaches_file_without_loading_history(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "notes.txt")
+        with open(path, "w") as f:
+            f.write("deploy with make ship")
+        patcher = mock.patch.dict(os.environ, {"CLI_SUGGEST_ATTACHMENTS_PATH": os.path.join(tmp.name, "index.db")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(cli_suggest.attachments.close)
+        self.addCleanup(cli_suggest.attachments.remove, "all")
+        with mock.patch.object(cli_suggest, "get_recent_commands") as recent:
+            cli_suggest.process_suggestion(f"/add {path}", [])
+        recent.assert_not_called()
+        with mock.patch.object(cli_suggest, "get_recent_commands", return_value=[]), \
+                mock.patch.object(cli_suggest, "get_most_common_commands", return_value=[]):
+            context = cli_suggest.get_global_context()
+        self.assertIn("21 bytes in 1 chunks", context[f"File_{path}"])
+        context_str, _ = cli_suggest.context_builder.build_context("how do I deploy", [], context, "command")
+        self.assertIn("deploy with make ship", context_str)
+
+        cli_suggest.process_suggestion("/drop", [])
+        with mock.patch.object(cli_suggest, "get_recent_commands", return_value=[]), \
+                mock.patch.object(cli_suggest, "get_most_common_commands", return_value=[]):
+            self.assertNotIn(f"File_{path}", cli_suggest.get_global_context())
+
+
+class TestPromptCache(unittest.TestCase):
+    def test_prompt_prefix_is_marked_and_stable_across_queries(self):
+        context = {"OS": "posix", "PWD": "/repo", "Recent_Commands": "ls", "Common_Commands": "git status"}
+        with mock.patch.object(cli_suggest, "cached_complete", return_value="ls") as complete:
+            cli_suggest.get_suggestion("list files", [], context)
+            cli_suggest.get_suggestion("show disk usage", ["User: list files", "Assistant: ls"], context)
+        (first, second) = [call.args[3] for call in complete.call_args_list]
+        self.assertEqual(first[0], second[0])
+        self.assertEqual(first[0]["cache_control"], {"type": "ephemeral"})
+        self.assertIn("Common_Commands: git status", first[0]["text"])
+        self.assertNotIn("cache_control", first[1])
+        self.assertIn("Current request: show disk usage", second[1]["text"])
+        self.assertIn("Recent_Commands: ls", second[1]["text"])
+
+    def test_prompt_cache_can_be_turned_off(self):
+        with mock.patch.object(cli_suggest, "PROMPT_CACHE", False):
+            prompt = cli_suggest.split_prompt("Do it:", "OS: posix", "Recent_Commands: ls", "", "Current request: x", "Go:")
+        self.assertIsInstance(prompt, str)
+        self.assertTrue(prompt.startswith("Do it:\n\nGlobal context:\nOS: posix\nRecent_Commands: ls"))
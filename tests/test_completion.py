@@ -0,0 +1,42 @@
+import unittest
+
+from prompt_toolkit.completion import CompleteEvent
+from prompt_toolkit.document import Document
+
+from cli_suggest.completion import HistoryCompleter
+
+
+class TestHistoryCompleter(unittest.TestCase):
+    def setUp(self):
+        self.prefixes = []
+
+        def predict(prefix):
+            self.prefixes.append(prefix)
+            return [(command, "here") for command in ("git status", "git stash") if command.startswith(prefix)]
+
+        self.completer = HistoryCompleter(predict)
+
+    def complete(self, text):
+        return list(self.completer.get_completions(Document(text), CompleteEvent()))
+
+    def test_completes_a_command_being_typed(self):
+        completions = self.complete("git st")
+        self.assertEqual([c.text for c in completions], ["git status", "git stash"])
+        self.assertEqual(completions[0].start_position, -len("git st"))
+        self.assertEqual(completions[0].display_meta_text, "here")
+
+    def test_shell_prefixes_are_skipped(self):
+        self.assertEqual([c.text for c in self.complete("!git sta")], ["git status", "git stash"])
+        self.assertEqual([c.text for c in self.complete("/sh git stas")], ["git stash"])
+        self.assertEqual(self.prefixes, ["git sta", "git stas"])
+
+    def test_empty_line_lists_predictions(self):
+        self.assertEqual(len(self.complete("")), 2)
+
+    def test_other_slash_commands_are_not_completed(self):
+        self.assertEqual(self.complete("/add src"), [])
+        self.assertEqual(self.prefixes, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from cli_suggest import attachments, context_builder
+from cli_suggest.context_builder import build_context, build_split_context, estimate_tokens
+
+BASE = {"OS": "posix", "PWD": "/repo", "Recent_Commands": "ls, pwd", "Common_Commands": "git status"}
+
+
+def exchange(query, answer, output=None):
+    turns = [f"User: {query}", f"Assistant: {answer}"]
+    if output is not None:
+        turns.append(f"Output: {output}")
+    return turns
+
+
+class TestBuildContext(unittest.TestCase):
+    def test_prompt_stays_within_budget_for_huge_output(self):
+        history = exchange("find everything", "find /", "/etc/passwd\n" * 200000)
+        history += exchange("list files", "ls")
+        context_str, history_str = build_context("show disk usage", history, BASE, "command")
+        total = estimate_tokens(context_str) + estimate_tokens(history_str)
+        self.assertLessEqual(total, context_builder.MODE_BUDGETS["command"])
+        self.assertIn("characters omitted", history_str)
+        self.assertIn("/etc/passwd", history_str)  # head survives
+        self.assertIn("User: list files", history_str)
+
+    def test_huge_scripts_in_recent_exchanges_stay_within_budget(self):
+        script = "echo step\n" * 20000  # ~200KB
+        history = ["User: /multi deploy", f"Assistant (multi-line script suggestion):\n{script}",
+                   f"User edited script:\n{script}", "Assistant: /multi deploy", f"Output: {script}"]
+        history += ["User: /multi again", f"Assistant (multi-line script suggestion):\n{script}"]
+        context_str, history_str = build_context("deploy it", history, BASE, "multi")
+        total = estimate_tokens(context_str) + estimate_tokens(history_str)
+        self.assertLessEqual(total, context_builder.MODE_BUDGETS["multi"])
+        self.assertIn("User: /multi again", history_str)
+
+    def test_declined_marker_stays_with_its_exchange(self):
+        history = exchange("delete logs", "rm -rf /var/log/app") + [
+            "Output: [Command not executed]",
+            "User: [Chose not to execute the command]",
+        ]
+        exchanges = context_builder.split_exchanges(history + exchange("list files", "ls"))
+        self.assertEqual(len(exchanges), 2)
+        self.assertEqual(exchanges[0][-1], "User: [Chose not to execute the command]")
+
+    def test_relevant_old_exchange_beats_irrelevant_ones(self):
+        history = exchange("configure nginx reverse proxy", "vim /etc/nginx/nginx.conf")
+        for i in range(40):
+            history += exchange(f"unrelated chatter {i}", "echo " + "x" * 400)
+        history += exchange("latest", "pwd")
+        _, history_str = build_context("reload nginx", history, BASE, "command")
+        self.assertIn("nginx.conf", history_str)
+        self.assertIn("User: latest", history_str)
+        self.assertIn("earlier exchange(s) omitted", history_str)
+        self.assertNotIn("unrelated chatter 0\n", history_str)
+
+    def test_short_history_is_kept_verbatim(self):
+        history = exchange("list files", "ls -la", "a\nb")
+        _, history_str = build_context("again", history, BASE, "ask")
+        self.assertEqual(history_str, "\n".join(history))
+
+    def test_only_matching_page_chunks_are_included(self):
+        filler = "\n".join(f"line {i} of boring text" for i in range(2000))
+        document = filler + "\nTo rotate the credentials run rotate-keys --force\n" + filler
+        context_str, _ = build_context(
+            "how do I rotate credentials", [], dict(BASE, Webpage_notes=document), "command"
+        )
+        self.assertIn("Webpage_notes (relevant excerpts):", context_str)
+        self.assertIn("rotate-keys --force", context_str)
+        self.assertLess(len(context_str), len(document) // 10)
+
+    def test_accepts_history_as_string(self):
+        _, history_str = build_context("q", "User: hi", BASE, "command")
+        self.assertEqual(history_str, "User: hi")
+
+
+class TestSplitContext(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        patcher = mock.patch.dict(os.environ, {"CLI_SUGGEST_ATTACHMENTS_PATH": os.path.join(tmp.name, "index.db")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        attachments.close()
+        self.addCleanup(attachments.close)
+        self.addCleanup(attachments.remove, "all")
+
+    def test_stable_part_does_not_depend_on_the_query(self):
+        path = os.path.join(self.dir, "runbook.md")
+        with open(path, "w") as f:
+            f.write("# Runbook\n" + "".join(f"step {i}: routine maintenance item\n" for i in range(3000)))
+            f.write("restart the payments service with systemctl restart payments\n")
+        attachments.add(path)
+        context = dict(BASE, **attachments.context_entries())
+
+        first = build_split_context("restart payments", [], context, "ask")
+        second = build_split_context("list files", ["User: hi", "Assistant: ls"], dict(context, Recent_Commands="ls"), "ask")
+        self.assertEqual(first[0], second[0])
+        self.assertIn("Common_Commands: git status", first[0])
+        self.assertIn("# Runbook", first[0])
+        self.assertNotIn("Recent_Commands", first[0])
+        self.assertIn("Recent_Commands: ls, pwd", first[1])
+        self.assertIn("systemctl restart payments", first[1])
+        self.assertNotIn("# Runbook", first[1])  # opening chunk is not repeated
+        total = sum(estimate_tokens(part) for part in first)
+        self.assertLessEqual(total, context_builder.MODE_BUDGETS["ask"])
+
+    def test_joined_parts_match_build_context_without_attachments(self):
+        stable, volatile, history = build_split_context("q", "User: hi", BASE, "command")
+        self.assertEqual(sorted((stable + "\n" + volatile).splitlines()),
+                         sorted(build_context("q", "User: hi", BASE, "command")[0].splitlines()))
+        self.assertEqual(history, "User: hi")
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from cli_suggest import cli_suggest, daemon, daemon_client
+
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "daemon.sock")
+        self.server = daemon.make_server(self.path)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        patcher = mock.patch.dict(os.environ, {"CLI_SUGGEST_SOCKET": self.path})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ping(self):
+        self.assertEqual(daemon_client.request({"op": "ping"}), {"ok": True})
+
+    def test_fix_strips_code_fences(self):
+        with mock.patch.object(cli_suggest, "suggest_fix", return_value="```\ngit status\n```") as fix:
+            reply = daemon_client.request({"op": "fix", "command": "gti status"})
+        fix.assert_called_once_with("gti status", path=None, cwd=None)
+        self.assertEqual(reply["command"], "git status")
+
+    def test_errors_are_reported_not_raised(self):
+        with mock.patch.object(cli_suggest, "suggest_fix", side_effect=RuntimeError("boom")):
+            reply = daemon_client.request({"op": "fix", "command": "x"})
+        self.assertEqual(reply, {"ok": False, "error": "boom"})
+        self.assertFalse(daemon_client.request({"op": "nope"})["ok"])
+
+    def test_client_runs_accepted_fix(self):
+        with mock.patch.object(cli_suggest, "suggest_fix", return_value="true"), \
+                mock.patch("builtins.input", return_value="y"), \
+                mock.patch.object(daemon_client, "run_command", return_value=0) as run:
+            self.assertEqual(daemon_client.main(["--failed-command", "ture"]), 0)
+        run.assert_called_once_with("true")
+
+    def test_fix_uses_the_clients_directory(self):
+        with mock.patch.object(cli_suggest, "suggest_fix", return_value="ls") as fix, \
+                mock.patch("builtins.input", return_value="n"):
+            daemon_client.main(["--failed-command", "sl"])
+        self.assertEqual(fix.call_args.kwargs["cwd"], os.getcwd())
+        with mock.patch.object(cli_suggest, "cached_complete", return_value="ls") as complete, \
+                mock.patch.object(cli_suggest.typo_fixer, "local_fix", return_value=None), \
+                mock.patch.object(cli_suggest.typo_fixer, "load_vocabulary", return_value={}):
+            cli_suggest.suggest_fix("sl", cwd="/srv/app")
+        self.assertEqual(complete.call_args.args[2]["PWD"], "/srv/app")
+
+    def test_client_signals_fallback_when_daemon_is_down(self):
+        os.environ["CLI_SUGGEST_SOCKET"] = self.path + ".missing"
+        self.assertEqual(daemon_client.main(["--failed-command", "x"]), daemon_client.EXIT_NO_DAEMON)
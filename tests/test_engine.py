@@ -0,0 +1,73 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from cli_suggest import cli_suggest, engine
+
+
+class TestEngine(unittest.TestCase):
+    def test_call_returns_result_from_worker_thread(self):
+        self.assertNotEqual(engine.call(threading.get_ident), threading.get_ident())
+        self.assertEqual(engine.call(max, 1, 3), 3)
+
+    def test_gather_runs_loaders_concurrently(self):
+        start = time.perf_counter()
+        values = engine.gather({
+            "a": lambda: time.sleep(0.3) or "A",
+            "b": lambda: time.sleep(0.3) or "B",
+        }).result()
+        self.assertEqual(values, {"a": "A", "b": "B"})
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_ctrl_c_cancels_the_job(self):
+        seen = []
+        started = threading.Event()
+
+        def work():
+            started.set()
+            while not engine.cancelled():
+                time.sleep(0.01)
+            seen.append("stopped")
+
+        job = engine.run(work)
+        self.assertTrue(started.wait(2))
+        with mock.patch.object(job.future, "result", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                job.result()
+        deadline = time.time() + 2
+        while not seen and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(seen, ["stopped"])
+        self.assertFalse(engine.cancelled())  # other callers have no cancel event
+
+
+class TestContextPrefetch(unittest.TestCase):
+    def setUp(self):
+        cli_suggest.invalidate_context_cache()
+        self.addCleanup(cli_suggest.invalidate_context_cache)
+        patcher = mock.patch.object(cli_suggest, "get_history_insights", return_value="")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_prefetched_context_is_reused(self):
+        with mock.patch.object(cli_suggest, "get_recent_commands", return_value=["ls"]) as recent, \
+                mock.patch.object(cli_suggest, "get_most_common_commands", return_value=["make"]) as common:
+            cli_suggest.prefetch_global_context()
+            cli_suggest.prefetch_global_context()  # still in flight or fresh: no second load
+            context = cli_suggest.get_global_context()
+        self.assertEqual(context["Recent_Commands"], "ls")
+        self.assertEqual(context["Common_Commands"], "make")
+        self.assertEqual(recent.call_count, 1)
+        self.assertEqual(common.call_count, 1)
+
+    def test_stale_keys_load_concurrently(self):
+        def slow(value):
+            return lambda *args: time.sleep(0.3) or [value]
+
+        with mock.patch.object(cli_suggest, "get_recent_commands", side_effect=slow("ls")), \
+                mock.patch.object(cli_suggest, "get_most_common_commands", side_effect=slow("make")):
+            start = time.perf_counter()
+            context = cli_suggest.get_global_context()
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(context["Recent_Commands"], "ls")
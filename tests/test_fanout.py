@@ -0,0 +1,93 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from cli_suggest import cli_suggest, fanout
+
+
+def local_argv(host, command):
+    """Stub executor: run the command here, with $HOST set to the host it stands for"""
+    return ["sh", "-c", f"HOST={host}; {command}"]
+
+
+class TestFanOut(unittest.TestCase):
+    def run_fan(self, hosts, command, **kwargs):
+        lines = []
+        results = fanout.fan_out(hosts, command, argv=local_argv, emit=lambda host, line: lines.append((host, line)), **kwargs)
+        return results, lines
+
+    def test_output_is_prefixed_and_exit_codes_are_per_host(self):
+        results, lines = self.run_fan(["a", "b", "c"], 'echo "hello from $HOST"; [ "$HOST" != b ]')
+        self.assertEqual([(r.host, r.exit_code) for r in results], [("a", 0), ("b", 1), ("c", 0)])
+        self.assertEqual(sorted(lines), [("a", "hello from a"), ("b", "hello from b"), ("c", "hello from c")])
+        self.assertEqual(results[1].output, "hello from b\n")
+        self.assertEqual(fanout.exit_code(results), 1)
+
+    def test_pool_bounds_concurrency(self):
+        start = time.monotonic()
+        self.run_fan(["a", "b", "c", "d"], "sleep 0.2", pool_size=2)
+        self.assertGreaterEqual(time.monotonic() - start, 0.4)
+        start = time.monotonic()
+        self.run_fan(["a", "b", "c", "d"], "sleep 0.2", pool_size=4)
+        self.assertLess(time.monotonic() - start, 0.4)
+
+    def test_failure_to_start_is_a_host_failure(self):
+        results = fanout.fan_out(["a"], "true", argv=lambda host, command: ["/nonexistent/ssh"], emit=lambda *_: None)
+        self.assertEqual(results[0].exit_code, fanout.SSH_FAILED)
+
+    def test_summary_diffs_the_odd_host_out(self):
+        results, _ = self.run_fan(["a", "b", "c"], 'echo disk ok; [ "$HOST" = c ] && echo "disk 97% full"; echo done')
+        summary = fanout.summarize(results)
+        self.assertIn("exit codes: a=0, b=0, c=0", summary)
+        self.assertIn("2 of 3 hosts (a, b) printed:\ndisk ok\ndone", summary)
+        self.assertIn("c differs:\n--- a\n+++ c\n", summary)
+        self.assertIn("+disk 97% full", summary)
+
+    def test_summary_when_all_agree(self):
+        results, _ = self.run_fan(["a", "b"], "true")
+        self.assertEqual(fanout.summarize(results), "exit codes: a=0, b=0\nall 2 hosts printed:\n[no output]")
+
+    def test_resolve_hosts(self):
+        groups = {"web": ["web1", "deploy@web2"]}
+        self.assertEqual(fanout.resolve_hosts("web", groups), ["web1", "deploy@web2"])
+        self.assertEqual(fanout.resolve_hosts("db1, db2", groups), ["db1", "db2"])
+        self.assertEqual(fanout.resolve_hosts("db1,", groups), ["db1"])
+        self.assertEqual(fanout.resolve_hosts("wbe", groups), [])
+
+    def test_ssh_multiplexes_without_prompts(self):
+        with tempfile.TemporaryDirectory() as home, mock.patch.dict(os.environ, {"HOME": home}):
+            argv = fanout.ssh_argv("web1", "uptime")
+            self.assertTrue(os.path.isdir(fanout.control_dir()))
+        self.assertEqual(argv[0], "ssh")
+        self.assertEqual(argv[-2:], ["web1", "uptime"])
+        for option in ("BatchMode=yes", "ControlMaster=auto", f"ControlPersist={fanout.CONTROL_PERSIST}"):
+            self.assertIn(option, argv)
+
+
+class TestFanCommand(unittest.TestCase):
+    def test_fan_runs_one_suggestion_on_the_group(self):
+        with mock.patch.object(cli_suggest, "HOSTGROUPS", {"web": ["a", "b"]}), \
+                mock.patch.object(cli_suggest, "get_global_context", return_value={}), \
+                mock.patch.object(cli_suggest, "get_suggestion", return_value="```\necho $HOST\n```") as suggest, \
+                mock.patch.object(fanout, "ssh_argv", local_argv), \
+                mock.patch("builtins.input", return_value="y"), mock.patch("builtins.print"):
+            command, output, _ = cli_suggest.process_suggestion("/fan web print the hostname", [])
+        self.assertEqual(suggest.call_count, 1)
+        self.assertIn("print the hostname", suggest.call_args.args[0])
+        self.assertIn("a, b", suggest.call_args.args[0])
+        self.assertEqual(command, "echo $HOST")
+        self.assertIn("exit codes: a=0, b=0", output)
+        self.assertIn("b differs:", output)
+        self.assertEqual(cli_suggest._turn["exit_code"], 0)
+
+    def test_unknown_group_asks_nothing(self):
+        with mock.patch.object(cli_suggest, "get_suggestion") as suggest, mock.patch("builtins.print"):
+            _, output, _ = cli_suggest.process_suggestion("/fan nowhere uptime", [])
+        suggest.assert_not_called()
+        self.assertTrue(output.startswith("Error: Usage: /fan"))
+
+
+if __name__ == "__main__":
+    unittest.main()
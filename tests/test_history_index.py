@@ -0,0 +1,173 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from benchmarks.bench_atuin_db import SCHEMA
+from cli_suggest import atuin_db, cli_suggest, history_index
+
+
+class TestHistoryIndex(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.history_path = os.path.join(tmp.name, "history.db")
+        self.writer = sqlite3.connect(self.history_path)
+        self.writer.executescript(SCHEMA)
+        self.addCleanup(self.writer.close)
+        self.now = time.time()
+        self.next_id = 0
+        patcher = mock.patch.dict(os.environ, {
+            "ATUIN_DB_PATH": self.history_path,
+            "CLI_SUGGEST_HISTORY_INDEX_PATH": os.path.join(tmp.name, "index.db"),
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(atuin_db.close)
+        self.addCleanup(history_index.close)
+
+    def add(self, command, cwd="/repo", age=100, exit_code=0, session="s1"):
+        self.next_id += 1
+        self.writer.execute(
+            "insert into history values (?, ?, 0, ?, ?, ?, ?, 'h', NULL)",
+            (str(self.next_id), int((self.now - age) * 1e9), exit_code, command, cwd, session),
+        )
+        self.writer.commit()
+
+    def test_counts_per_directory_and_globally(self):
+        for age in (50, 40, 30):
+            self.add("make", age=age)
+        self.add("ls", cwd="/tmp", age=20)
+        self.assertEqual(history_index.refresh(), 4)
+        self.assertEqual(history_index.top_commands(cwd="/repo"), [("make", 3)])
+        self.assertEqual(history_index.top_commands(), [("make", 3), ("ls", 1)])
+        self.assertTrue(history_index.caught_up())
+
+    def test_refresh_reads_only_new_rows(self):
+        self.add("make", age=50)
+        self.assertEqual(history_index.refresh(), 1)
+        self.assertEqual(history_index.refresh(), 0)
+        self.add("make", age=10)
+        self.assertEqual(history_index.refresh(), 1)
+        self.assertEqual(history_index.top_commands(cwd="/repo"), [("make", 2)])
+
+    def test_transitions_follow_sessions(self):
+        for i in range(3):
+            self.add("git add -A", age=300 - 20 * i, session=f"s{i}")
+            self.add("git commit", age=295 - 20 * i, session=f"s{i}")
+        self.add("git add -A", age=200, session="other")
+        self.add("ls", age=199, session="unrelated")  # another session: not a transition
+        history_index.refresh()
+        self.assertEqual(history_index.next_commands("git add -A", "/repo"), [("git commit", 9)])
+        self.assertEqual(history_index.next_commands("git commit", "/repo"), [])
+
+    def test_long_gap_breaks_the_chain(self):
+        self.add("make", age=10_000)
+        self.add("ls", age=10)
+        history_index.refresh()
+        self.assertEqual(history_index.next_commands("make"), [])
+
+    def test_failing_commands(self):
+        for i, exit_code in enumerate((1, 1, 0, 2)):
+            self.add("pytest", age=100 - i, exit_code=exit_code)
+        for i, exit_code in enumerate((0, 0, 130, 0)):
+            self.add("make", age=50 - i, exit_code=exit_code)
+        history_index.refresh()
+        self.assertEqual(history_index.failing_commands("/repo"), [("pytest", 3, 4)])
+
+    def test_recent_commands_rank_first(self):
+        for i in range(4):
+            self.add("old", age=60 * 86400 + i)
+        for i in range(2):
+            self.add("new", age=60 + i)
+        history_index.refresh()
+        self.assertEqual(history_index.top_commands(cwd="/repo")[0], ("old", 4))
+        self.assertEqual(history_index.directory_commands("/repo", now=self.now)[0], ("new", 2))
+
+    def test_deletion_rebuilds_the_index(self):
+        self.add("make", age=50)
+        self.add("secret --token abc", age=40)
+        history_index.refresh()
+        self.writer.execute("update history set deleted_at = 1 where command like 'secret%'")
+        self.writer.commit()
+        with mock.patch.object(history_index, "DELETION_CHECK_INTERVAL", 0):
+            self.assertEqual(history_index.refresh(), 1)
+        self.assertEqual(history_index.top_commands(), [("make", 1)])
+
+    def test_zero_budget_still_makes_progress(self):
+        for i in range(5):
+            self.add(f"cmd {i}", age=100 - i)
+        with mock.patch.object(history_index, "BATCH_ROWS", 2):
+            self.assertEqual(history_index.refresh(budget=0), 2)
+            self.assertFalse(history_index.caught_up())
+            self.assertEqual(history_index.refresh(budget=None), 3)
+        self.assertTrue(history_index.caught_up())
+
+    def test_insights(self):
+        for i in range(3):
+            self.add("pytest", age=100 - 10 * i, exit_code=1, session=f"s{i}")
+            self.add("vim test.py", age=99 - 10 * i, session=f"s{i}")
+        self.add("pytest", age=5, exit_code=1, session="now")
+        text = history_index.insights("/repo")
+        self.assertIn("frequent in this directory: pytest (4x), vim test.py (3x)", text)
+        self.assertIn("usually run after `pytest`: vim test.py", text)
+        self.assertIn("often fails here: pytest (4 of 4 runs)", text)
+        self.assertEqual(history_index.insights("/elsewhere").split("; ")[0], "usually run after `pytest`: vim test.py")
+
+    def test_no_atuin_no_index(self):
+        os.environ["ATUIN_DB_PATH"] = self.history_path + ".missing"
+        self.assertEqual(history_index.insights("/repo"), "")
+        self.assertFalse(history_index.caught_up())
+        self.assertFalse(os.path.exists(history_index.index_path()))
+
+    def test_common_commands_come_from_the_index_once_caught_up(self):
+        self.add("make", age=50)
+        history_index.refresh()
+        with mock.patch.object(atuin_db, "most_common_commands") as scan:
+            self.assertEqual(cli_suggest.get_most_common_commands(), ["make"])
+        scan.assert_not_called()
+
+    def test_predict_backs_off_from_next_to_directory_to_history(self):
+        for i in range(3):
+            self.add("make", age=500 - 20 * i, session=f"s{i}")
+            self.add("make test", age=499 - 20 * i, session=f"s{i}")
+        for i in range(5):
+            self.add("make clean", cwd="/other", age=300 - i)
+        self.add("mkdir build", age=200)
+        self.add("make", age=10, session="shell")
+        history_index.refresh()
+        self.assertEqual(history_index.last_command("shell"), "make")
+        self.assertEqual(
+            history_index.predict("m", "/repo", prev="make"),
+            [("make test", "next"), ("mkdir build", "here"), ("make clean", "history")],
+        )
+        self.assertEqual(history_index.predict("mk", "/repo", prev="make"), [("mkdir build", "here")])
+        self.assertEqual(history_index.predict("make", "/repo", prev="make", limit=1), [("make test", "next")])
+
+    def test_known_commands_skip_the_model(self):
+        self.add("make test", age=30)
+        self.add("make tset", age=20, exit_code=2)
+        history_index.refresh()
+        self.assertEqual(history_index.command_stats("make test"), (1, 0))
+        self.assertTrue(cli_suggest.is_known_command("make test "))
+        self.assertFalse(cli_suggest.is_known_command("make tset"))
+        with mock.patch.object(cli_suggest, "get_suggestion") as suggest, \
+                mock.patch("builtins.input", return_value="n"), mock.patch("builtins.print"):
+            command, output, _ = cli_suggest.process_suggestion("make test", [])
+        suggest.assert_not_called()
+        self.assertEqual((command, output), ("make test", "[Command not executed]"))
+
+    def test_next_prints_predictions(self):
+        self.add("git add -A", age=30, session="shell")
+        self.add("git commit", age=20, session="shell")
+        self.add("git add -A", age=10, session="shell")
+        with mock.patch.dict(os.environ, {"ATUIN_SESSION": "shell"}), \
+                mock.patch("os.getcwd", return_value="/repo"), mock.patch("builtins.print") as printed:
+            cli_suggest.show_next("git")
+        self.assertEqual([call.args[0] for call in printed.call_args_list], ["git commit"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from cli_suggest import cli_suggest, metrics, rate_limiter, response_cache, typo_fixer, web_ingest
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers like the Anthropic and Perplexity APIs and records each connection"""
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body, content_type="application/json"):
+        data = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _record(self):
+        self.server.connections.add(self.client_address)
+        self.server.paths.append(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _stream(self, chunks):
+        events = [
+            ("message_start", {"type": "message_start", "message": {
+                "id": "msg_stub", "type": "message", "role": "assistant", "model": "stub",
+                "content": [], "stop_reason": None, "stop_sequence": None,
+                "usage": {"input_tokens": 1, "output_tokens": 0}}}),
+            ("content_block_start", {"type": "content_block_start", "index": 0,
+                                     "content_block": {"type": "text", "text": ""}}),
+        ]
+        events += [
+            ("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                     "delta": {"type": "text_delta", "text": chunk}})
+            for chunk in chunks
+        ]
+        events += [
+            ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+            ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                               "usage": {"output_tokens": len(chunks)}}),
+            ("message_stop", {"type": "message_stop"}),
+        ]
+        data = "".join(f"event: {name}\ndata: {json.dumps(event)}\n\n" for name, event in events).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = self._record()
+        if self.path.startswith("/slow"):
+            time.sleep(0.5)
+        if self.path.endswith("/v1/messages") and json.loads(body).get("stream"):
+            self._stream(["```bash\n", "ls ", "-la\n", "```"])
+        elif self.path.endswith("/v1/messages"):
+            self._reply({
+                "id": "msg_stub",
+                "type": "message",
+                "role": "assistant",
+                "model": "stub",
+                "content": [{"type": "text", "text": "ls -la"}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": {"input_tokens": 1, "output_tokens": 1},
+            })
+        else:
+            self._reply({"choices": [{"message": {"content": "stub answer"}}]})
+
+    def do_GET(self):
+        self._record()
+        self._reply("<html><body><p>Hello from the stub</p></body></html>", "text/html")
+
+
+class TestSharedClients(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.connections = set()
+        self.server.paths = []
+        self.server.handle_error = lambda request, client_address: None  # clients that time out
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(rate_limiter.close)
+        self.addCleanup(web_ingest.close)
+        self.addCleanup(metrics.close)
+        for patcher in (
+            mock.patch.dict(os.environ, {
+                "ANTHROPIC_BASE_URL": self.base_url,
+                "CLI_SUGGEST_RATE_LIMIT_PATH": os.path.join(tmp.name, "rate_limit.db"),
+                "CLI_SUGGEST_WEB_CACHE_PATH": os.path.join(tmp.name, "web_cache.db"),
+                "CLI_SUGGEST_METRICS_PATH": os.path.join(tmp.name, "metrics.db"),
+            }),
+            mock.patch.object(cli_suggest, "API_KEY", "test-key"),
+            mock.patch.object(cli_suggest, "PERPLEXITY_API_KEY", "test-key"),
+            mock.patch.object(cli_suggest, "PERPLEXITY_API_URL", f"{self.base_url}/chat/completions"),
+            mock.patch.object(response_cache, "enabled", False),
+            mock.patch.object(typo_fixer, "load_vocabulary", return_value={}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        cli_suggest.close_clients()
+        self.addCleanup(cli_suggest.close_clients)
+
+    def test_llm_calls_share_one_connection(self):
+        context = {"OS": "posix", "PWD": "/"}
+        self.assertEqual(cli_suggest.get_suggestion("list files", "", context), "ls -la")
+        self.assertEqual(cli_suggest.ask_question("what is ls?", "", context), "ls -la")
+        with mock.patch("builtins.input", return_value="n"):
+            cli_suggest.handle_failed_command("git push")
+        self.assertEqual(self.server.paths, ["/v1/messages"] * 3)
+        self.assertEqual(len(self.server.connections), 1)
+        self.assertIs(cli_suggest.get_client(), cli_suggest.get_client())
+
+    def test_streaming_delivers_deltas_and_full_text(self):
+        deltas = []
+        suggestion = cli_suggest.get_suggestion("list files", "", {}, on_text=deltas.append)
+        self.assertEqual(deltas, ["```bash\n", "ls ", "-la\n", "```"])
+        self.assertEqual(suggestion, "```bash\nls -la\n```")
+        self.assertEqual(cli_suggest.extract_code_from_backticks(suggestion), "ls -la")
+        answer = cli_suggest.ask_question("what is ls?", "", {}, on_text=deltas.append)
+        self.assertEqual(answer, suggestion)
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_http_calls_share_one_session(self):
+        self.assertEqual(cli_suggest.perplexity_query("q", [], {}), "stub answer")
+        self.assertIn("Hello from the stub", cli_suggest.webpage_to_markdown(f"{self.base_url}/page"))
+        self.assertEqual(cli_suggest.perplexity_query("q", [], {}), "stub answer")
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_http_timeout_is_applied(self):
+        with mock.patch.object(cli_suggest, "HTTP_TIMEOUT", 0.1), \
+                mock.patch.object(cli_suggest, "PERPLEXITY_API_URL", f"{self.base_url}/slow"):
+            answer = cli_suggest.perplexity_query("q", [], {})
+        self.assertTrue(answer.startswith("Error querying Perplexity API"))
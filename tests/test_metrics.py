@@ -0,0 +1,142 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from cli_suggest import cli_suggest, engine, metrics, rate_limiter, response_cache
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.export = os.path.join(tmp.name, "metrics.jsonl")
+        for patcher in (
+            mock.patch.dict(os.environ, {
+                "CLI_SUGGEST_METRICS_PATH": os.path.join(tmp.name, "metrics.db"),
+                "CLI_SUGGEST_CACHE_PATH": os.path.join(tmp.name, "cache.db"),
+                "CLI_SUGGEST_RATE_LIMIT_PATH": os.path.join(tmp.name, "rate_limit.db"),
+            }),
+            mock.patch.object(response_cache, "enabled", True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for module in (metrics, response_cache, rate_limiter):
+            module.close()
+            self.addCleanup(module.close)
+
+
+class TestMetrics(MetricsTestCase):
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(metrics.percentile(values, 50), 50)
+        self.assertEqual(metrics.percentile(values, 99), 99)
+        self.assertEqual(metrics.percentile([7.0], 90), 7.0)
+        self.assertEqual(metrics.percentile([3, 1, 2], 100), 3)
+
+    def test_request_records_spans_usage_and_cache(self):
+        with metrics.request("repl", "command"):
+            with metrics.span("context"):
+                pass
+            metrics.note(cache_hit=False)
+            metrics.add_usage("claude-3-haiku-20240307", SimpleNamespace(input_tokens=1000, output_tokens=200))
+            metrics.mark("total")
+        (row,) = metrics.records()
+        self.assertEqual((row["kind"], row["mode"], row["cache_hit"], row["calls"]), ("repl", "command", False, 1))
+        self.assertEqual((row["input_tokens"], row["output_tokens"]), (1000, 200))
+        self.assertEqual(set(row["spans_ms"]), {"context", "total"})
+        self.assertAlmostEqual(metrics.cost(row), (1000 * 0.25 + 200 * 1.25) / 1e6)
+
+    def test_prompt_cache_tokens_are_reported_and_priced(self):
+        usage = SimpleNamespace(input_tokens=100, output_tokens=10, cache_creation_input_tokens=0,
+                                cache_read_input_tokens=3000)
+        with metrics.request("repl", "command"):
+            metrics.add_usage("claude-3-sonnet-20240229", usage)
+        (row,) = metrics.records()
+        self.assertEqual((row["cache_read_tokens"], row["cache_write_tokens"]), (3000, 0))
+        self.assertAlmostEqual(metrics.cost(row), ((100 + 300) * 3.0 + 10 * 15.0) / 1e6)
+        self.assertIn("Prompt cache: 3,000 tokens read, 0 written (97% of input served from cache)", metrics.summary())
+
+    def test_older_database_gets_cache_columns(self):
+        metrics.close()
+        conn = sqlite3.connect(metrics.metrics_path())
+        conn.execute(
+            "CREATE TABLE requests (id INTEGER PRIMARY KEY, created REAL NOT NULL, kind TEXT NOT NULL, mode TEXT, "
+            "model TEXT, cache_hit INTEGER, calls INTEGER NOT NULL, input_tokens INTEGER NOT NULL, "
+            "output_tokens INTEGER NOT NULL, error TEXT, spans TEXT NOT NULL)"
+        )
+        conn.execute("INSERT INTO requests VALUES (1, 1.0, 'repl', 'command', NULL, 1, 0, 0, 0, NULL, '{}')")
+        conn.commit()
+        conn.close()
+        self.assertEqual(metrics.records()[0]["cache_read_tokens"], 0)
+
+    def test_requests_without_api_or_cache_are_dropped(self):
+        with metrics.request("repl", "shell"):
+            metrics.add_time("context", 0.01)
+        self.assertEqual(metrics.records(), [])
+        self.assertEqual(metrics.summary(), "No requests recorded yet.")
+
+    def test_errors_are_recorded_and_reraised(self):
+        with self.assertRaises(KeyboardInterrupt):
+            with metrics.request("repl", "ask"):
+                metrics.note(cache_hit=False)
+                raise KeyboardInterrupt
+        self.assertEqual(metrics.records()[0]["error"], "cancelled")
+
+    def test_export_appends_json_lines(self):
+        with mock.patch.dict(os.environ, {"CLI_SUGGEST_METRICS_EXPORT": self.export}):
+            for hit in (True, False):
+                with metrics.request("oneshot", "command"):
+                    metrics.note(cache_hit=hit)
+        with open(self.export) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([line["cache_hit"] for line in lines], [True, False])
+        self.assertEqual(lines[0]["kind"], "oneshot")
+
+    def test_summary(self):
+        for hit, total in ((True, 0.01), (False, 1.2), (False, 2.5)):
+            with metrics.request("repl", "command"):
+                metrics.note(cache_hit=hit)
+                metrics.add_time("total", total)
+                if not hit:
+                    metrics.add_usage("claude-3-sonnet-20240229", SimpleNamespace(input_tokens=500, output_tokens=50))
+        text = metrics.summary()
+        self.assertIn("Requests: 3 (repl 3)", text)
+        self.assertIn("Response cache: 1 hits / 3 lookups (33%)", text)
+        self.assertRegex(text, r"total\s+1200ms\s+2500ms\s+2500ms\s+3")
+        self.assertIn("Tokens: 1,000 in, 100 out over 2 API calls", text)
+        self.assertEqual(metrics.summary(since=2e10), "No requests recorded yet.")
+
+    def test_engine_jobs_add_to_the_callers_request(self):
+        with metrics.request("repl", "command") as record:
+            engine.call(metrics.add_time, "model", 0.5)
+            metrics.note(cache_hit=False)
+        self.assertEqual(record["spans"], {"model": 0.5})
+
+
+class TestInstrumentation(MetricsTestCase):
+    def test_cached_complete_records_usage_then_cache_hit(self):
+        message = SimpleNamespace(
+            content=[SimpleNamespace(text="ls -la")],
+            usage=SimpleNamespace(input_tokens=120, output_tokens=8),
+        )
+        context = {"OS": "posix", "PWD": "/repo"}
+        with mock.patch.object(cli_suggest, "get_client") as client:
+            client.return_value.messages.create.return_value = message
+            for _ in range(2):
+                with metrics.request("repl", "command"):
+                    cli_suggest.cached_complete("command", "list files", context, "prompt", max_tokens=100)
+        miss, hit = metrics.records()
+        self.assertEqual((miss["cache_hit"], miss["calls"], miss["input_tokens"]), (False, 1, 120))
+        self.assertIn("rate_limit_wait", miss["spans_ms"])
+        self.assertIn("model", miss["spans_ms"])
+        self.assertEqual((hit["cache_hit"], hit["calls"]), (True, 0))
+        self.assertNotIn("model", hit["spans_ms"])
+        self.assertIn("total", hit["spans_ms"])
+
+
+if __name__ == "__main__":
+    unittest.main()
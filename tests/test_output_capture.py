@@ -0,0 +1,92 @@
+import io
+import os
+import threading
+import unittest
+from unittest import mock
+
+from cli_suggest import cli_suggest
+from cli_suggest import output_capture
+from cli_suggest.output_capture import OutputCapture, stream_and_capture
+
+
+class TestOutputCapture(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(output_capture.remove_session_spill)
+
+    def capture(self, data, limit, chunk=7, spill=False):
+        path = output_capture.session_spill_path() if spill else None
+        capture = OutputCapture(limit, spill_path=path)
+        for i in range(0, len(data), chunk):
+            capture.feed(data[i:i + chunk])
+        capture.close()
+        return capture
+
+    def test_small_output_is_kept_whole(self):
+        capture = self.capture(b"one\ntwo\n", limit=100)
+        self.assertFalse(capture.truncated)
+        self.assertEqual(capture.summary(), "one\ntwo\n")
+        self.assertIsNone(capture.spill_path)
+
+    def test_large_output_keeps_head_and_tail(self):
+        data = b"".join(b"line %d\n" % i for i in range(10000))
+        capture = self.capture(data, limit=200)
+        self.assertEqual(len(capture.head) + len(capture.tail), 200)
+        self.assertEqual(capture.total_bytes, len(data))
+        self.assertEqual(capture.total_lines, 10000)
+        summary = capture.summary()
+        self.assertTrue(summary.startswith("line 0\nline 1\n"))
+        self.assertTrue(summary.endswith("line 9999\n"))
+        self.assertIn(f"{len(data)} bytes, 10000 lines total", summary)
+        self.assertIsNone(capture.spill_path)  # spilling is opt-in
+
+    def test_full_output_is_spilled_to_disk(self):
+        data = b"".join(b"line %d\n" % i for i in range(1000))
+        capture = self.capture(data, limit=64, spill=True)
+        self.assertIn(capture.spill_path, capture.summary())
+        with open(capture.spill_path, "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_next_spill_replaces_the_previous_one(self):
+        first = self.capture(b"a" * 1000, limit=64, spill=True)
+        second = self.capture(b"b" * 500, limit=64, spill=True)
+        self.assertEqual(first.spill_path, second.spill_path)
+        with open(second.spill_path, "rb") as f:
+            self.assertEqual(f.read(), b"b" * 500)
+        output_capture.remove_session_spill()
+        self.assertFalse(os.path.exists(second.spill_path))
+
+    def test_echo_falls_back_to_text_stdout(self):
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, "héllo\n".encode())
+        os.close(write_fd)
+        text_only = io.StringIO()
+        with mock.patch("sys.stdout", new=text_only), os.fdopen(read_fd, "rb") as pipe:
+            stream_and_capture(pipe, OutputCapture(100))
+        self.assertEqual(text_only.getvalue(), "héllo\n")
+
+    def test_stream_and_capture_echoes_every_byte(self):
+        read_fd, write_fd = os.pipe()
+
+        def writer():
+            with os.fdopen(write_fd, "wb") as pipe:
+                pipe.write(b"x" * 300000)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        echo = io.BytesIO()
+        capture = OutputCapture(1000)
+        with os.fdopen(read_fd, "rb") as pipe:
+            stream_and_capture(pipe, capture, echo=echo)
+        thread.join()
+        self.assertEqual(len(echo.getvalue()), 300000)
+        self.assertEqual(capture.total_bytes, 300000)
+        self.assertEqual(len(capture.head) + len(capture.tail), 1000)
+
+    def test_execute_shell_command_returns_bounded_summary(self):
+        with mock.patch.object(cli_suggest, "OUTPUT_CAPTURE_LIMIT", 1024), \
+                mock.patch("sys.stdout", new=io.TextIOWrapper(io.BytesIO())):
+            output = cli_suggest.execute_shell_command("seq 1 100000")
+        self.assertNotIn("full output saved", output)
+        self.assertLess(len(output), 1200)
+        self.assertTrue(output.startswith("1\n2\n"))
+        self.assertTrue(output.endswith("99999\n100000\n"))
@@ -0,0 +1,127 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from cli_suggest import rate_limiter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+import sys, time
+from cli_suggest import rate_limiter
+rate_limiter.RATE_LIMIT = {rate_per_minute}
+rate_limiter.BURST = {burst}
+for _ in range({calls}):
+    rate_limiter.acquire("interactive")
+    print(time.time(), flush=True)
+"""
+
+
+class TooManyRequests(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("429")
+        headers = {"retry-after": retry_after} if retry_after is not None else {}
+        self.response = SimpleNamespace(status_code=429, headers=headers)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "rate_limit.db")
+        for patcher in (
+            mock.patch.dict(os.environ, {"CLI_SUGGEST_RATE_LIMIT_PATH": self.path}),
+            mock.patch.object(rate_limiter, "RATE_LIMIT", 600),
+            mock.patch.object(rate_limiter, "BURST", 6),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        rate_limiter.close()
+        self.addCleanup(rate_limiter.close)
+
+    def set_tokens(self, tokens):
+        rate_limiter._connect().execute(
+            "UPDATE bucket SET tokens = ?, updated = ?, paused_until = 0", (tokens, time.time())
+        )
+
+    def test_lower_priorities_leave_headroom(self):
+        self.set_tokens(3.5)
+        with mock.patch.object(rate_limiter, "RATE_LIMIT", 0.001):  # no refill during the test
+            with self.assertRaises(rate_limiter.RateLimited):
+                rate_limiter.acquire("speculative")
+            rate_limiter.acquire("hook")  # 3.5 >= 1 + 2
+            with self.assertRaises(rate_limiter.RateLimited):
+                rate_limiter.acquire("hook", timeout=0)
+            rate_limiter.acquire("interactive")
+            rate_limiter.acquire("interactive")
+
+    def test_speculative_never_waits(self):
+        self.set_tokens(0)
+        start = time.monotonic()
+        with self.assertRaises(rate_limiter.RateLimited):
+            rate_limiter.acquire("speculative")
+        self.assertLess(time.monotonic() - start, 0.1)
+
+    def test_429_pauses_everyone_for_retry_after(self):
+        attempts = []
+
+        def flaky():
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise TooManyRequests(retry_after="0.3")
+            return "ok"
+
+        with mock.patch.object(rate_limiter, "BACKOFF_BASE", 0.01):
+            self.assertEqual(rate_limiter.call(flaky), "ok")
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.3)
+
+    def test_speculative_gives_up_on_429(self):
+        fn = mock.Mock(side_effect=TooManyRequests())
+        with mock.patch.object(rate_limiter, "BACKOFF_BASE", 0.01):
+            with self.assertRaises(rate_limiter.RateLimited):
+                rate_limiter.call(fn, "speculative")
+        self.assertEqual(fn.call_count, 1)
+        self.assertGreater(rate_limiter._try_take("interactive"), 0)  # bucket is paused
+
+    def test_other_errors_are_not_retried(self):
+        fn = mock.Mock(side_effect=ValueError("boom"))
+        with self.assertRaises(ValueError):
+            rate_limiter.call(fn)
+        self.assertEqual(fn.call_count, 1)
+
+    def test_backoff_is_jittered_and_capped(self):
+        delays = {rate_limiter.backoff_delay(10) for _ in range(20)}
+        self.assertGreater(len(delays), 1)
+        self.assertTrue(all(0 <= d <= rate_limiter.BACKOFF_CAP for d in delays))
+        self.assertGreaterEqual(rate_limiter.backoff_delay(0, retry_after=2.0), 2.0)
+
+    def test_processes_share_one_bucket(self):
+        rate_per_minute, burst, processes, calls = 600, 3, 4, 5
+        rate_limiter.BURST = burst
+        rate_limiter.RATE_LIMIT = rate_per_minute
+        self.set_tokens(burst)
+        start = time.time()
+        script = WORKER.format(rate_per_minute=rate_per_minute, burst=burst, calls=calls)
+        workers = [
+            subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.PIPE, text=True, cwd=REPO_ROOT)
+            for _ in range(processes)
+        ]
+        grants = []
+        for worker in workers:
+            out, _ = worker.communicate(timeout=60)
+            self.assertEqual(worker.returncode, 0)
+            grants += [float(line) for line in out.split()]
+        grants.sort()
+        self.assertEqual(len(grants), processes * calls)
+        # Never more grants than the initial burst plus what has refilled since
+        rate = rate_per_minute / 60
+        for count, at in enumerate(grants, 1):
+            self.assertLessEqual(count, burst + rate * (at - start) + 1)
+        self.assertGreaterEqual(grants[-1] - start, (len(grants) - burst - 1) / rate)
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from cli_suggest import cli_suggest, response_cache
+
+CONTEXT = {"OS": "posix", "PWD": "/repo", "Recent_Commands": "ls"}
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for patcher in (
+            mock.patch.dict(os.environ, {"CLI_SUGGEST_CACHE_PATH": os.path.join(tmp.name, "cache.db")}),
+            mock.patch.object(response_cache, "enabled", True),
+            mock.patch.dict(response_cache.stats, {"hits": 0, "misses": 0}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        response_cache.close()
+        self.addCleanup(response_cache.close)
+
+    def test_round_trip_with_normalized_query(self):
+        self.assertIsNone(response_cache.get("command", "find large files", CONTEXT))
+        response_cache.put("command", "find large files", CONTEXT, "du -sh *")
+        self.assertEqual(response_cache.get("command", "  Find LARGE  files ", CONTEXT), "du -sh *")
+        self.assertEqual(response_cache.stats, {"hits": 1, "misses": 1})
+
+    def test_key_depends_on_mode_and_context(self):
+        response_cache.put("command", "q", CONTEXT, "a")
+        self.assertIsNone(response_cache.get("ask", "q", CONTEXT))
+        self.assertIsNone(response_cache.get("command", "q", dict(CONTEXT, PWD="/other")))
+        # Fields outside the fingerprint don't split the cache
+        self.assertEqual(response_cache.get("command", "q", dict(CONTEXT, Recent_Commands="pwd")), "a")
+
+    def test_key_depends_on_history_and_attachments(self):
+        response_cache.put("command", "q", CONTEXT, "a", history="User: q")
+        self.assertEqual(response_cache.get("command", "q", CONTEXT, history="User: q"), "a")
+        self.assertIsNone(response_cache.get("command", "q", CONTEXT))
+        self.assertIsNone(response_cache.get("command", "q", CONTEXT, history="User: ls\nUser: q"))
+        self.assertIsNone(
+            response_cache.get("command", "q", dict(CONTEXT, File_notes="x"), history="User: q")
+        )
+
+    def test_expired_entries_miss(self):
+        response_cache.put("command", "q", CONTEXT, "a")
+        with mock.patch.object(response_cache.time, "time", return_value=time.time() + response_cache.TTL + 1):
+            self.assertIsNone(response_cache.get("command", "q", CONTEXT))
+        self.assertEqual(response_cache.entry_count(), 0)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        with mock.patch.object(response_cache, "MAX_ENTRIES", 2):
+            response_cache.put("command", "one", CONTEXT, "1")
+            time.sleep(0.01)
+            response_cache.put("command", "two", CONTEXT, "2")
+            time.sleep(0.01)
+            response_cache.get("command", "one", CONTEXT)
+            time.sleep(0.01)
+            response_cache.put("command", "three", CONTEXT, "3")
+        self.assertEqual(response_cache.entry_count(), 2)
+        self.assertIsNone(response_cache.get("command", "two", CONTEXT))
+        self.assertEqual(response_cache.get("command", "one", CONTEXT), "1")
+
+    def test_disabled_cache_is_bypassed(self):
+        response_cache.put("command", "q", CONTEXT, "a")
+        response_cache.enabled = False
+        self.assertIsNone(response_cache.get("command", "q", CONTEXT))
+        response_cache.put("command", "other", CONTEXT, "b")
+        response_cache.enabled = True
+        self.assertIsNone(response_cache.get("command", "other", CONTEXT))
+
+    def test_hits_skip_the_api(self):
+        with mock.patch.object(cli_suggest, "complete", return_value="ls -la") as complete:
+            first = cli_suggest.get_suggestion("list files", "", CONTEXT)
+            streamed = []
+            second = cli_suggest.get_suggestion("list files", "", CONTEXT, on_text=streamed.append)
+        self.assertEqual(first, second)
+        self.assertEqual(streamed, ["ls -la"])
+        complete.assert_called_once()
@@ -0,0 +1,108 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from cli_suggest import cli_suggest, session_store
+
+
+class StoreTestCase(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.dict(os.environ, {"CLI_SUGGEST_SESSIONS_PATH": os.path.join(tmp.name, "sessions.db")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        session_store.close()
+        self.addCleanup(session_store.close)
+
+
+class TestSessionStore(StoreTestCase):
+    def test_history_round_trips_compactly(self):
+        session = session_store.start_session("/repo")
+        session_store.record_turn(session, "list files", ["User: list files", "Assistant: ls -la", "Output: " + "x" * 10000],
+                                  suggestion="ls -la", exit_code=0, output="x" * 10000, latency=0.8)
+        session_store.record_turn(session, "/ask what is ls", ["User: /ask what is ls", "Assistant: /ask what is ls"])
+        history = session_store.load_history(session)
+        self.assertEqual(history[:2], ["User: list files", "Assistant: ls -la"])
+        self.assertLessEqual(len(history[2]), session_store.ENTRY_CHARS + 100)
+        self.assertEqual(len(history), 5)
+        self.assertEqual(session_store.resolve_session("last"), session)
+
+    def test_last_answer_is_a_local_lookup(self):
+        first = session_store.start_session("/repo")
+        session_store.record_turn(first, "find big files", [], suggestion="du -ah . | sort -h | tail", exit_code=0)
+        second = session_store.start_session("/repo")
+        session_store.record_turn(second, "Find  BIG files", [], suggestion="find . -size +100M", exit_code=0)
+        session_store.record_turn(second, "find big files", [])  # cancelled, no suggestion
+        turn = session_store.last_answer("find big files")
+        self.assertEqual((turn.session_id, turn.suggestion, turn.mode), (second, "find . -size +100M", "command"))
+        self.assertIsNone(session_store.last_answer("something else"))
+
+    def test_search_matches_queries_and_suggestions(self):
+        session = session_store.start_session("/repo")
+        session_store.record_turn(session, "show disk usage", [], suggestion="df -h")
+        session_store.record_turn(session, "compress the logs", [], suggestion="tar czf logs.tgz /var/log")
+        self.assertEqual([t.query for t in session_store.search("tar logs")], ["compress the logs"])
+        self.assertEqual([t.suggestion for t in session_store.search("disk")], ["df -h"])
+        self.assertEqual(session_store.search("?!"), [])
+
+    def test_oldest_turns_are_pruned(self):
+        session = session_store.start_session("/repo")
+        with mock.patch.object(session_store, "MAX_TURNS", 3):
+            for i in range(5):
+                session_store.record_turn(session, f"query {i}", [f"User: query {i}"], suggestion=f"echo {i}")
+        self.assertEqual(session_store.load_history(session), ["User: query 2", "User: query 3", "User: query 4"])
+        self.assertNotIn("echo 0", [t.suggestion for t in session_store.search("echo")])
+
+    def test_modes(self):
+        self.assertEqual(session_store.mode_of("list files"), "command")
+        self.assertEqual(session_store.mode_of("!ls"), "shell")
+        self.assertEqual(session_store.mode_of("/multi backup script"), "multi")
+        self.assertEqual(session_store.mode_of("/perp news"), "perplexity")
+
+
+class FakePromptSession:
+    queries = []
+
+    def __init__(self, *args, **kwargs):
+        self.default_buffer = mock.Mock()
+
+    def prompt(self, message):
+        if not self.queries:
+            raise EOFError
+        return self.queries.pop(0)
+
+
+class TestRepl(StoreTestCase):
+    def run_repl(self, queries, resume=None):
+        FakePromptSession.queries = list(queries)
+        seen = []
+
+        def process(query, history, speculation=None):
+            seen.append(list(history))
+            cli_suggest._turn.update(latency=0.5, exit_code=0)
+            return "ls -la", "a.txt", history
+
+        with mock.patch("prompt_toolkit.PromptSession", FakePromptSession), \
+                mock.patch.object(cli_suggest, "print_help_table"), \
+                mock.patch.object(cli_suggest, "prefetch_global_context"), \
+                mock.patch.object(cli_suggest, "process_suggestion", side_effect=process):
+            cli_suggest.handle_conversation(resume=resume)
+        return seen
+
+    def test_resume_continues_the_conversation(self):
+        self.run_repl(["list files"])
+        seen = self.run_repl(["again"], resume="last")
+        self.assertEqual(seen[0], ["User: list files", "Assistant: ls -la", "Output: a.txt", "User: again"])
+        session = session_store.resolve_session("last")
+        self.assertEqual(len(session_store.load_history(session)), 6)
+        turn = session_store.last_answer("list files")
+        self.assertEqual((turn.suggestion, turn.exit_code), ("ls -la", 0))
+
+    def test_recall_prints_past_suggestions_without_an_api_call(self):
+        self.run_repl(["list files"])
+        with mock.patch.object(cli_suggest, "get_client") as client, mock.patch("builtins.print"):
+            _, output, _ = cli_suggest.process_suggestion("/recall list files", [])
+        client.assert_not_called()
+        self.assertIn("list files (exit 0)\n    ls -la", output)
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from cli_suggest import cli_suggest, metrics, rate_limiter, response_cache
+from cli_suggest.speculative import Speculator
+
+
+class TestSpeculator(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+
+        def fetch(text):
+            self.calls.append(text)
+            self.release.wait(2)
+            return f"echo {text}"
+
+        self.speculator = Speculator(fetch, delay=0.05)
+
+    def type(self, text):
+        for i in range(1, len(text) + 1):
+            self.speculator.on_text_changed(text[:i])
+
+    def wait_done(self):
+        deadline = time.time() + 2
+        while not self.speculator.future.done() and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_only_settled_text_is_fetched(self):
+        self.type("list files")
+        self.wait_done()
+        self.assertEqual(self.calls, ["list files"])
+        self.assertEqual(self.speculator.hint(), "Suggestion: echo list files")
+
+    def test_enter_on_unchanged_text_reuses_result(self):
+        self.type("list files")
+        self.wait_done()
+        self.assertEqual(self.speculator.take("list files "), "echo list files")
+        self.assertEqual(self.calls, ["list files"])
+
+    def test_enter_waits_for_in_flight_request(self):
+        self.release.clear()
+        self.type("list files")
+        time.sleep(0.1)
+        threading.Timer(0.1, self.release.set).start()
+        self.assertEqual(self.speculator.take("list files"), "echo list files")
+
+    def test_changed_text_is_not_reused(self):
+        self.type("list files")
+        self.wait_done()
+        self.assertIsNone(self.speculator.take("list all files"))
+
+    def test_commands_and_short_text_are_ignored(self):
+        for text in ("ls", "/ask what is ls", "!ls -la", "exit"):
+            self.speculator.on_text_changed(text)
+            self.assertIsNone(self.speculator.future)
+        time.sleep(0.1)
+        self.assertEqual(self.calls, [])
+
+
+class TestSpeculativeRequests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        context = {"OS": "posix", "PWD": "/repo", "Recent_Commands": "", "Common_Commands": ""}
+        for patcher in (
+            mock.patch.dict(os.environ, {
+                "CLI_SUGGEST_CACHE_PATH": os.path.join(tmp.name, "cache.db"),
+                "CLI_SUGGEST_METRICS_PATH": os.path.join(tmp.name, "metrics.db"),
+            }),
+            mock.patch.object(response_cache, "enabled", True),
+            mock.patch.object(cli_suggest, "get_global_context", return_value=context),
+            mock.patch.object(rate_limiter, "acquire", side_effect=rate_limiter.RateLimited(1.0)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        response_cache.close()
+        self.addCleanup(response_cache.close)
+        metrics.close()
+        self.addCleanup(metrics.close)
+
+    def test_full_rate_limit_skips_instead_of_waiting(self):
+        with mock.patch.object(cli_suggest, "get_client") as client:
+            with self.assertRaises(rate_limiter.RateLimited):
+                cli_suggest.speculative_suggestion("list files", [])
+        client.return_value.messages.create.assert_not_called()
+
+    def test_cached_answer_needs_no_rate_limit(self):
+        # Stored under the same key the REPL uses once the query is submitted
+        history = ["User: list files"]
+        context_str, history_str = cli_suggest.context_builder.build_context(
+            "list files", history, cli_suggest.get_global_context(), "command"
+        )
+        response_cache.put("command", "list files", cli_suggest.get_global_context(), "ls -la", history_str)
+        self.assertEqual(cli_suggest.speculative_suggestion("list files", []), "ls -la")
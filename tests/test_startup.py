@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# Generous enough for slow CI machines; importing the heavy dependencies
+# eagerly costs several times this.
+STARTUP_BUDGET_MS = 150
+HEAVY_MODULES = {"anthropic", "requests", "bs4", "html2text", "prompt_toolkit", "prettytable"}
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(statement):
+    """Run statement under `python -X importtime` and return {module: cumulative_us}"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        cwd=REPO_ROOT,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestStartup(unittest.TestCase):
+    def test_one_shot_entry_point_skips_heavy_imports(self):
+        times = import_times("from cli_suggest import main")
+        top_level = {name.split(".")[0] for name in times}
+        self.assertEqual(top_level & HEAVY_MODULES, set())
+        self.assertLess(times["cli_suggest"] / 1000, STARTUP_BUDGET_MS)
+
+    def test_hook_client_uses_only_the_standard_library(self):
+        times = import_times("import runpy; runpy.run_path('cli_suggest/daemon_client.py')")
+        self.assertFalse(any(name.startswith("cli_suggest") for name in times))
+        self.assertEqual({name.split(".")[0] for name in times} & HEAVY_MODULES, set())
+
+    def test_llm_is_still_reachable_from_the_package(self):
+        result = subprocess.run(
+            [sys.executable, "-c", "import cli_suggest; print(cli_suggest.llm.__name__)"],
+            capture_output=True,
+            text=True,
+            cwd=REPO_ROOT,
+            check=True,
+        )
+        self.assertEqual(result.stdout.strip(), "cli_suggest.llm")
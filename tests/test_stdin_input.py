@@ -0,0 +1,125 @@
+import io
+import threading
+import time
+import unittest
+
+from cli_suggest import stdin_input
+
+
+def numbered(count):
+    return io.BytesIO("".join(f"line {i}\n" for i in range(count)).encode())
+
+
+class TestReadCapped(unittest.TestCase):
+    def test_small_input_is_unchanged(self):
+        self.assertEqual(stdin_input.read_capped(io.BytesIO(b"a\nb\n"), 100), "a\nb\n")
+        self.assertEqual(stdin_input.read_capped(io.BytesIO(b"a\nb\n"), 100, sample=True), "a\nb\n")
+
+    def test_head_tail_keeps_both_ends(self):
+        text = stdin_input.read_capped(numbered(10000), 200)
+        self.assertTrue(text.startswith("line 0\n"))
+        self.assertTrue(text.endswith("line 9999\n"))
+        self.assertIn("truncated", text)
+        self.assertLess(len(text), 400)
+
+    def test_sample_spreads_over_the_input(self):
+        text = stdin_input.read_capped(numbered(10000), 2000, sample=True)
+        lines = text.splitlines()
+        self.assertIn("input sampled", lines[0])
+        kept = [int(line.split()[1]) for line in lines[1:]]
+        self.assertLessEqual(sum(len(line) + 1 for line in lines[1:]), 2000)
+        self.assertEqual(kept[0], 0)
+        self.assertGreater(kept[-1], 9000)
+        self.assertEqual(len({b - a for a, b in zip(kept, kept[1:])}), 1)  # evenly spaced
+
+    def test_sample_caps_a_single_huge_line(self):
+        text = stdin_input.read_capped(io.BytesIO(b"x" * 10000), 100, sample=True)
+        self.assertLessEqual(text.count("x"), 100)
+
+
+class TestChunks(unittest.TestCase):
+    def test_chunks_end_at_line_boundaries(self):
+        chunks = list(stdin_input.iter_chunks(numbered(1000), 100))
+        self.assertEqual("".join(chunks), numbered(1000).getvalue().decode())
+        self.assertTrue(all(len(c) <= 100 and c.endswith("\n") for c in chunks))
+
+    def test_long_lines_are_cut(self):
+        chunks = list(stdin_input.iter_chunks(io.BytesIO(b"x" * 250), 100))
+        self.assertEqual([len(c) for c in chunks], [100, 100, 50])
+
+    def test_limit_keeps_first_and_last(self):
+        chunks = list(stdin_input.limit_chunks(iter(str(i) for i in range(100)), 4))
+        self.assertEqual(chunks[:2], ["0", "1"])
+        self.assertIn("96 parts", chunks[2])
+        self.assertTrue(chunks[2].endswith("\n98"))
+        self.assertEqual(chunks[3], "99")
+
+
+class TestMapReduce(unittest.TestCase):
+    def run_map_reduce(self, stream, complete, **kwargs):
+        finished = []
+        progress = io.StringIO()
+        stdin_input.map_reduce(stream, "find errors", complete, finished.append, progress=progress, **kwargs)
+        return finished, progress.getvalue()
+
+    def test_short_input_is_sent_directly(self):
+        finished, progress = self.run_map_reduce(io.BytesIO(b"all good\n"), None, chunk_bytes=100)
+        self.assertEqual(finished, ["find errors\nall good\n"])
+        self.assertEqual(progress, "")
+
+    def test_chunks_are_summarized_concurrently_then_combined(self):
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def complete(prompt):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            part = prompt.split("This is part ")[1].split(".")[0]
+            return f"notes {part}"
+
+        finished, progress = self.run_map_reduce(numbered(200), complete, chunk_bytes=100, workers=4)
+        self.assertEqual(peak[0], 4)
+        self.assertIn("--- part 1 ---\nnotes 1", progress)
+        self.assertTrue(finished[0].startswith("find errors"))
+        self.assertIn("Part 1:\nnotes 1", finished[0])
+        self.assertLess(finished[0].index("notes 2\n"), finished[0].index("notes 10\n"))
+
+    def test_first_notes_are_shown_before_the_rest_finish(self):
+        progress = io.StringIO()
+        shown = threading.Event()
+
+        def complete(prompt):
+            if "This is part 1." not in prompt and not shown.wait(2):
+                raise AssertionError("part 1 was not shown while others were pending")
+            return "notes"
+
+        class Progress(io.StringIO):
+            def write(self, text):
+                if "part 1" in text:
+                    shown.set()
+                return super().write(text)
+
+        stdin_input.map_reduce(numbered(50), "", complete, lambda prompt: None, chunk_bytes=100,
+                               workers=2, progress=Progress())
+
+    def test_notes_too_long_for_one_prompt_are_combined_in_groups(self):
+        prompts = []
+
+        def complete(prompt):
+            prompts.append(prompt)
+            return "n" * 40
+
+        finished, _ = self.run_map_reduce(numbered(200), complete, chunk_bytes=200, max_bytes=300)
+        self.assertGreater(len([p for p in prompts if "Below are notes" in p]), 0)
+        self.assertLessEqual(len(finished[0]) - len(stdin_input.REDUCE_PROMPT), 300 + 100)
+
+    def test_failed_chunk_raises(self):
+        def complete(prompt):
+            raise RuntimeError("overloaded")
+
+        with self.assertRaisesRegex(RuntimeError, "part 1: overloaded"):
+            self.run_map_reduce(numbered(100), complete, chunk_bytes=100)
@@ -0,0 +1,117 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from cli_suggest import cli_suggest, typo_fixer
+
+HISTORY = [
+    ("git status", 300),
+    ("git push origin main", 80),
+    ("git pull", 60),
+    ("ls -la", 500),
+    ("sudo apt update", 20),
+    ("make test", 40),
+    ("ssh host1", 50),
+    ("grep errors app.log", 30),
+    ("tail notes", 30),
+]
+
+
+class TestTypoFixer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.bin = os.path.join(cls.tmp.name, "bin")
+        os.mkdir(cls.bin)
+        names = ["git", "ls", "make", "sh", "ssh", "apt", "sudo", "python3", "grep", "tail"]
+        names += [f"tool{i}" for i in range(3000)]
+        for name in names:
+            open(os.path.join(cls.bin, name), "w").close()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        self.vocabulary = typo_fixer.build_vocabulary(HISTORY)
+
+    def fix(self, command):
+        return typo_fixer.local_fix(command, self.vocabulary, path=self.bin)
+
+    def test_mistyped_executable(self):
+        self.assertEqual(self.fix("gti status"), "git status")
+        self.assertEqual(self.fix("sl"), "ls")
+        self.assertEqual(self.fix("mkae test"), "make test")
+        self.assertEqual(self.fix("sudo atp update"), "sudo apt update")
+
+    def test_mistyped_subcommand(self):
+        self.assertEqual(self.fix("git psuh origin main"), "git push origin main")
+        self.assertEqual(self.fix("git stauts"), "git status")
+
+    def test_leaves_real_failures_to_the_llm(self):
+        self.assertIsNone(self.fix("git push origin main"))
+        self.assertIsNone(self.fix("ls /nonexistent"))
+        self.assertIsNone(self.fix("frobnicate --now"))
+        self.assertIsNone(self.fix("./build.sh"))
+        self.assertIsNone(self.fix("git"))
+
+    def test_arguments_of_plain_commands_are_not_subcommands(self):
+        self.assertIsNone(self.fix("ssh host2"))
+        self.assertIsNone(self.fix("grep error app.log"))
+        self.assertIsNone(self.fix("tail note"))
+        vocabulary = typo_fixer.build_vocabulary([("cat notes", 30)])
+        self.assertIsNone(typo_fixer.local_fix("cat note", vocabulary, path=self.bin))
+        self.assertIsNone(self.fix("make tests"))
+
+    def test_ambiguous_candidates_are_not_confident(self):
+        path = os.pathsep.join([self.bin, os.path.join(self.tmp.name, "extra")])
+        os.makedirs(os.path.join(self.tmp.name, "extra"), exist_ok=True)
+        for name in ("cat", "cut"):
+            open(os.path.join(self.tmp.name, "extra", name), "w").close()
+        # One substitution from both, and history doesn't prefer either
+        self.assertIsNone(typo_fixer.local_fix("cbt file", self.vocabulary, path=path))
+        vocabulary = typo_fixer.build_vocabulary([("cat file", 50)])
+        self.assertEqual(typo_fixer.local_fix("cbt file", vocabulary, path=path), "cat file")
+
+    def test_fix_is_fast(self):
+        self.fix("gti status")  # warm up
+        start = time.perf_counter()
+        for _ in range(10):
+            self.fix("gti status")
+            self.fix("git psuh")
+        per_fix_ms = (time.perf_counter() - start) * 1000 / 20
+        self.assertLess(per_fix_ms, 10)
+
+    def test_suggest_fix_skips_api_for_local_fix(self):
+        with mock.patch.object(typo_fixer, "load_vocabulary", return_value=self.vocabulary), \
+                mock.patch.object(cli_suggest, "complete") as complete:
+            self.assertEqual(cli_suggest.suggest_fix("gti status", path=self.bin), "git status")
+        complete.assert_not_called()
+
+    def test_empty_vocabulary_is_not_persisted(self):
+        loader = mock.Mock(return_value=[])
+        path = os.path.join(self.tmp.name, "empty_vocab.json")
+        with mock.patch.object(typo_fixer, "vocabulary_path", return_value=path), \
+                mock.patch.object(typo_fixer, "_vocabulary", None):
+            typo_fixer.load_vocabulary(loader)
+            typo_fixer.load_vocabulary(loader)  # still fresh in memory
+            self.assertFalse(os.path.exists(path))
+            typo_fixer._vocabulary["built"] -= typo_fixer.EMPTY_VOCAB_TTL + 1
+            loader.return_value = HISTORY
+            vocabulary = typo_fixer.load_vocabulary(loader)
+        self.assertEqual(loader.call_count, 2)
+        self.assertIn("git", vocabulary["commands"])
+        self.assertTrue(os.path.exists(path))
+
+    def test_vocabulary_is_cached_on_disk(self):
+        loader = mock.Mock(return_value=HISTORY)
+        path = os.path.join(self.tmp.name, "vocab.json")
+        with mock.patch.object(typo_fixer, "vocabulary_path", return_value=path), \
+                mock.patch.object(typo_fixer, "_vocabulary", None):
+            typo_fixer.load_vocabulary(loader)
+            typo_fixer._vocabulary = None
+            vocabulary = typo_fixer.load_vocabulary(loader)
+        loader.assert_called_once_with(typo_fixer.VOCAB_SIZE)
+        self.assertEqual(vocabulary["subcommands"]["git"]["push"], 80)
@@ -0,0 +1,122 @@
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import requests
+
+from cli_suggest import web_ingest
+
+ARTICLE = """<html><head><title>Rotating logs</title></head><body class="has-sidebar">
+<nav><a href="/">Home</a> <a href="/docs">Docs</a> <a href="/blog">Blog</a></nav>
+<div class="sidebar-menu"><ul><li><a href="/a">Sidebar link that says nothing useful at all</a></li></ul></div>
+<div id="content">
+  <h1>Rotating logs</h1>
+  <p>Use logrotate to keep log files from filling the disk on long running servers.</p>
+  <p>Run <code>logrotate -f /etc/logrotate.conf</code> to force a rotation right away.</p>
+</div>
+<div class="cookie-banner"><p>We use cookies to improve your experience on this website.</p></div>
+<footer><p>Copyright 2024 Example Corp, all rights reserved worldwide.</p></footer>
+</body></html>"""
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        if self.path == "/article":
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.send_header("ETag", '"v1"')
+                self.end_headers()
+                return
+            self._send(ARTICLE.encode(), "text/html; charset=utf-8", {"ETag": '"v1"'})
+        elif self.path == "/huge":
+            self._send(b"<p>" + b"x" * (web_ingest.MAX_BYTES * 3) + b"</p>", "text/html")
+        elif self.path == "/notes.txt":
+            self._send(b"plain   text\n\n\n\nkept as is", "text/plain")
+        elif self.path == "/image.png":
+            self._send(b"\x89PNG", "image/png")
+        else:
+            self._send(b"gone", "text/plain", status=404)
+
+    def _send(self, body, content_type, headers=None, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client stopped reading at its cap
+
+
+class TestWebIngest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+        self.server.requests = []
+        self.server.handle_error = lambda request, client_address: None
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.dict(os.environ, {"CLI_SUGGEST_WEB_CACHE_PATH": os.path.join(tmp.name, "web.db")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        web_ingest.close()
+        self.addCleanup(web_ingest.close)
+        self.session = requests.Session()
+        self.addCleanup(self.session.close)
+
+    def fetch(self, path):
+        return web_ingest.fetch_markdown(self.session, f"{self.base_url}{path}", timeout=5)
+
+    def test_main_content_without_navigation(self):
+        markdown = self.fetch("/article")
+        self.assertIn("# Rotating logs", markdown)
+        self.assertIn("`logrotate -f /etc/logrotate.conf`", markdown)
+        for boilerplate in ("Home", "Sidebar link", "cookies", "Copyright"):
+            self.assertNotIn(boilerplate, markdown)
+
+    def test_article_element_is_preferred(self):
+        html = "<body><div>menu</div><article><header><h2>Title</h2></header><p>Body</p></article></body>"
+        markdown = web_ingest.html_to_markdown(html)
+        self.assertIn("## Title", markdown)
+        self.assertNotIn("menu", markdown)
+
+    def test_revalidates_with_etag(self):
+        first = self.fetch("/article")
+        second = self.fetch("/article")
+        self.assertEqual(first, second)
+        self.assertEqual(self.server.requests[1][1].get("If-None-Match"), '"v1"')
+
+    def test_no_cache_skips_revalidation(self):
+        self.fetch("/article")
+        with mock.patch.object(web_ingest, "enabled", False):
+            self.fetch("/article")
+        self.assertNotIn("If-None-Match", self.server.requests[1][1])
+
+    def test_body_is_capped(self):
+        markdown = self.fetch("/huge")
+        self.assertIn("page truncated", markdown)
+        self.assertLessEqual(len(markdown), web_ingest.MAX_CHARS)
+
+    def test_text_is_kept_as_is(self):
+        self.assertEqual(self.fetch("/notes.txt"), "plain   text\n\n\n\nkept as is")
+
+    def test_unsupported_content_and_errors_raise(self):
+        with self.assertRaisesRegex(ValueError, "image/png"):
+            self.fetch("/image.png")
+        with self.assertRaises(requests.HTTPError):
+            self.fetch("/missing")